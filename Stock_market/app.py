@@ -1,13 +1,40 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response
 import mysql.connector
-import pandas as pd
-import yfinance as yf
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
+import gzip
+import hashlib
 import json
+import logging
+import math
+import os
+import threading
 import numpy as np
 
+from indicators import compute_indicators, to_json_list
+from market_data import get_history, get_history_batch, get_recent_history_batch, cache_stats, RECENT_HISTORY_FALLBACKS
+from streaming_indicators import indicator_states
+from db import db_connection, db_stats
+from trade_journal import journal
+from order_book import engine as matching_engine, OrderError
+from positions import PositionBook
+from portfolio_valuation import ValuationRegistry, price_feed
+from stream import stream_hub, QUOTE_INTERVAL, SIGNAL_INTERVAL, NEWS_INTERVAL
+from market_snapshot import MarketSnapshot
+from symbol_metadata import symbol_metadata
+from fx import fx
+from http_cache import ResponseCache, cached_response, note_bars, skip_cache
+from serialization import dumps as dumps_json, format_dates, wall_seconds, pack_columns, COLUMNS_MIMETYPE
+import metrics
+import profiling
+
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'
+metrics.init_app(app)
+profiling.init_app(app)
+
+# Per-request progress messages; enable with logging at DEBUG level
+logger = logging.getLogger(__name__)
 
 # Mock data structures (in a real app, you'd use a database)
 MOCK_USERS = {
@@ -17,17 +44,125 @@ MOCK_USERS = {
 }
 
 MOCK_PORTFOLIO = {
-    'admin': [
+    'admin': PositionBook([
         {'symbol': 'AAPL', 'quantity': 10, 'avg_price': 150.0},
         {'symbol': 'MSFT', 'quantity': 5, 'avg_price': 300.0}
-    ],
-    'user1': [
+    ]),
+    'user1': PositionBook([
         {'symbol': 'GOOGL', 'quantity': 8, 'avg_price': 2500.0}
-    ],
-    'praveen': [
+    ]),
+    'praveen': PositionBook([
         {'symbol': 'TSLA', 'quantity': 3, 'avg_price': 700.0}
-    ]
+    ])
+}
+
+# Symbols shown on the home dashboard and in the news feed
+MAJOR_INDICES = ['SPY', 'QQQ', 'DIA']  # S&P 500, NASDAQ, Dow Jones ETFs
+SECTOR_ETFS = {
+    "Technology": "XLK",
+    "Healthcare": "XLV",
+    "Financial": "XLF",
+    "Energy": "XLE",
+    "Consumer": "XLY"
 }
+TOP_STOCKS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META']
+
+# /get_chart_data period to yfinance period
+CHART_PERIODS = {
+    '1d': '1d',
+    '1wk': '5d',
+    '1w': '5d',
+    '1mo': '1mo',
+    '1m': '1mo',
+    '3mo': '3mo',
+    '3m': '3mo',
+    '6mo': '6mo',
+    '6m': '6mo',
+    '1y': '1y',
+    '5y': '5y',
+    'max': 'max',
+    'all': 'max'
+}
+
+# /get_chart_data period to bar interval
+CHART_INTERVALS = {
+    '1d': '5m',      # 5-minute intervals for 1 day
+    '1wk': '30m',    # 30-minute intervals for 1 week
+    '1w': '30m',
+    '1mo': '1d',     # 1-day intervals for 1 month
+    '1m': '1d',
+    '3mo': '1d',
+    '3m': '1d',
+    '6mo': '1d',
+    '6m': '1d',
+    '1y': '1d',
+    '5y': '1wk',
+    'max': '1wk',
+    'all': '1wk'
+}
+
+def _quote_symbol(args):
+    return args.get('symbol', 'AAPL')
+
+def _quote_symbols(args):
+    return [symbol.strip() for symbol in args.get('symbols', 'AAPL,MSFT,GOOGL').split(',')]
+
+def _chart_query(args):
+    """
+    (symbol, period, yfinance period, bar interval) of a /get_chart_data query.
+    """
+    period = args.get('period', '1y')
+    return args.get('symbol', 'AAPL'), period, CHART_PERIODS.get(period, '1y'), CHART_INTERVALS.get(period, '1d')
+
+def _chart_reads(args):
+    symbol, _, yf_period, yf_interval = _chart_query(args)
+    return [(get_history, symbol, yf_period, yf_interval)]
+
+# path -> query args -> [(function, *args)]: the first upstream reads of each
+# quote and chart view, built with the same helpers the views parse their
+# query with (the ASGI server runs them ahead of the view, see asgi.py)
+UPSTREAM_READS = {
+    '/get_stock_data': lambda args: [(get_history, _quote_symbol(args), *RECENT_HISTORY_FALLBACKS[0])],
+    '/get_multiple_stock_data': lambda args: [(get_recent_history_batch, _quote_symbols(args))],
+    '/get_chart_data': _chart_reads
+}
+
+# Responses of the read-only quote, chart and indicator routes, reused while
+# their bars are fresh and invalidated when an exchange rate moves
+response_cache = ResponseCache(salt=lambda: fx.version)
+
+# Index and sector sentiment, movers and headlines shared by / and /get_news
+market_snapshot = MarketSnapshot(MAJOR_INDICES, SECTOR_ETFS, TOP_STOCKS, rate=fx.symbol_rate)
+
+# Watchlist for /predict_next_week, override with a comma-separated
+# PREDICTION_WATCHLIST environment variable
+PREDICTION_WATCHLIST = [
+    symbol.strip().upper()
+    for symbol in os.environ.get('PREDICTION_WATCHLIST', 'AAPL,MSFT,GOOGL,AMZN,TSLA,NVDA,META,NFLX,AMD,INTC').split(',')
+    if symbol.strip()
+]
+# Symbols still running after this many seconds are left off the page
+PREDICTION_TIMEOUT = float(os.environ.get('PREDICTION_TIMEOUT', '8'))
+prediction_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PREDICTION_WORKERS', '16')),
+    thread_name_prefix='prediction'
+)
+
+# Symbols offered by the home page trade panels and the chart page
+TEMPLATE_WATCHLIST = [
+    'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META', 'NFLX', 'AMD', 'INTC', 'PYPL', 'ADBE', 'CRM', 'V', 'MA',
+    'IBM', 'ORCL', 'GE', 'F', 'XOM', 'WMT', 'T', 'DIS', 'BAC', 'CSCO', 'PFE', 'KO', 'PEP', 'BRK.B', 'JNJ'
+]
+
+def warm_up():
+    """
+    Server start-up work that talks to the network, kept out of import so
+    tools and tests can load the app offline. Company names are looked up
+    in the background, never during a request; symbols missed here are
+    fetched the first time a page asks for them.
+    """
+    symbol_metadata.preload(MAJOR_INDICES + list(SECTOR_ETFS.values()) + TOP_STOCKS + PREDICTION_WATCHLIST
+                            + TEMPLATE_WATCHLIST)
 
 MOCK_TRADING_HISTORY = {
     'admin': [
@@ -83,43 +218,37 @@ def login():
         if not username or not password:
             return render_template('login.html', error='Please enter both username and password')
         
-        print(f"Login attempt: username={username}")
+        logger.debug("Login attempt: username=%s", username)
         
         # Try database first
         db_checked = False
         try:
-            conn = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='1234',
-                database='stock_trading'
-            )
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM users WHERE username = %s AND password = %s", (username, password))
-            user = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            with db_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT * FROM users WHERE username = %s AND password = %s", (username, password))
+                user = cursor.fetchone()
+                cursor.close()
             db_checked = True
             
             if user:
                 session['username'] = username
-                print(f"Login successful via DB: {username}")
+                logger.debug("Login successful via DB: %s", username)
                 return redirect(url_for('home'))
         except mysql.connector.Error as err:
-            print(f"Database error during login: {err}")
+            logger.warning("Database error during login: %s", err)
             db_checked = False
         
         # Fallback to mock data
         if username in MOCK_USERS and MOCK_USERS[username]['password'] == password:
             session['username'] = username
-            print(f"Login successful via MOCK: {username}")
+            logger.debug("Login successful via MOCK: %s", username)
             return redirect(url_for('home'))
         
         # Login failed
         if db_checked:
-            print(f"Login failed: Invalid credentials for {username}")
+            logger.debug("Login failed: Invalid credentials for %s", username)
         else:
-            print(f"Login failed: User {username} not found in MOCK data")
+            logger.debug("Login failed: User %s not found in MOCK data", username)
         
         return render_template('login.html', error='Invalid username or password. Please try again.')
     
@@ -132,7 +261,7 @@ def signup():
         email = request.form.get('email', '').strip()
         password = request.form.get('password', '')
         
-        print(f"Signup attempt: username={username}, email={email}")
+        logger.debug("Signup attempt: username=%s, email=%s", username, email)
         
         # Simple validation
         if not username or not email or not password:
@@ -147,57 +276,50 @@ def signup():
         # Try database first
         db_created = False
         try:
-            conn = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='1234',
-                database='stock_trading'
-            )
-            cursor = conn.cursor(dictionary=True)
-            
-            # Check if user exists
-            cursor.execute("SELECT * FROM users WHERE username = %s OR email = %s", (username, email))
-            existing_user = cursor.fetchone()
-            
-            if existing_user:
+            with db_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                
+                # Check if user exists
+                cursor.execute("SELECT * FROM users WHERE username = %s OR email = %s", (username, email))
+                existing_user = cursor.fetchone()
+                
+                if existing_user:
+                    cursor.close()
+                    logger.debug("Signup failed: User already exists - %s", username)
+                    return render_template('signup.html', error='Username or email already exists')
+                
+                # Create new user
+                cursor.execute("INSERT INTO users (username, email, password) VALUES (%s, %s, %s)", 
+                              (username, email, password))
+                conn.commit()
                 cursor.close()
-                conn.close()
-                print(f"Signup failed: User already exists - {username}")
-                return render_template('signup.html', error='Username or email already exists')
-            
-            # Create new user
-            cursor.execute("INSERT INTO users (username, email, password) VALUES (%s, %s, %s)", 
-                          (username, email, password))
-            conn.commit()
-            cursor.close()
-            conn.close()
             
             db_created = True
-            print(f"Signup successful via DB: {username}")
+            logger.debug("Signup successful via DB: %s", username)
             
         except mysql.connector.Error as err:
-            print(f"Database error during signup: {err}")
+            logger.warning("Database error during signup: %s", err)
             db_created = False
         
         # If DB failed, use mock data
         if not db_created:
             # Check if user exists in mock
             if username in MOCK_USERS:
-                print(f"Signup failed: User exists in MOCK - {username}")
+                logger.debug("Signup failed: User exists in MOCK - %s", username)
                 return render_template('signup.html', error='Username already exists')
             
             # Check email
             for user_data in MOCK_USERS.values():
                 if user_data.get('email') == email:
-                    print(f"Signup failed: Email exists in MOCK - {email}")
+                    logger.debug("Signup failed: Email exists in MOCK - %s", email)
                     return render_template('signup.html', error='Email already exists')
             
             # Create in mock
             MOCK_USERS[username] = {"username": username, "email": email, "password": password}
-            print(f"Signup successful via MOCK: {username}")
+            logger.debug("Signup successful via MOCK: %s", username)
         
         # Initialize portfolio
-        MOCK_PORTFOLIO[username] = []
+        MOCK_PORTFOLIO[username] = PositionBook()
         MOCK_TRADING_HISTORY[username] = []
         
         # Success - redirect to login
@@ -221,17 +343,11 @@ def forgot_password():
         
         # Check if email exists in database
         try:
-            conn = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='1234',
-                database='stock_trading'
-            )
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT username FROM users WHERE email = %s", (email,))
-            user = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            with db_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT username FROM users WHERE email = %s", (email,))
+                user = cursor.fetchone()
+                cursor.close()
             
             if user:
                 # In a real application, you would send an email here
@@ -240,7 +356,7 @@ def forgot_password():
             else:
                 return render_template('forgot_password.html', error='Email not found in our records')
         except mysql.connector.Error as err:
-            print(f"Database error: {err}")
+            logger.warning("Database error: %s", err)
             # Fallback to mock data
             pass
         
@@ -260,154 +376,28 @@ def home():
         return redirect(url_for('login'))
     
     username = session['username']
+    snapshot = market_snapshot.get()
     
-    # Get real market data for sentiment
-    major_indices = ['SPY', 'QQQ', 'DIA']  # S&P 500, NASDAQ, Dow Jones ETFs
-    market_data = []
-    total_change = 0
-    
-    for symbol in major_indices:
-        try:
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period='5d')
-            if len(hist) >= 2:
-                current = float(hist['Close'].iloc[-1])
-                previous = float(hist['Close'].iloc[-2])
-                change_pct = ((current - previous) / previous) * 100
-                total_change += change_pct
-                market_data.append({
-                    'symbol': symbol,
-                    'change': change_pct
-                })
-        except:
-            pass
-    
-    # Calculate market sentiment from real data
-    if market_data:
-        avg_change = total_change / len(market_data)
-        market_sentiment_score = min(max((avg_change + 2) / 4, 0), 1)  # Normalize to 0-1
-        if avg_change > 1:
-            market_sentiment_label = "Bullish"
-        elif avg_change < -1:
-            market_sentiment_label = "Bearish"
-        else:
-            market_sentiment_label = "Neutral"
-    else:
-        market_sentiment_score = 0.5
-        market_sentiment_label = "Neutral"
-    
-    # Real sector data
-    sector_etfs = {
-        "Technology": "XLK",
-        "Healthcare": "XLV",
-        "Financial": "XLF",
-        "Energy": "XLE",
-        "Consumer": "XLY"
-    }
-    
-    sector_sentiment = {}
-    for sector, etf in sector_etfs.items():
-        try:
-            stock = yf.Ticker(etf)
-            hist = stock.history(period='5d')
-            if len(hist) >= 2:
-                current = float(hist['Close'].iloc[-1])
-                previous = float(hist['Close'].iloc[-2])
-                change_pct = ((current - previous) / previous) * 100
-                score = min(max((change_pct + 2) / 4, 0), 1)
-                
-                if change_pct > 0.5:
-                    label = "Bullish"
-                elif change_pct < -0.5:
-                    label = "Bearish"
-                else:
-                    label = "Neutral"
-                
-                sector_sentiment[sector] = {"score": round(score, 2), "label": label}
-            else:
-                sector_sentiment[sector] = {"score": 0.5, "label": "Neutral"}
-        except:
-            sector_sentiment[sector] = {"score": 0.5, "label": "Neutral"}
-    
-    # Generate dynamic news based on real stock movements
-    articles = []
-    current_date = datetime.now().strftime('%B %d, %Y')
-    
-    # Get top movers
-    top_stocks = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META']
-    movers = []
-    
-    for symbol in top_stocks:
-        try:
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period='5d')
-            if len(hist) >= 2:
-                current = float(hist['Close'].iloc[-1])
-                previous = float(hist['Close'].iloc[-2])
-                change_pct = ((current - previous) / previous) * 100
-                info = stock.info
-                name = info.get('shortName', symbol)
-                movers.append({
-                    'symbol': symbol,
-                    'name': name,
-                    'change': change_pct,
-                    'price': current * 83.0
-                })
-        except:
-            pass
-    
-    # Sort by absolute change
-    movers.sort(key=lambda x: abs(x['change']), reverse=True)
-    
-    # Create news from top 3 movers
-    if len(movers) >= 1:
-        top = movers[0]
-        direction = "surges" if top['change'] > 0 else "drops"
-        articles.append({
-            "title": f"{top['name']} {direction} {abs(top['change']):.1f}% - {current_date}",
-            "summary": f"{top['name']} ({top['symbol']}) shows significant movement with {top['change']:.2f}% change. Current price: ₹{top['price']:.2f}. Market analysts monitoring closely."
-        })
+    # The page only changes with the snapshot and the signed-in user
+    etag = f"{snapshot['etag']}-{hashlib.sha1(username.encode('utf-8')).hexdigest()[:8]}"
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
     
-    if len(movers) >= 2:
-        second = movers[1]
-        direction = "rallies" if second['change'] > 0 else "declines"
-        articles.append({
-            "title": f"{second['name']} {direction} {abs(second['change']):.1f}% in Latest Trading",
-            "summary": f"{second['name']} experiences {abs(second['change']):.2f}% {'gain' if second['change'] > 0 else 'loss'} at ₹{second['price']:.2f}. Trading volume indicates strong investor interest."
-        })
-    
-    # Add market overview
-    if market_sentiment_label == "Bullish":
-        articles.append({
-            "title": f"Markets Close Higher - {current_date}",
-            "summary": f"Major indices show positive momentum with markets trending {market_sentiment_label.lower()}. Technology and growth stocks lead the rally as investor sentiment remains strong."
-        })
-    elif market_sentiment_label == "Bearish":
-        articles.append({
-            "title": f"Market Pullback Continues - {current_date}",
-            "summary": f"Indices face pressure with {market_sentiment_label.lower()} sentiment prevailing. Investors rotating into defensive sectors amid market volatility."
-        })
-    else:
-        articles.append({
-            "title": f"Markets Trade Mixed - {current_date}",
-            "summary": f"Indices show mixed performance with {market_sentiment_label.lower()} sentiment. Investors await key economic data and corporate earnings reports."
-        })
-    
-    # Add fallback if no articles generated
-    if not articles:
-        articles = [
-            {
-                "title": f"Market Update - {current_date}",
-                "summary": "Markets are currently active. Check individual stocks for latest price movements and trading opportunities."
-            }
-        ]
-    
-    return render_template('home.html', 
+    response = app.make_response(render_template('home.html', 
                          username=username,
-                         market_sentiment_score=market_sentiment_score,
-                         market_sentiment_label=market_sentiment_label,
-                         sector_sentiment=sector_sentiment,
-                         articles=articles)
+                         market_sentiment_score=snapshot['market_sentiment_score'],
+                         market_sentiment_label=snapshot['market_sentiment_label'],
+                         sector_sentiment=snapshot['sector_sentiment'],
+                         articles=snapshot['articles']))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _not_modified(etag, cache_control='private, no-cache'):
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
 
 @app.route('/portfolio')
 def portfolio():
@@ -417,77 +407,12 @@ def portfolio():
     username = session['username']
     
     # Get user's portfolio
-    user_portfolio = MOCK_PORTFOLIO.get(username, [])
+    user_portfolio = MOCK_PORTFOLIO.get(username)
+    if user_portfolio is None:
+        user_portfolio = MOCK_PORTFOLIO.setdefault(username, PositionBook())
     
-    # Calculate portfolio metrics
-    total_invested = 0
-    total_current_value = 0
-    portfolio_details = []
-    best_performance = float('-inf')
-    best_performer = None
-    
-    for item in user_portfolio:
-        symbol = item['symbol']
-        quantity = item['quantity']
-        avg_price = item['avg_price']
-        
-        # Get current price using yfinance
-        try:
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period="1d")
-            if not hist.empty:
-                current_price = float(hist['Close'].iloc[-1]) * 83.0  # Convert to INR
-            else:
-                current_price = avg_price * 83.0  # Fallback to avg price if no data
-        except:
-            current_price = avg_price * 83.0  # Fallback to avg price if error
-        
-        # Calculate metrics with INR conversion
-        invested_amount = quantity * avg_price * 83.0  # Convert to INR
-        current_value = quantity * current_price
-        profit_loss = current_value - invested_amount
-        return_rate = ((current_value - invested_amount) / invested_amount * 100) if invested_amount > 0 else 0
-        
-        # Update best performer
-        if return_rate > best_performance:
-            best_performance = return_rate
-            best_performer = symbol
-        
-        # Add to totals
-        total_invested += invested_amount
-        total_current_value += current_value
-        
-        # Add to portfolio details
-        portfolio_details.append({
-            'symbol': symbol,
-            'quantity': quantity,
-            'avg_price': avg_price * 83.0,  # Convert to INR
-            'current_price': current_price,
-            'return_rate': return_rate,
-            'current_value': current_value,
-            'profit_loss': profit_loss
-        })
-    
-    # Calculate overall metrics
-    total_profit_loss = total_current_value - total_invested
-    overall_return_rate = ((total_current_value - total_invested) / total_invested * 100) if total_invested > 0 else 0
-    
-    # If no holdings, set default values
-    if best_performer is None:
-        best_performer = "N/A"
-        best_performance = 0
-    
-    # Create portfolio metrics object
-    portfolio_metrics = {
-        'total_current_value': total_current_value,
-        'total_profit_loss': total_profit_loss,
-        'overall_return_rate': overall_return_rate,
-        'total_invested': total_invested,
-        'best_performer': best_performer,
-        'best_performance': best_performance,
-        'last_updated': datetime.now(),
-        'portfolio_details': portfolio_details
-    }
+    # Kept up to date by price ticks and trades, reading it is cheap
+    portfolio_metrics = portfolio_valuations.get(username, user_portfolio).snapshot()
     
     return render_template('portfolio.html', 
                          username=username,
@@ -512,14 +437,11 @@ def add_to_portfolio():
         
         # Ensure user has a portfolio
         if username not in MOCK_PORTFOLIO:
-            MOCK_PORTFOLIO[username] = []
+            MOCK_PORTFOLIO[username] = PositionBook()
         
-        # Add to portfolio
-        MOCK_PORTFOLIO[username].append({
-            'symbol': symbol.upper(),
-            'quantity': int(quantity),
-            'avg_price': float(avg_price)
-        })
+        # Add to portfolio, averaging into an existing position; the form
+        # price is in INR, positions are kept in the symbol's own currency
+        MOCK_PORTFOLIO[username].buy(symbol, int(quantity), float(avg_price) / fx.symbol_rate(symbol))
         
         return jsonify({'success': True, 'message': f'Successfully added {symbol} to portfolio'})
     except Exception as e:
@@ -532,6 +454,87 @@ def trade():
     
     return render_template('trade.html', username=session['username'])
 
+def _apply_fill(fill):
+    """
+    Book a fill from the matching engine into the owner's trading history
+    and portfolio, and queue it for the database.
+    """
+    username = fill.owner
+    trade_record = {
+        'date': datetime.fromtimestamp(fill.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+        'symbol': fill.symbol,
+        'action': fill.side,
+        'quantity': fill.quantity,
+        'price': round(fill.price, 2)
+    }
+    
+    # Initialize user's trading history if not exists
+    if username not in MOCK_TRADING_HISTORY:
+        MOCK_TRADING_HISTORY[username] = []
+    
+    # Add trade to history
+    MOCK_TRADING_HISTORY[username].insert(0, trade_record)  # Add to beginning
+    
+    # Update portfolio
+    portfolio = MOCK_PORTFOLIO.get(username)
+    if portfolio is None:
+        portfolio = MOCK_PORTFOLIO.setdefault(username, PositionBook())
+    
+    if fill.side == 'buy':
+        # Fills are in INR, positions in the symbol's own currency
+        portfolio.buy(fill.symbol, fill.quantity, fill.price / fx.symbol_rate(fill.symbol))
+    else:
+        # Sell orders are checked against holdings when placed, never
+        # sell more than is still held
+        portfolio.sell(fill.symbol, min(fill.quantity, portfolio.quantity(fill.symbol)))
+    
+    # Persisted to trading_history in the background by the journal
+    journal.submit(username, fill.symbol, fill.side, fill.quantity, fill.price, trade_record['date'])
+
+
+matching_engine.add_listener(_apply_fill)
+
+# Portfolio values in INR
+portfolio_valuations = ValuationRegistry(price_feed, rate=fx.symbol_rate)
+
+
+def _market_price(symbol):
+    """
+    Latest server-side price of symbol in the display currency, or None.
+    Orders are matched at this price, never at one sent by the client.
+    """
+    hist = get_recent_history_batch([symbol]).get(symbol)
+    if hist is None or hist.empty:
+        return None
+    return float(hist['Close'].iloc[-1]) * fx.symbol_rate(symbol)
+
+
+def _on_market_tick(symbol, price, timestamp):
+    matching_engine.on_price(symbol, price * fx.symbol_rate(symbol))
+
+
+_ticked_symbols = set()
+_ticked_symbols_lock = threading.Lock()
+
+
+def _tick_engine(symbol):
+    """
+    Feed symbol's price polls to the matching engine, so resting and stop
+    orders fill as the market moves.
+    """
+    with _ticked_symbols_lock:
+        if symbol in _ticked_symbols:
+            return
+        _ticked_symbols.add(symbol)
+    price_feed.subscribe(symbol, _on_market_tick)
+
+
+def _optional_price(value):
+    if value in (None, ''):
+        return None
+    return float(value)
+
+
 @app.route('/execute_trade', methods=['POST'])
 def execute_trade():
     if 'username' not in session:
@@ -544,113 +547,82 @@ def execute_trade():
         symbol = data.get('symbol', '').strip().upper()
         action = data.get('action', '').lower()
         quantity = int(data.get('quantity', 0))
-        price = float(data.get('price', 0))
+        order_type = str(data.get('order_type', 'market')).strip().lower()
+        limit_price = _optional_price(data.get('limit_price'))
+        trigger_price = _optional_price(data.get('trigger_price'))
         
-        print(f"Trade execution: user={username}, symbol={symbol}, action={action}, qty={quantity}, price={price}")
+        logger.debug("Trade execution: user=%s, symbol=%s, action=%s, qty=%s, type=%s",
+                     username, symbol, action, quantity, order_type)
         
         # Validate inputs
-        if not symbol or action not in ['buy', 'sell'] or quantity <= 0 or price <= 0:
+        if not symbol or action not in ['buy', 'sell'] or quantity <= 0:
             return jsonify({'success': False, 'message': 'Invalid trade parameters'}), 400
         
-        # Create trade record
-        trade_record = {
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'symbol': symbol,
-            'action': action,
-            'quantity': quantity,
-            'price': round(price, 2)
-        }
-        
-        # Initialize user's trading history if not exists
-        if username not in MOCK_TRADING_HISTORY:
-            MOCK_TRADING_HISTORY[username] = []
+        # The client's 'price' is display only, fills use the server's quote
+        price = _market_price(symbol)
+        if price is None:
+            return jsonify({'success': False, 'message': f'No market price available for {symbol}'}), 503
         
-        # Add trade to history
-        MOCK_TRADING_HISTORY[username].insert(0, trade_record)  # Add to beginning
-        
-        # Update portfolio
-        if username not in MOCK_PORTFOLIO:
-            MOCK_PORTFOLIO[username] = []
-        
-        portfolio = MOCK_PORTFOLIO[username]
-        
-        if action == 'buy':
-            # Find existing position
-            existing = None
-            for item in portfolio:
-                if item['symbol'] == symbol:
-                    existing = item
-                    break
-            
-            if existing:
-                # Update existing position
-                total_cost = (existing['quantity'] * existing['avg_price']) + (quantity * price)
-                existing['quantity'] += quantity
-                existing['avg_price'] = total_cost / existing['quantity']
-            else:
-                # Create new position
-                portfolio.append({
-                    'symbol': symbol,
-                    'quantity': quantity,
-                    'avg_price': price
-                })
-        
-        elif action == 'sell':
-            # Find existing position
-            existing = None
-            for item in portfolio:
-                if item['symbol'] == symbol:
-                    existing = item
-                    break
-            
-            if existing:
-                if existing['quantity'] >= quantity:
-                    existing['quantity'] -= quantity
-                    # Remove if quantity becomes zero
-                    if existing['quantity'] == 0:
-                        portfolio.remove(existing)
-                else:
-                    return jsonify({
-                        'success': False, 
-                        'message': f'Insufficient shares. You have {existing["quantity"]} shares of {symbol}'
-                    }), 400
-            else:
+        if action == 'sell':
+            portfolio = MOCK_PORTFOLIO.get(username)
+            held = portfolio.quantity(symbol) if portfolio else 0
+            if held == 0:
                 return jsonify({
                     'success': False, 
                     'message': f'You don\'t own any shares of {symbol}'
                 }), 400
+            # Shares already promised to open sell orders are not available
+            reserved = sum(order.remaining for order in matching_engine.open_orders(username, symbol)
+                           if order.side == 'sell')
+            if held - reserved < quantity:
+                return jsonify({
+                    'success': False, 
+                    'message': f'Insufficient shares. You have {held} shares of {symbol}'
+                               + (f' ({reserved} reserved by open orders)' if reserved else '')
+                }), 400
         
-        # Try to save to database
         try:
-            conn = mysql.connector.connect(
-                host='localhost',
-                user='root',
-                password='1234',
-                database='stock_trading'
-            )
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO trading_history (username, symbol, action, quantity, price, trade_date) VALUES (%s, %s, %s, %s, %s, %s)",
-                (username, symbol, action, quantity, price, trade_record['date'])
-            )
-            conn.commit()
-            cursor.close()
-            conn.close()
-            print(f"Trade saved to database: {symbol} {action}")
-        except mysql.connector.Error as err:
-            print(f"Database error saving trade: {err}")
-            # Continue anyway, data is in MOCK
-        
-        print(f"Trade executed successfully: {symbol} {action} {quantity} @ {price}")
+            order, fills = matching_engine.submit(username, symbol, action, quantity, order_type,
+                                                  limit_price=limit_price, trigger_price=trigger_price,
+                                                  reference_price=price)
+        except OrderError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        if order.active:
+            _tick_engine(symbol)
+        
+        order_info = order.to_dict()
+        if order.filled:
+            trade_record = {
+                'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'symbol': symbol,
+                'action': action,
+                'quantity': order.filled,
+                'price': round(order_info['avg_fill_price'], 2)
+            }
+        else:
+            trade_record = None
+        
+        if order.status == 'filled':
+            logger.debug("Trade executed successfully: %s %s %s @ %s", symbol, action, quantity, trade_record['price'])
+            message = f'Trade completed successfully! {action.upper()} {quantity} shares of {symbol} at ₹{trade_record["price"]:.2f}'
+        elif order.filled:
+            message = f'Order partially filled: {action.upper()} {order.filled} of {quantity} shares of {symbol} at ₹{trade_record["price"]:.2f}'
+            if order.active:
+                message += f', {order.remaining} still open'
+        elif order.active:
+            message = f'{order_type.upper()} order placed: {action.upper()} {quantity} shares of {symbol} (order #{order.order_id})'
+        else:
+            return jsonify({'success': False, 'message': 'Order could not be filled', 'order': order_info}), 400
         
         return jsonify({
             'success': True,
-            'message': f'Trade completed successfully! {action.upper()} {quantity} shares of {symbol} at ₹{price:.2f}',
-            'trade': trade_record
+            'message': message,
+            'trade': trade_record,
+            'order': order_info
         })
         
     except Exception as e:
-        print(f"Error executing trade: {e}")
+        logger.exception("Error executing trade")
         import traceback
         traceback.print_exc()
         return jsonify({
@@ -658,6 +630,54 @@ def execute_trade():
             'message': f'Trade failed: {str(e)}'
         }), 500
 
+@app.route('/open_orders')
+def open_orders():
+    if 'username' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    
+    symbol = request.args.get('symbol')
+    orders = matching_engine.open_orders(session['username'], symbol)
+    return jsonify({'success': True, 'orders': [order.to_dict() for order in orders]})
+
+@app.route('/cancel_order', methods=['POST'])
+def cancel_order():
+    if 'username' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    
+    data = request.get_json() or {}
+    try:
+        order = matching_engine.cancel(int(data.get('order_id', 0)), owner=session['username'])
+    except (OrderError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'message': f'Order #{order.order_id} cancelled', 'order': order.to_dict()})
+
+@app.route('/amend_order', methods=['POST'])
+def amend_order():
+    if 'username' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    
+    data = request.get_json() or {}
+    try:
+        quantity = data.get('quantity')
+        order = matching_engine.orders.get(int(data.get('order_id', 0)))
+        if order is not None and order.side == 'sell' and quantity not in (None, ''):
+            portfolio = MOCK_PORTFOLIO.get(session['username'])
+            held = portfolio.quantity(order.symbol) if portfolio else 0
+            reserved = sum(other.remaining for other in matching_engine.open_orders(session['username'], order.symbol)
+                           if other.side == 'sell' and other is not order)
+            if int(quantity) - order.filled > held - reserved:
+                return jsonify({'success': False, 'message': f'Insufficient shares. You have {held} shares of {order.symbol}'}), 400
+        order, fills = matching_engine.amend(
+            int(data.get('order_id', 0)),
+            owner=session['username'],
+            quantity=int(quantity) if quantity not in (None, '') else None,
+            limit_price=_optional_price(data.get('limit_price')),
+            trigger_price=_optional_price(data.get('trigger_price'))
+        )
+    except (OrderError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'message': f'Order #{order.order_id} amended', 'order': order.to_dict()})
+
 @app.route('/stock_graph')
 def stock_graph():
     if 'username' not in session:
@@ -672,6 +692,66 @@ def stock_graph():
                          symbol=symbol,
                          period=period)
 
+def _predict_symbol(symbol):
+    """
+    Build the next-week prediction for one symbol, or None without data.
+    Runs on the prediction worker pool.
+    """
+    # Fetch stock data using yfinance
+    hist = get_history(symbol, period="3mo")
+    
+    if hist.empty:
+        return None
+        
+    # Get current price
+    current_price = float(hist['Close'].iloc[-1])
+    
+    # Calculate technical indicators (moving averages and RSI)
+    indicators = indicator_states.latest((symbol.upper(), '3mo', '1d'), hist)
+    ma20 = indicators['ma20']
+    ma50 = indicators['ma50']
+    rsi_value = indicators['rsi'] if not math.isnan(indicators['rsi']) else 50.0
+    
+    # Get company name
+    company_name = symbol_metadata.name(symbol)
+    
+    # Simple prediction logic
+    buy_signals = 0
+    sell_signals = 0
+    
+    # Moving average signals
+    if current_price > ma20:
+        buy_signals += 1
+    else:
+        sell_signals += 1
+        
+    if ma20 > ma50:
+        buy_signals += 1
+    else:
+        sell_signals += 1
+        
+    # RSI signals
+    if rsi_value < 30:
+        buy_signals += 1
+    elif rsi_value > 70:
+        sell_signals += 1
+    else:
+        # Neutral RSI
+        pass
+    
+    # Create prediction object
+    prediction = {
+        'symbol': symbol,
+        'name': company_name,
+        'current_price': fx.convert(current_price, symbol),  # In INR
+        'rsi': round(rsi_value, 2),
+        'buy_signals': buy_signals,
+        'sell_signals': sell_signals,
+        'recommendation': 'Strong Buy' if buy_signals >= 2 else ('Strong Sell' if sell_signals >= 2 else 'Hold')
+    }
+    
+    return prediction
+
 @app.route('/predict_next_week')
 def predict_next_week():
     if 'username' not in session:
@@ -679,102 +759,43 @@ def predict_next_week():
     
     username = session['username']
     
-    # Sample stock symbols for predictions
-    stock_symbols = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META', 'NFLX', 'AMD', 'INTC']
-    
     go_high_predictions = []
     go_low_predictions = []
     neutral_predictions = []
     
-    # Generate predictions for each stock
-    for symbol in stock_symbols:
+    # Warm the cache for the whole watchlist with one batched download;
+    # symbol workers that start before it finishes wait on it instead of
+    # fetching on their own
+    prediction_executor.submit(get_history_batch, PREDICTION_WATCHLIST, period="3mo")
+    
+    # Generate predictions for all stocks in parallel
+    futures = {prediction_executor.submit(_predict_symbol, symbol): symbol for symbol in PREDICTION_WATCHLIST}
+    done, not_done = wait(futures, timeout=PREDICTION_TIMEOUT)
+    
+    # Render whatever finished in time, slow symbols are skipped this round
+    for future in not_done:
+        future.cancel()
+        logger.warning("Prediction for %s timed out after %ss", futures[future], PREDICTION_TIMEOUT)
+    
+    for future, symbol in futures.items():
+        if future not in done:
+            continue
         try:
-            # Fetch stock data using yfinance
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period="3mo")
-            
-            if hist.empty:
-                continue
-                
-            # Get current price
-            current_price = float(hist['Close'].iloc[-1])
-            
-            # Calculate technical indicators
-            # Moving averages
-            hist['MA20'] = hist['Close'].rolling(window=20).mean()
-            hist['MA50'] = hist['Close'].rolling(window=50).mean()
-            
-            ma20 = hist['MA20'].iloc[-1]
-            ma50 = hist['MA50'].iloc[-1]
-            
-            # RSI calculation
-            delta = hist['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            rsi_value = 50.0  # Default
-            try:
-                rsi_value = float(rsi.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-            except:
-                try:
-                    rsi_value = float(pd.Series(rsi).iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-                except:
-                    pass
-            
-            # Get company name
-            try:
-                info = stock.info
-                company_name = info.get('longName', symbol)
-            except:
-                company_name = symbol
-            
-            # Simple prediction logic
-            buy_signals = 0
-            sell_signals = 0
-            
-            # Moving average signals
-            if current_price > ma20:
-                buy_signals += 1
-            else:
-                sell_signals += 1
-                
-            if ma20 > ma50:
-                buy_signals += 1
-            else:
-                sell_signals += 1
-                
-            # RSI signals
-            if rsi_value < 30:
-                buy_signals += 1
-            elif rsi_value > 70:
-                sell_signals += 1
-            else:
-                # Neutral RSI
-                pass
-            
-            # Create prediction object
-            prediction = {
-                'symbol': symbol,
-                'name': company_name,
-                'current_price': current_price,
-                'rsi': round(rsi_value, 2),
-                'buy_signals': buy_signals,
-                'sell_signals': sell_signals,
-                'recommendation': 'Strong Buy' if buy_signals >= 2 else ('Strong Sell' if sell_signals >= 2 else 'Hold')
-            }
-            
-            # Categorize predictions
-            if buy_signals >= 2:
-                go_high_predictions.append(prediction)
-            elif sell_signals >= 2:
-                go_low_predictions.append(prediction)
-            else:
-                neutral_predictions.append(prediction)
-                
-        except Exception as e:
-            print(f"Error generating prediction for {symbol}: {e}")
+            prediction = future.result()
+        except Exception:
+            logger.exception("Error generating prediction for %s", symbol)
             continue
+        
+        if prediction is None:
+            continue
+        
+        # Categorize predictions
+        if prediction['buy_signals'] >= 2:
+            go_high_predictions.append(prediction)
+        elif prediction['sell_signals'] >= 2:
+            go_low_predictions.append(prediction)
+        else:
+            neutral_predictions.append(prediction)
     
     return render_template('predict_next_week.html', 
                          username=username,
@@ -791,8 +812,7 @@ def prediction_chart(symbol):
     
     try:
         # Fetch stock data using yfinance
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period="1mo")  # Last 30 days for historical data
+        hist = get_history(symbol, period="1mo")  # Last 30 days for historical data
         
         if hist.empty:
             return render_template('prediction_chart.html', 
@@ -800,44 +820,19 @@ def prediction_chart(symbol):
                                  error="No data available for this stock symbol")
         
         # Get current price and company name
-        current_price = float(hist['Close'].iloc[-1]) * 83.0  # Convert to INR
-        try:
-            info = stock.info
-            company_name = info.get('longName', symbol)
-        except:
-            company_name = symbol
+        rate = fx.symbol_rate(symbol)
+        current_price = float(hist['Close'].iloc[-1]) * rate  # Convert to INR
+        company_name = symbol_metadata.name(symbol)
         
         # Prepare historical data
         historical_dates = [idx.strftime('%Y-%m-%d') for idx in hist.index]
-        historical_prices = [float(val) * 83.0 for val in hist['Close']]  # Convert to INR
-        historical_ma20 = [float(val) * 83.0 if not pd.isna(val) else None for val in hist['MA20']] if 'MA20' in hist.columns else []
-        historical_ma50 = [float(val) * 83.0 if not pd.isna(val) else None for val in hist['MA50']] if 'MA50' in hist.columns else []
-        
-        # Calculate RSI for historical data
-        delta = hist['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        rsi_series = 100 - (100 / (1 + rs))
-        # Convert to list safely
-        historical_rsi = []
-        try:
-            # Handle case where rsi_series might be a scalar by converting to Series
-            # pyright: ignore[reportAttributeAccessIssue, reportArgumentType]
-            if isinstance(rsi_series, (int, float)) or (hasattr(rsi_series, 'ndim') and rsi_series.ndim == 0):
-                rsi_series = pd.Series([float(rsi_series)] * len(historical_dates))
-            elif not isinstance(rsi_series, pd.Series):
-                rsi_series = pd.Series(rsi_series)
-            
-            for i in range(len(rsi_series)):
-                val = rsi_series.iloc[i]  # pyright: ignore[reportAttributeAccessIssue]
-                if not pd.isna(val):
-                    historical_rsi.append(float(val))
-                else:
-                    historical_rsi.append(None)
-        except:
-            # Fallback if the above approach doesn't work
-            historical_rsi = [50.0] * len(historical_dates)
+        historical_prices = fx.convert(hist['Close'], symbol).tolist()  # Convert to INR
+        
+        # Moving averages and RSI for historical data
+        indicators = compute_indicators(hist, include=('sma', 'rsi'))
+        historical_ma20 = to_json_list(indicators['ma20'], rate)  # Convert to INR
+        historical_ma50 = to_json_list(indicators['ma50'], rate)  # Convert to INR
+        historical_rsi = to_json_list(indicators['rsi'])
         
         # Simple prediction for next 7 days (mock data for now)
         # In a real application, this would use a machine learning model
@@ -876,8 +871,8 @@ def prediction_chart(symbol):
                              prediction_ma20=json.dumps(prediction_ma20),
                              prediction_rsi=json.dumps(prediction_rsi))
                              
-    except Exception as e:
-        print(f"Error generating prediction chart for {symbol}: {e}")
+    except Exception:
+        logger.exception("Error generating prediction chart for %s", symbol)
         return render_template('prediction_chart.html', 
                              username=username,
                              error="Error loading chart data")
@@ -896,7 +891,7 @@ def trading_history():
     # Get user's trading history
     user_trading_history = MOCK_TRADING_HISTORY[username]
     
-    print(f"Trading history for {username}: {len(user_trading_history)} trades")
+    logger.debug("Trading history for %s: %d trades", username, len(user_trading_history))
     
     return render_template('trading_history.html', 
                          username=username,
@@ -988,174 +983,129 @@ def sentiment_analysis():
                          stock_sentiments=stock_sentiments,
                          articles=articles)
 
-@app.route('/get_trading_signal')
-def get_trading_signal():
-    symbol = request.args.get('symbol', 'AAPL')
-    
+def _trading_signal(symbol):
     # Simple trading signal logic (in a real app, this would be more sophisticated)
     try:
         # Fetch stock data
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period="3mo")
+        hist = get_history(symbol, period="3mo")
+        note_bars(hist, '1d')
         
         if hist.empty:
-            return jsonify({
+            skip_cache()
+            return {
                 'signal': 'HOLD',
                 'reason': 'No data available'
-            })
+            }
         
-        # Calculate simple moving averages
-        hist['MA20'] = hist['Close'].rolling(window=20).mean()
-        hist['MA50'] = hist['Close'].rolling(window=50).mean()
+        # Simple moving averages, updated incrementally between polls
+        indicators = indicator_states.latest((symbol.upper(), '3mo', '1d'), hist)
         
-        current_price = hist['Close'].iloc[-1]
-        ma20 = hist['MA20'].iloc[-1]
-        ma50 = hist['MA50'].iloc[-1]
+        current_price = float(hist['Close'].iloc[-1])
+        ma20 = indicators['ma20']
+        ma50 = indicators['ma50']
+        display_price = fx.convert(current_price, symbol)
         
         # Simple signal logic
         if current_price > ma20 and ma20 > ma50:
             signal = 'BUY'
-            reason = f'GO HIGH: Price: ₹{current_price * 83:.2f} | Bullish trend'
+            reason = f'GO HIGH: Price: ₹{display_price:.2f} | Bullish trend'
         elif current_price < ma20 and ma20 < ma50:
             signal = 'SELL'
-            reason = f'GO LOW: Price: ₹{current_price * 83:.2f} | Bearish trend'
+            reason = f'GO LOW: Price: ₹{display_price:.2f} | Bearish trend'
         else:
             signal = 'HOLD'
-            reason = f'NEUTRAL: Price: ₹{current_price * 83:.2f} | Wait for clearer signal'
+            reason = f'NEUTRAL: Price: ₹{display_price:.2f} | Wait for clearer signal'
         
-        return jsonify({
+        return {
             'signal': signal,
             'reason': reason
-        })
-    except Exception as e:
-        print(f"Error generating trading signal for {symbol}: {e}")
-        return jsonify({
+        }
+    except Exception:
+        logger.exception("Error generating trading signal for %s", symbol)
+        skip_cache()
+        return {
             'signal': 'HOLD',
             'reason': 'Error generating signal'
-        })
+        }
+
+@app.route('/get_trading_signal')
+@cached_response(response_cache)
+def get_trading_signal():
+    symbol = request.args.get('symbol', 'AAPL')
+    return jsonify(_trading_signal(symbol))
+
+def _json_response(payload, status=200):
+    # jsonify for payloads holding NumPy arrays
+    return app.response_class(dumps_json(payload), status=status, mimetype='application/json')
+
+def _wants_chart_columns():
+    # ?format=columns, or an Accept header preferring the binary type
+    if request.args.get('format') == 'columns':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', COLUMNS_MIMETYPE]) == COLUMNS_MIMETYPE
+
+def _compressed_response(body, mimetype):
+    response = app.response_class(body, mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    if len(body) > 1024 and request.accept_encodings['gzip']:
+        with metrics.stage('serialization'):
+            response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 @app.route('/get_chart_data')
+@cached_response(response_cache)
 def get_chart_data():
-    symbol = request.args.get('symbol', 'AAPL')
-    period = request.args.get('period', '1y')
+    symbol, period, yf_period, yf_interval = _chart_query(request.args)
     
     try:
-        # Map period to yfinance period
-        period_map = {
-            '1d': '1d',
-            '1wk': '5d',
-            '1w': '5d',
-            '1mo': '1mo',
-            '1m': '1mo',
-            '3mo': '3mo',
-            '3m': '3mo',
-            '6mo': '6mo',
-            '6m': '6mo',
-            '1y': '1y',
-            '5y': '5y',
-            'max': 'max',
-            'all': 'max'
-        }
-        
-        # Map period to interval
-        interval_map = {
-            '1d': '5m',      # 5-minute intervals for 1 day
-            '1wk': '30m',    # 30-minute intervals for 1 week
-            '1w': '30m',
-            '1mo': '1d',     # 1-day intervals for 1 month
-            '1m': '1d',
-            '3mo': '1d',
-            '3m': '1d',
-            '6mo': '1d',
-            '6m': '1d',
-            '1y': '1d',
-            '5y': '1wk',
-            'max': '1wk',
-            'all': '1wk'
-        }
-        
-        yf_period = period_map.get(period, '1y')
-        yf_interval = interval_map.get(period, '1d')
-        
-        print(f"Fetching chart data for {symbol}, period={period}, yf_period={yf_period}, yf_interval={yf_interval}")
+        logger.debug("Fetching chart data for %s, period=%s, yf_period=%s, yf_interval=%s",
+                     symbol, period, yf_period, yf_interval)
         
         # Fetch stock data
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period=yf_period, interval=yf_interval)
+        hist = get_history(symbol, period=yf_period, interval=yf_interval)
         
         # If no data, try with default 1-month period
         if hist.empty:
-            print(f"No data with period={yf_period}, trying 1mo")
-            hist = stock.history(period='1mo', interval='1d')
+            logger.debug("No data with period=%s, trying 1mo", yf_period)
+            yf_interval = '1d'
+            hist = get_history(symbol, period='1mo', interval='1d')
+        note_bars(hist, yf_interval)
         
         if hist.empty:
-            print(f"Still no data for {symbol}")
+            logger.debug("Still no data for %s", symbol)
             return jsonify({
                 'error': 'No data available',
                 'symbol': symbol
             }), 404
         
-        # Convert to Indian Rupees and prepare data
-        dates = []
-        for idx in hist.index:
-            try:
-                dates.append(idx.strftime('%Y-%m-%d %H:%M:%S'))
-            except:
-                dates.append(str(idx))
+        # Dates formatted in one vectorized pass
+        dates = format_dates(hist.index)
         
-        prices = [float(val) * 83.0 for val in hist['Close']]  # Convert to INR
-        highs = [float(val) * 83.0 for val in hist['High']]  # Convert to INR
-        lows = [float(val) * 83.0 for val in hist['Low']]  # Convert to INR
+        # Convert to INR, all three columns in one array operation
+        rate = fx.symbol_rate(symbol)
+        prices, highs, lows = np.ascontiguousarray(fx.convert(hist[['Close', 'High', 'Low']], symbol).T)
         
         # Calculate technical indicators for chart overlay
         # Moving Averages (only for periods longer than 1 day)
-        ma20 = [None] * len(prices)
-        ma50 = [None] * len(prices)
-        rsi = [50.0] * len(prices)
+        ma20 = np.full(len(prices), np.nan)
+        ma50 = np.full(len(prices), np.nan)
+        rsi = np.full(len(prices), 50.0)
         
         if period != '1d' and len(hist) >= 20:
-            hist['MA20'] = hist['Close'].rolling(window=min(20, len(hist))).mean()
-            hist['MA50'] = hist['Close'].rolling(window=min(50, len(hist))).mean()
+            ma50_window = min(50, len(hist))
+            indicators = compute_indicators(hist, include=('sma', 'rsi'), sma_windows=(20, ma50_window))
             
             # Convert moving averages to INR
-            ma20 = [float(val) * 83.0 if not pd.isna(val) else None for val in hist['MA20']]
-            ma50 = [float(val) * 83.0 if not pd.isna(val) else None for val in hist['MA50']]
-            
-            # RSI calculation
-            if len(hist) >= 14:
-                delta = hist['Close'].diff()
-                gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                rs = gain / loss
-                rsi_series = 100 - (100 / (1 + rs))
-                
-                # Convert RSI to list
-                rsi = []
-                try:
-                    # Handle case where rsi_series might be a scalar by converting to Series
-                    # pyright: ignore[reportAttributeAccessIssue, reportArgumentType]
-                    if isinstance(rsi_series, (int, float)) or (hasattr(rsi_series, 'ndim') and rsi_series.ndim == 0):
-                        rsi_series = pd.Series([float(rsi_series)] * len(dates))
-                    elif not isinstance(rsi_series, pd.Series):
-                        rsi_series = pd.Series(rsi_series)
-                    
-                    for i in range(len(rsi_series)):
-                        val = rsi_series.iloc[i]  # pyright: ignore[reportAttributeAccessIssue]
-                        if not pd.isna(val):
-                            rsi.append(float(val))
-                        else:
-                            rsi.append(None)
-                except:
-                    # Fallback if the above approach doesn't work
-                    rsi = [50.0] * len(dates)
+            ma20 = indicators['ma20'] * rate
+            ma50 = indicators[f'ma{ma50_window}'] * rate
+            rsi = indicators['rsi']
         
         # Enhanced AI features
         # Calculate volatility
-        if len(prices) > 1:
-            returns = []
-            for i in range(1, len(prices)):
-                returns.append((prices[i] - prices[i-1]) / prices[i-1])
-            volatility = np.std(returns) * np.sqrt(252) if len(returns) > 1 else 0
+        if len(prices) > 2:
+            returns = np.diff(prices) / prices[:-1]
+            volatility = float(np.std(returns) * np.sqrt(252))
         else:
             volatility = 0
         
@@ -1170,31 +1120,41 @@ def get_chart_data():
         support_level = 0
         resistance_level = 0
         if period != '1d' and len(prices) > 0:
-            support_level = min(prices) * 0.99
-            resistance_level = max(prices) * 1.01
+            support_level = float(prices.min()) * 0.99
+            resistance_level = float(prices.max()) * 1.01
         
         # Calculate next day prediction
         if len(prices) > 1:
-            # Simple momentum-based prediction
-            recent_changes = []
-            for i in range(max(0, len(prices) - 10), len(prices)):
-                if i > 0:
-                    recent_changes.append(prices[i] - prices[i-1])
-            
-            if len(recent_changes) > 0:
-                avg_change = sum(recent_changes) / len(recent_changes)
-                # Add some randomness based on volatility
-                volatility_factor = volatility * prices[-1] * 0.1
-                random_factor = np.random.normal(0, volatility_factor)
-                next_day_prediction = prices[-1] + avg_change + random_factor
-            else:
-                next_day_prediction = prices[-1]
+            # Simple momentum-based prediction from the last ten moves
+            avg_change = float(np.diff(prices[-11:]).mean())
+            # Add some randomness based on volatility
+            volatility_factor = volatility * prices[-1] * 0.1
+            random_factor = np.random.normal(0, volatility_factor)
+            next_day_prediction = float(prices[-1] + avg_change + random_factor)
         else:
-            next_day_prediction = prices[-1] if prices else 0
+            next_day_prediction = float(prices[-1]) if len(prices) else 0
         
-        print(f"Successfully fetched {len(dates)} data points for {symbol}")
+        logger.debug("Successfully fetched %d data points for %s", len(dates), symbol)
         
-        return jsonify({
+        ai_features = {
+            'volatility': round(volatility, 4),
+            'trend_direction': trend_direction,
+            'support_level': round(support_level, 2),
+            'resistance_level': round(resistance_level, 2),
+            'next_day_prediction': round(next_day_prediction, 2),
+            'data_points': len(dates)
+        }
+        
+        if _wants_chart_columns() and hasattr(hist.index, 'tz'):
+            # Compact binary body for the chart pages (timestamped data only),
+            # see serialization.pack_columns
+            body = pack_columns(wall_seconds(hist.index),
+                                {'y': prices, 'ma20': ma20, 'ma50': ma50, 'rsi': rsi, 'high': highs, 'low': lows},
+                                {'symbol': symbol, 'ai_features': ai_features})
+            return _compressed_response(body, COLUMNS_MIMETYPE)
+        
+        # Columns stay NumPy arrays, NaN is written as null
+        return _json_response({
             'symbol': symbol,
             'data': {
                 'x': dates,
@@ -1205,17 +1165,10 @@ def get_chart_data():
             },
             'high': highs,
             'low': lows,
-            'ai_features': {
-                'volatility': round(volatility, 4),
-                'trend_direction': trend_direction,
-                'support_level': round(support_level, 2),
-                'resistance_level': round(resistance_level, 2),
-                'next_day_prediction': round(next_day_prediction, 2),
-                'data_points': len(dates)
-            }
+            'ai_features': ai_features
         })
     except Exception as e:
-        print(f"Error fetching chart data for {symbol}: {e}")
+        logger.exception("Error fetching chart data for %s", symbol)
         import traceback
         traceback.print_exc()
         return jsonify({
@@ -1224,30 +1177,21 @@ def get_chart_data():
             'symbol': symbol
         }), 500
 
-@app.route('/get_multiple_stock_data')
-def get_multiple_stock_data():
-    symbols = request.args.get('symbols', 'AAPL,MSFT,GOOGL')
-    symbol_list = symbols.split(',')
-    
+def _stock_quotes(symbol_list):
+    """
+    Latest price, change and company name for each symbol, in INR.
+    """
     stock_data = []
     
+    # Most recent bars for all symbols (1-minute, then hourly, then daily),
+    # fetched with one batched download per fallback level
+    histories = get_recent_history_batch([symbol.strip() for symbol in symbol_list])
+    
     for symbol in symbol_list:
         try:
-            # Fetch stock data using yfinance
-            stock = yf.Ticker(symbol.strip())
-            
-            # Try to get the most recent data (1 day with 1-minute intervals for maximum recency)
-            hist = stock.history(period="1d", interval="1m")
-            
-            # If no 1-minute data, try hourly data
-            if hist.empty:
-                hist = stock.history(period="5d", interval="1h")
-                
-            # If still empty, fallback to daily data
-            if hist.empty:
-                hist = stock.history(period="1mo")
+            hist = histories.get(symbol.strip())
                 
-            if hist.empty:
+            if hist is None or hist.empty:
                 stock_data.append({
                     'symbol': symbol.strip(),
                     'price': 0.0,
@@ -1270,26 +1214,23 @@ def get_multiple_stock_data():
                 change_percent = 0.0
                 
             # Get company name
-            try:
-                info = stock.info
-                company_name = info.get('longName', symbol.strip())
-            except:
-                company_name = symbol.strip()
+            company_name = symbol_metadata.name(symbol.strip())
                 
             # Ensure all values are proper floats
             current_price = float(current_price)
             change = float(change)
             change_percent = float(change_percent)
                 
+            rate = fx.symbol_rate(symbol.strip())
             stock_data.append({
                 'symbol': symbol.strip(),
-                'price': round(current_price * 83.0, 2),
-                'change': round(change * 83.0, 2),
+                'price': round(current_price * rate, 2),
+                'change': round(change * rate, 2),
                 'changePercent': round(change_percent, 2),
                 'name': company_name
             })
-        except Exception as e:
-            print(f"Error fetching data for {symbol}: {e}")
+        except Exception:
+            logger.exception("Error fetching data for %s", symbol)
             # Return default data in case of error
             stock_data.append({
                 'symbol': symbol.strip(),
@@ -1299,7 +1240,11 @@ def get_multiple_stock_data():
                 'name': symbol.strip()
             })
     
-    return jsonify(stock_data)
+    return stock_data
+
+@app.route('/get_multiple_stock_data')
+def get_multiple_stock_data():
+    return jsonify(_stock_quotes(_quote_symbols(request.args)))
 
 @app.route('/get_1d_prediction')
 def get_1d_prediction():
@@ -1307,8 +1252,7 @@ def get_1d_prediction():
     
     try:
         # Fetch stock data
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period="1mo")
+        hist = get_history(symbol, period="1mo")
         
         if hist.empty:
             return jsonify({
@@ -1318,33 +1262,14 @@ def get_1d_prediction():
             })
         
         # Simple prediction logic (in a real app, this would be more sophisticated)
-        current_price = hist['Close'].iloc[-1]
-        previous_price = hist['Close'].iloc[-2] if len(hist) > 1 else current_price
-        
-        # Calculate simple moving averages
-        hist['MA20'] = hist['Close'].rolling(window=20).mean()
-        hist['MA50'] = hist['Close'].rolling(window=50).mean()
-        
-        ma20 = hist['MA20'].iloc[-1]
-        ma50 = hist['MA50'].iloc[-1]
-        
-        # RSI calculation
-        delta = hist['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        # Extract RSI value safely with default fallback
-        rsi_value = 50.0  # Default neutral RSI value
-
-        # Simple approach to avoid linter errors
-        try:
-            rsi_value = float(rsi.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        except:
-            try:
-                rsi_value = float(pd.Series(rsi).iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-            except:
-                pass  # Keep default value
+        current_price = float(hist['Close'].iloc[-1])
+        previous_price = float(hist['Close'].iloc[-2]) if len(hist) > 1 else current_price
+        
+        # Moving averages and RSI, updated incrementally between polls
+        indicators = indicator_states.latest((symbol.upper(), '1mo', '1d'), hist)
+        ma20 = indicators['ma20']
+        ma50 = indicators['ma50']
+        rsi_value = indicators['rsi'] if not math.isnan(indicators['rsi']) else 50.0  # Default neutral RSI value
         
         # Simple price prediction based on trend
         price_change = current_price - previous_price
@@ -1352,28 +1277,29 @@ def get_1d_prediction():
         
         # Predict next day price (simple linear extrapolation with dampening)
         predicted_price_usd = current_price + (price_change * 0.5)  # 50% dampening factor
-        predicted_price_inr = predicted_price_usd * 83.0  # Convert to INR
+        rate = fx.symbol_rate(symbol)
+        predicted_price_inr = predicted_price_usd * rate  # Convert to INR
         
         # Simple prediction logic
         if current_price > ma20 and ma20 > ma50 and rsi_value < 70:
             prediction = 'BUY'
-            reason = f'GO HIGH: Current: ₹{current_price * 83:.2f} | Predicted: ₹{predicted_price_inr:.2f} | RSI: {rsi_value:.1f}'
+            reason = f'GO HIGH: Current: ₹{current_price * rate:.2f} | Predicted: ₹{predicted_price_inr:.2f} | RSI: {rsi_value:.1f}'
         elif current_price < ma20 and ma20 < ma50 and rsi_value > 30:
             prediction = 'SELL'
-            reason = f'GO LOW: Current: ₹{current_price * 83:.2f} | Predicted: ₹{predicted_price_inr:.2f} | RSI: {rsi_value:.1f}'
+            reason = f'GO LOW: Current: ₹{current_price * rate:.2f} | Predicted: ₹{predicted_price_inr:.2f} | RSI: {rsi_value:.1f}'
         else:
             prediction = 'HOLD'
-            reason = f'NEUTRAL: Current: ₹{current_price * 83:.2f} | Predicted: ₹{predicted_price_inr:.2f} | RSI: {rsi_value:.1f}'
+            reason = f'NEUTRAL: Current: ₹{current_price * rate:.2f} | Predicted: ₹{predicted_price_inr:.2f} | RSI: {rsi_value:.1f}'
         
         return jsonify({
             'prediction': prediction,
             'reason': reason,
             'predicted_price': round(predicted_price_inr, 2),
-            'current_price': round(current_price * 83.0, 2),
+            'current_price': round(current_price * rate, 2),
             'rsi': round(rsi_value, 2)
         })
-    except Exception as e:
-        print(f"Error generating prediction for {symbol}: {e}")
+    except Exception:
+        logger.exception("Error generating prediction for %s", symbol)
         import traceback
         traceback.print_exc()
         return jsonify({
@@ -1383,25 +1309,20 @@ def get_1d_prediction():
         })
 
 @app.route('/get_stock_data')
+@cached_response(response_cache)
 def get_stock_data():
-    symbol = request.args.get('symbol', 'AAPL')
+    symbol = _quote_symbol(request.args)
     
     try:
-        # Fetch stock data using yfinance
-        stock = yf.Ticker(symbol)
-        
-        # Try to get the most recent data (1 day with 1-minute intervals for maximum recency)
-        hist = stock.history(period="1d", interval="1m")
-        
-        # If no 1-minute data, try hourly data
-        if hist.empty:
-            hist = stock.history(period="5d", interval="1h")
-            
-        # If still empty, fallback to daily data
-        if hist.empty:
-            hist = stock.history(period="1mo")
+        # Most recent data first: 1-minute bars, then hourly, then daily
+        for period, interval in RECENT_HISTORY_FALLBACKS:
+            hist = get_history(symbol, period=period, interval=interval)
+            if not hist.empty:
+                break
+        note_bars(hist, interval)
             
         if hist.empty:
+            skip_cache()
             return jsonify({
                 'symbol': symbol,
                 'price': 0.0,
@@ -1423,27 +1344,25 @@ def get_stock_data():
             change_percent = 0.0
             
         # Get company name
-        try:
-            info = stock.info
-            company_name = info.get('longName', symbol)
-        except:
-            company_name = symbol
+        company_name = symbol_metadata.name(symbol)
             
         # Ensure all values are proper floats
         current_price = float(current_price)
         change = float(change)
         change_percent = float(change_percent)
             
+        rate = fx.symbol_rate(symbol)
         return jsonify({
             'symbol': symbol,
-            'price': round(current_price * 83.0, 2),
-            'change': round(change * 83.0, 2),
+            'price': round(current_price * rate, 2),
+            'change': round(change * rate, 2),
             'changePercent': round(change_percent, 2),
             'name': company_name
         })
-    except Exception as e:
-        print(f"Error fetching data for {symbol}: {e}")
-        # Return default data in case of error
+    except Exception:
+        logger.exception("Error fetching data for %s", symbol)
+        # Return default data in case of error, but only this once
+        skip_cache()
         return jsonify({
             'symbol': symbol,
             'price': 8300.00,
@@ -1453,6 +1372,7 @@ def get_stock_data():
         })
 
 @app.route('/get_technical_indicators')
+@cached_response(response_cache)
 def get_technical_indicators():
     symbol = request.args.get('symbol', 'AAPL')
     period = request.args.get('period', '1y')  # Get period parameter
@@ -1472,83 +1392,63 @@ def get_technical_indicators():
         yf_period = period_map.get(period, '1y')
         
         # Fetch stock data using yfinance
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period=yf_period)
+        hist = get_history(symbol, period=yf_period)
+        note_bars(hist, '1d')
         
         if hist.empty:
             return jsonify({
                 'error': 'No data available'
             }), 404
         
-        # Calculate technical indicators
-        # Moving Averages
-        hist['MA20'] = hist['Close'].rolling(window=20).mean()
-        hist['MA50'] = hist['Close'].rolling(window=50).mean()
-        hist['MA200'] = hist['Close'].rolling(window=200).mean()
-        hist['EMA12'] = hist['Close'].ewm(span=12).mean()  # pyright: ignore[reportAttributeAccessIssue]
-        hist['EMA26'] = hist['Close'].ewm(span=26).mean()  # pyright: ignore[reportAttributeAccessIssue]
+        # Latest indicator values; only bars that closed since the last poll
+        # are folded into the per-symbol state
+        indicators = indicator_states.latest((symbol.upper(), yf_period, '1d'), hist)
         
-        # Current values
-        current_price = float(hist['Close'].iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        ma20 = float(hist['MA20'].iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        ma50 = float(hist['MA50'].iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        ma200 = float(hist['MA200'].iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        ema12 = float(hist['EMA12'].iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        ema26 = float(hist['EMA26'].iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        
-        # RSI
-        delta = hist['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        # Extract RSI value safely with default fallback
-        rsi_value = 50.0  # Default neutral RSI value
-        # Simple approach to avoid linter errors
-        try:
-            rsi_value = float(rsi.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        except:
-            try:
-                rsi_value = float(pd.Series(rsi).iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-            except:
-                pass  # Keep default value
+        def latest(name, default):
+            value = indicators[name]
+            return default if math.isnan(value) else value
+        
+        # Current values; an average the period is too short for is None
+        current_price = float(hist['Close'].iloc[-1])
+        rate = fx.symbol_rate(symbol)
+        ma20 = latest('ma20', None)
+        ma50 = latest('ma50', None)
+        ma200 = latest('ma200', None)
+        ema12 = latest('ema12', current_price)
+        ema26 = latest('ema26', current_price)
+        rsi_value = latest('rsi', 50.0)  # Default neutral RSI value
         
         # MACD
-        macd_line = ema12 - ema26
-        signal_line = macd_line.ewm(span=9).mean()  # pyright: ignore[reportAttributeAccessIssue]
-        histogram = macd_line - signal_line
-        macd_value = float(macd_line.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        signal_value = float(signal_line.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        histogram_value = float(histogram.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
+        macd_value = latest('macd', 0.0)
+        signal_value = latest('macd_signal', 0.0)
+        histogram_value = latest('macd_hist', 0.0)
         
         # Stochastic Oscillator
-        low_14 = hist['Low'].rolling(window=14).min()
-        high_14 = hist['High'].rolling(window=14).max()
-        stoch_k = 100 * ((current_price - low_14) / (high_14 - low_14))
-        stoch_d = stoch_k.rolling(window=3).mean()
-        stoch_k_value = float(stoch_k.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        stoch_d_value = float(stoch_d.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
+        stoch_k_value = latest('stoch_k', 50.0)
+        stoch_d_value = latest('stoch_d', 50.0)
         
         # Bollinger Bands
-        bb_window = 20
-        bb_std = 2
-        hist['BB_MA'] = hist['Close'].rolling(window=bb_window).mean()
-        hist['BB_STD'] = hist['Close'].rolling(window=bb_window).std()
-        bb_upper = hist['BB_MA'] + (bb_std * hist['BB_STD'])
-        bb_lower = hist['BB_MA'] - (bb_std * hist['BB_STD'])
-        bb_middle = hist['BB_MA']
-        bb_upper_value = float(bb_upper.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        bb_middle_value = float(bb_middle.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        bb_lower_value = float(bb_lower.iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
+        bb_upper_value = latest('bb_upper', None)
+        bb_middle_value = latest('bb_middle', None)
+        bb_lower_value = latest('bb_lower', None)
         
         # Volume indicators
-        current_volume = float(hist['Volume'].iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
-        volume_ma = float(hist['Volume'].rolling(window=20).mean().iloc[-1])  # pyright: ignore[reportAttributeAccessIssue]
+        current_volume = float(hist['Volume'].iloc[-1])
+        volume_ma = latest('volume_ma', current_volume)
         
         # Status calculations
-        ma20_position = 'Above' if current_price > ma20 else 'Below'
-        ma50_position = 'Above' if current_price > ma50 else 'Below'
-        ma200_position = 'Above' if current_price > ma200 else 'Below'
+        def position(average):
+            if average is None:
+                return 'Neutral'
+            return 'Above' if current_price > average else 'Below'
+        
+        def shown(value):
+            # Missing averages and bands are displayed at the current price
+            return round((current_price if value is None else value) * rate, 2)
+        
+        ma20_position = position(ma20)
+        ma50_position = position(ma50)
+        ma200_position = position(ma200)
         
         rsi_status = 'Neutral'
         if rsi_value < 30:
@@ -1569,7 +1469,9 @@ def get_technical_indicators():
             stoch_status = 'Oversold'
             
         bb_position = 'Neutral'
-        if current_price > bb_upper_value:
+        if bb_upper_value is None or bb_lower_value is None:
+            pass
+        elif current_price > bb_upper_value:
             bb_position = 'Above Upper Band'
         elif current_price < bb_lower_value:
             bb_position = 'Below Lower Band'
@@ -1584,15 +1486,15 @@ def get_technical_indicators():
         
         return jsonify({
             'symbol': symbol,
-            'price': round(current_price * 83.0, 2),
-            'ma20': round(ma20 * 83.0, 2),
+            'price': round(current_price * rate, 2),
+            'ma20': shown(ma20),
             'ma20_position': ma20_position,
-            'ma50': round(ma50 * 83.0, 2),
+            'ma50': shown(ma50),
             'ma50_position': ma50_position,
-            'ma200': round(ma200 * 83.0, 2),
+            'ma200': shown(ma200),
             'ma200_position': ma200_position,
-            'ema12': round(ema12 * 83.0, 2),
-            'ema26': round(ema26 * 83.0, 2),
+            'ema12': round(ema12 * rate, 2),
+            'ema26': round(ema26 * rate, 2),
             'rsi': round(rsi_value, 2),
             'rsi_status': rsi_status,
             'macd': round(macd_value, 4),
@@ -1602,17 +1504,18 @@ def get_technical_indicators():
             'stoch_k': round(stoch_k_value, 2),
             'stoch_d': round(stoch_d_value, 2),
             'stoch_status': stoch_status,
-            'bb_upper': round(bb_upper_value * 83.0, 2),
-            'bb_middle': round(bb_middle_value * 83.0, 2),
-            'bb_lower': round(bb_lower_value * 83.0, 2),
+            'bb_upper': shown(bb_upper_value),
+            'bb_middle': shown(bb_middle_value),
+            'bb_lower': shown(bb_lower_value),
             'bb_position': bb_position,
             'volume': int(current_volume),
             'volume_ma': int(volume_ma),
             'volume_status': volume_status
         })
-    except Exception as e:
-        print(f"Error calculating technical indicators for {symbol}: {e}")
-        # Return default data in case of error
+    except Exception:
+        logger.exception("Error calculating technical indicators for %s", symbol)
+        # Return default data in case of error, but only this once
+        skip_cache()
         return jsonify({
             'symbol': symbol,
             'price': 8300.00,
@@ -1642,117 +1545,94 @@ def get_technical_indicators():
             'volume_status': 'Neutral'
         })
 
+@app.route('/market_data_stats')
+def market_data_stats():
+    # Hit/miss/eviction counters of the shared history cache
+    stats = cache_stats()
+    stats['indicator_states'] = indicator_states.stats()
+    stats['database'] = db_stats()
+    stats['trade_journal'] = journal.stats()
+    stats['price_feed'] = price_feed.stats()
+    stats['stream'] = stream_hub.stats()
+    stats['market_snapshot'] = market_snapshot.stats()
+    stats['symbol_metadata'] = symbol_metadata.stats()
+    stats['fx'] = fx.stats()
+    stats['response_cache'] = response_cache.stats()
+    stats['profiler'] = profiling.profiler.stats()
+    return jsonify(stats)
+
+def _collect_service_metrics():
+    # Counters kept by the caches and services, read at scrape time
+    history = cache_stats()
+    yield 'market_data_cache_hits_total', 'counter', 'History cache hits', {}, history['hits']
+    yield 'market_data_cache_misses_total', 'counter', 'History cache misses', {}, history['misses']
+    yield 'market_data_cache_evictions_total', 'counter', 'History cache evictions', {}, history['evictions']
+    yield 'market_data_cache_hit_ratio', 'gauge', 'History cache hits per lookup', {}, history['hit_ratio']
+    yield 'market_data_cache_bytes', 'gauge', 'Memory held by cached history', {}, history['bytes']
+    yield 'market_data_coalesced_requests_total', 'counter', 'Lookups that waited on an in-flight fetch', {}, history['coalesced_requests']
+    responses = response_cache.stats()
+    lookups = responses['hits'] + responses['misses']
+    yield 'response_cache_hits_total', 'counter', 'Response cache hits', {}, responses['hits']
+    yield 'response_cache_misses_total', 'counter', 'Response cache misses', {}, responses['misses']
+    yield 'response_cache_not_modified_total', 'counter', 'Responses answered with 304 Not Modified', {}, responses['not_modified']
+    yield 'response_cache_hit_ratio', 'gauge', 'Response cache hits per lookup', {}, round(responses['hits'] / lookups, 4) if lookups else 0.0
+    states = indicator_states.stats()
+    yield 'indicator_state_reseeds_total', 'counter', 'Indicator states seeded from full history', {}, states['reseeds']
+    yield 'indicator_state_updates_total', 'counter', 'Bars applied incrementally to indicator states', {}, states['incremental_updates']
+    database = db_stats()
+    yield 'db_breaker_open', 'gauge', 'Whether the database circuit breaker is open', {}, int(database['breaker_state'] != 'closed')
+    yield 'db_rejected_requests_total', 'counter', 'Database calls skipped by the circuit breaker', {}, database['rejected_requests']
+    trades = journal.stats()
+    yield 'trade_journal_queued', 'gauge', 'Trades waiting to be written', {}, trades['queued']
+    yield 'trade_journal_spilled_total', 'counter', 'Trades spilled to disk while the database was down', {}, trades['spilled']
+    yield 'trade_journal_dead_lettered_total', 'counter', 'Trades the database rejected, kept in the dead-letter file', {}, trades['dead_lettered']
+    yield 'stream_clients', 'gauge', 'Connected /stream clients', {}, stream_hub.stats()['clients']
+    metadata = symbol_metadata.stats()
+    yield 'upstream_lookup_failures_total', 'counter', 'Failed background lookups, by service', {'service': 'symbol_metadata'}, metadata['failures']
+    yield 'upstream_lookup_failures_total', 'counter', 'Failed background lookups, by service', {'service': 'fx'}, fx.stats()['failures']
+
+metrics.registry.register_collector(_collect_service_metrics)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus text exposition format
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/get_news')
 def get_news():
-    # Generate dynamic news based on real stock movements
-    articles = []
-    current_date = datetime.now().strftime('%B %d, %Y')
-    
-    # Get top movers
-    top_stocks = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META']
-    movers = []
-    
-    for symbol in top_stocks:
-        try:
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period='5d')
-            if len(hist) >= 2:
-                current = float(hist['Close'].iloc[-1])
-                previous = float(hist['Close'].iloc[-2])
-                change_pct = ((current - previous) / previous) * 100
-                info = stock.info
-                name = info.get('shortName', symbol)
-                movers.append({
-                    'symbol': symbol,
-                    'name': name,
-                    'change': change_pct,
-                    'price': current * 83.0
-                })
-        except:
-            pass
-    
-    # Sort by absolute change
-    movers.sort(key=lambda x: abs(x['change']), reverse=True)
-    
-    # Create news from top 3 movers
-    if len(movers) >= 1:
-        top = movers[0]
-        direction = "surges" if top['change'] > 0 else "drops"
-        articles.append({
-            "title": f"{top['name']} {direction} {abs(top['change']):.1f}% - {current_date}",
-            "summary": f"{top['name']} ({top['symbol']}) shows significant movement with {top['change']:.2f}% change. Current price: ₹{top['price']:.2f}. Market analysts monitoring closely.",
-            "timestamp": datetime.now().strftime('%H:%M')
-        })
-    
-    if len(movers) >= 2:
-        second = movers[1]
-        direction = "rallies" if second['change'] > 0 else "declines"
-        articles.append({
-            "title": f"{second['name']} {direction} {abs(second['change']):.1f}% in Latest Trading",
-            "summary": f"{second['name']} experiences {abs(second['change']):.2f}% {'gain' if second['change'] > 0 else 'loss'} at ₹{second['price']:.2f}. Trading volume indicates strong investor interest.",
-            "timestamp": datetime.now().strftime('%H:%M')
-        })
-    
-    if len(movers) >= 3:
-        third = movers[2]
-        direction = "gains" if third['change'] > 0 else "loses"
-        articles.append({
-            "title": f"{third['name']} {direction} momentum as {third['symbol']} moves {abs(third['change']):.1f}%",
-            "summary": f"{third['name']} continues {direction} momentum with {abs(third['change']):.2f}% movement. Current valuation at ₹{third['price']:.2f} attracts investor attention.",
-            "timestamp": datetime.now().strftime('%H:%M')
-        })
-    
-    # Add market overview
-    major_indices = ['SPY', 'QQQ', 'DIA']  # S&P 500, NASDAQ, Dow Jones ETFs
-    market_data = []
-    total_change = 0
-    
-    for symbol in major_indices:
-        try:
-            stock = yf.Ticker(symbol)
-            hist = stock.history(period='5d')
-            if len(hist) >= 2:
-                current = float(hist['Close'].iloc[-1])
-                previous = float(hist['Close'].iloc[-2])
-                change_pct = ((current - previous) / previous) * 100
-                total_change += change_pct
-                market_data.append({
-                    'symbol': symbol,
-                    'change': change_pct
-                })
-        except:
-            pass
-    
-    # Calculate market sentiment from real data
-    if market_data:
-        avg_change = total_change / len(market_data)
-        if avg_change > 0.5:
-            market_sentiment_label = "Bullish"
-        elif avg_change < -0.5:
-            market_sentiment_label = "Bearish"
-        else:
-            market_sentiment_label = "Neutral"
-        
-        articles.append({
-            "title": f"Market Update: {market_sentiment_label} Sentiment Prevails - {current_date}",
-            "summary": f"Major indices show {market_sentiment_label.lower()} sentiment with average movement of {avg_change:.2f}%. Investors remain {market_sentiment_label.lower()} on economic outlook.",
-            "timestamp": datetime.now().strftime('%H:%M')
-        })
-    
-    # Add fallback if no articles generated
-    if not articles:
-        articles = [
-            {
-                "title": f"Market Update - {current_date}",
-                "summary": "Markets are currently active. Check individual stocks for latest price movements and trading opportunities.",
-                "timestamp": datetime.now().strftime('%H:%M')
-            }
-        ]
-    
-    return jsonify({
-        'articles': articles,
-        'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    })
+    snapshot = market_snapshot.get()
+    if request.if_none_match.contains(snapshot['etag']):
+        return _not_modified(snapshot['etag'], 'no-cache')
+    response = jsonify(snapshot['news'])
+    response.set_etag(snapshot['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Producers behind /stream, each called with the keys that are due
+stream_hub.register('quote', lambda symbols: {quote['symbol']: quote for quote in _stock_quotes(symbols)},
+                    QUOTE_INTERVAL)
+stream_hub.register('signal', lambda symbols: {symbol: dict(_trading_signal(symbol), symbol=symbol) for symbol in symbols},
+                    SIGNAL_INTERVAL)
+stream_hub.register('news', lambda keys: {None: market_snapshot.get()['news']}, NEWS_INTERVAL)
+
+def _stream_topics(symbols, events):
+    # /stream?symbols=AAPL,MSFT&events=quote,signal,news
+    symbols = [symbol.strip().upper() for symbol in symbols.split(',') if symbol.strip()]
+    events = events.split(',')
+    topics = []
+    for kind in ('quote', 'signal'):
+        if kind in events:
+            topics.extend((kind, symbol) for symbol in symbols[:50])
+    if 'news' in events:
+        topics.append(('news', None))
+    return topics
+
+@app.route('/stream')
+def stream():
+    client = stream_hub.subscribe(_stream_topics(request.args.get('symbols', ''),
+                                                 request.args.get('events', 'quote,signal,news')))
+    return Response(stream_hub.events(client), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 if __name__ == '__main__':
     # Print available routes for debugging
@@ -1760,4 +1640,5 @@ if __name__ == '__main__':
         print("Available routes:")
         for rule in app.url_map.iter_rules():
             print(f"  {rule.rule} -> {rule.endpoint}")
+    warm_up()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+ASGI serving mode.
+
+    cd Stock_market && uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Serves the same Flask app, templates and URLs from an asyncio server.
+The views stay synchronous and run on a bounded thread pool. Before
+dispatching a quote or chart route the handler starts every upstream
+fetch the view is about to make, concurrently, and awaits them without
+holding a thread; the view then reads a warm cache. The dashboard and
+news need no fetches, they are served from the market snapshot. /stream
+is served on the event loop itself, so an open SSE connection costs a
+queue rather than a thread.
+
+A generic WSGI adapter is not used on purpose: asgiref's WsgiToAsgi runs
+every request on one shared thread, which serializes the whole app.
+"""
+import asyncio
+import io
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app, UPSTREAM_READS, _stream_topics, warm_up
+from stream import stream_hub, HEARTBEAT_INTERVAL
+
+# Threads running Flask views, and threads running upstream fetches
+WORKERS = int(os.environ.get('ASGI_WORKERS', '64'))
+FETCH_WORKERS = int(os.environ.get('ASGI_FETCH_WORKERS', '32'))
+
+view_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='asgi-view')
+fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='asgi-fetch')
+
+
+def _query_args(scope):
+    # The same request.args the view would read
+    return flask_app.request_class({'QUERY_STRING': scope['query_string'].decode('latin-1')}).args
+
+
+async def _prefetch(scope, headers):
+    plan = UPSTREAM_READS.get(scope['path'])
+    if plan is None or scope['method'] != 'GET':
+        return
+    loop = asyncio.get_running_loop()
+    args = _query_args(scope)
+    # Failures are left for the view to hit again and handle as before
+    await asyncio.gather(*(loop.run_in_executor(fetch_executor, *fetch) for fetch in plan(args)),
+                         return_exceptions=True)
+
+
+def _headers(scope):
+    environ = {}
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+
+def _environ(scope, headers, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    environ.update(headers)
+    # The body is read in full up front, so its length is known even when chunked
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+def _run_view(environ, send, disconnected):
+    """
+    Run the Flask app for one request on a worker thread, passing the
+    response to send() as it is produced.
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response.get('sent'):
+            raise exc_info[1].with_traceback(exc_info[2])
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        return write
+
+    def start():
+        if not response.get('sent'):
+            response['sent'] = True
+            send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+
+    def write(chunk):
+        start()
+        send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    result = flask_app(environ, start_response)
+    try:
+        for chunk in result:
+            if disconnected.is_set():
+                return
+            if chunk:
+                write(chunk)
+        start()
+        send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        close = getattr(result, 'close', None)
+        if close is not None:
+            close()
+
+
+async def _read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body.extend(message.get('body', b''))
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+async def _watch_disconnect(receive, disconnected):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    disconnected.set()
+
+
+async def _serve_view(scope, receive, send, headers):
+    body = await _read_body(receive)
+    if body is None:
+        return
+    await _prefetch(scope, headers)
+    loop = asyncio.get_running_loop()
+    disconnected = threading.Event()
+    watcher = asyncio.ensure_future(_watch_disconnect(receive, disconnected))
+
+    def send_from_thread(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    try:
+        await loop.run_in_executor(view_executor, _run_view, _environ(scope, headers, body),
+                                   send_from_thread, disconnected)
+    finally:
+        watcher.cancel()
+
+
+async def _serve_stream(scope, receive, send):
+    args = _query_args(scope)
+    topics = _stream_topics(args.get('symbols', ''), args.get('events', 'quote,signal,news'))
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    disconnected = threading.Event()
+
+    async def watch():
+        await _watch_disconnect(receive, disconnected)
+        ready.set()
+
+    client = stream_hub.subscribe(topics, notify=lambda: loop.call_soon_threadsafe(ready.set))
+    watcher = asyncio.ensure_future(watch())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while not disconnected.is_set():
+            ready.clear()
+            events = []
+            while True:
+                try:
+                    events.append(client.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if events:
+                await send({'type': 'http.response.body', 'body': ''.join(events).encode('utf-8'), 'more_body': True})
+                continue
+            try:
+                await asyncio.wait_for(ready.wait(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+    finally:
+        watcher.cancel()
+        stream_hub.unsubscribe(client)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            warm_up()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            view_executor.shutdown(wait=False)
+            fetch_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http':
+        if scope['path'] == '/stream' and scope['method'] == 'GET':
+            await _serve_stream(scope, receive, send)
+        else:
+            await _serve_view(scope, receive, send, _headers(scope))
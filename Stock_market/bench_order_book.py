@@ -0,0 +1,97 @@
+"""
+Micro-benchmark for the order book and matching engine.
+
+Replays a random mix of market, limit, SL and SL-M orders, cancels,
+amends and price ticks across a few symbols, and reports throughput and
+order-to-fill latency percentiles (submission until the fill that
+completes the order), separately for orders filled on arrival and for
+orders that rested first.
+
+    python bench_order_book.py --orders 200000 --symbols 20
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from order_book import MatchingEngine, OrderError
+
+
+def run(orders, symbols, seed):
+    rng = random.Random(seed)
+    engine = MatchingEngine()
+    names = [f'SYM{i}' for i in range(symbols)]
+    prices = {name: 100.0 for name in names}
+    submitted_at = {}
+    immediate = []
+    resting = []
+
+    def on_fill(fill):
+        if fill.order_id in submitted_at and fill.order_id not in engine.orders:
+            resting.append(time.perf_counter_ns() - submitted_at.pop(fill.order_id))
+
+    engine.add_listener(on_fill)
+    for name in names:
+        engine.on_price(name, prices[name])
+
+    open_ids = []
+    operations = 0
+    start = time.perf_counter()
+    for i in range(orders):
+        name = names[i % symbols]
+        roll = rng.random()
+        if roll < 0.05:
+            # Market moves and fills what it reaches
+            prices[name] = max(1.0, prices[name] * (1 + rng.gauss(0, 0.002)))
+            engine.on_price(name, round(prices[name], 2), volume=rng.randint(50, 500))
+        elif roll < 0.08 and open_ids:
+            try:
+                engine.cancel(open_ids.pop(rng.randrange(len(open_ids))))
+            except OrderError:
+                pass
+        elif roll < 0.10 and open_ids:
+            order_id = open_ids[rng.randrange(len(open_ids))]
+            order = engine.orders.get(order_id)
+            if order is not None and order.limit_price is not None:
+                try:
+                    engine.amend(order_id, limit_price=round(order.limit_price * (1 + rng.gauss(0, 0.001)), 2))
+                except OrderError:
+                    pass
+        else:
+            side = 'buy' if rng.random() < 0.5 else 'sell'
+            mid = prices[name]
+            order_type = rng.choices(('market', 'limit', 'sl', 'sl-m'), (0.2, 0.6, 0.1, 0.1))[0]
+            offset = abs(rng.gauss(0, 0.003)) * mid
+            sign = -1 if side == 'buy' else 1
+            limit_price = round(mid + sign * offset, 2) if order_type in ('limit', 'sl') else None
+            trigger_price = round(mid - sign * offset, 2) if order_type in ('sl', 'sl-m') else None
+            if order_type == 'sl':
+                limit_price = round(trigger_price - sign * 0.05 * mid / 100, 2)
+            submitted = time.perf_counter_ns()
+            order, _ = engine.submit(f'user{rng.randrange(100)}', name, side, rng.randint(1, 200),
+                                     order_type, limit_price=limit_price, trigger_price=trigger_price)
+            if order.active:
+                submitted_at[order.order_id] = submitted
+                open_ids.append(order.order_id)
+            elif order.status == 'filled':
+                immediate.append(time.perf_counter_ns() - submitted)
+        operations += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"{operations} operations in {elapsed:.2f}s: {operations / elapsed:,.0f} ops/s")
+    print(f"{len(immediate) + len(resting)} orders filled, {len(engine.orders)} still open")
+    for label, latencies in (('Filled on arrival', immediate), ('Filled after resting', resting)):
+        if latencies:
+            latencies_us = np.array(latencies, dtype=np.float64) / 1000.0
+            p50, p95, p99 = np.percentile(latencies_us, [50, 95, 99])
+            print(f"{label} ({len(latencies)}): p50 {p50:.1f}us  p95 {p95:.1f}us  p99 {p99:.1f}us")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Order book micro-benchmark')
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    run(args.orders, args.symbols, args.seed)
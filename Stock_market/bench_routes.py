@@ -0,0 +1,301 @@
+"""
+End-to-end benchmark of the Flask routes.
+
+Drives every route of app.py through the Flask test client against the
+replay market data provider (synthetic, seeded bars, no network), with a
+throwaway bar store, metadata file and trade journal; without a
+database at DB_HOST the routes take their mock-data fallbacks. For each
+route it reports p50/p95/p99 latency, throughput and the memory
+allocated per request (traced with tracemalloc in a separate pass so
+tracing does not skew the timings), and can save the results as JSON
+and compare them against an earlier run:
+
+    python bench_routes.py --requests 200 --output bench.json
+    python bench_routes.py --baseline bench.json --tolerance 0.2
+
+--cold clears the history and response caches before every request, to
+measure the cache-miss path. /stream is skipped: it never finishes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# The app reads its configuration at import time
+_WORK_DIR = tempfile.mkdtemp(prefix='bench-routes-')
+for _name, _value in {
+    'MARKET_DATA_PROVIDER': 'replay',
+    'REPLAY_LATENCY_MS': '0',
+    'REPLAY_SEED': '0',
+    'OHLCV_STORE_DIR': os.path.join(_WORK_DIR, 'ohlcv'),
+    'SYMBOL_METADATA_PATH': os.path.join(_WORK_DIR, 'symbol_metadata.json'),
+    'TRADE_JOURNAL_SPILL': os.path.join(_WORK_DIR, 'trade_journal.jsonl'),
+    'DB_CONNECT_TIMEOUT': '1',
+    # Keep the background refreshers quiet while measuring
+    'MARKET_SNAPSHOT_INTERVAL': '3600',
+    'PRICE_FEED_INTERVAL': '3600',
+    'STREAM_QUOTE_INTERVAL': '3600',
+    'STREAM_SIGNAL_INTERVAL': '3600',
+    'STREAM_NEWS_INTERVAL': '3600'
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app import app, response_cache, matching_engine  # noqa: E402
+from market_data import history_cache  # noqa: E402
+
+USERNAME = 'admin'
+PASSWORD = 'admin123'
+
+
+def _resting_order():
+    # A buy far below the market that stays on the book
+    order, _ = matching_engine.submit(USERNAME, 'AAPL', 'buy', 1, 'limit', limit_price=1.0)
+    return order
+
+
+class Route:
+    """
+    One benchmarked request. `prepare(i)` returns extra test client
+    arguments for the i-th request (e.g. an order to cancel).
+    """
+
+    def __init__(self, name, path, method='GET', login=True, prepare=None, **kwargs):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.login = login
+        self.prepare = prepare
+        self.kwargs = kwargs
+
+    def request_args(self, i):
+        kwargs = dict(self.kwargs)
+        if self.prepare is not None:
+            kwargs.update(self.prepare(i))
+        return kwargs
+
+
+def _cancel_args(i):
+    return {'json': {'order_id': _resting_order().order_id}}
+
+
+_amend_order = []
+
+
+def _amend_args(i):
+    if not _amend_order or not _amend_order[0].active:
+        _amend_order[:] = [_resting_order()]
+    return {'json': {'order_id': _amend_order[0].order_id, 'limit_price': 1.0 + (i % 50) / 100}}
+
+
+ROUTES = [
+    Route('GET /login', '/login', login=False),
+    Route('POST /login', '/login', method='POST', login=False,
+          data={'username': USERNAME, 'password': PASSWORD}),
+    Route('GET /signup', '/signup', login=False),
+    Route('POST /signup', '/signup', method='POST', login=False,
+          data={'username': USERNAME, 'email': 'admin@example.com', 'password': PASSWORD}),
+    Route('GET /forgot_password', '/forgot_password', login=False),
+    Route('POST /forgot_password', '/forgot_password', method='POST', login=False,
+          data={'email': 'admin@example.com'}),
+    Route('GET /logout', '/logout'),
+    Route('GET /', '/'),
+    Route('GET /portfolio', '/portfolio'),
+    Route('POST /add_to_portfolio', '/add_to_portfolio', method='POST',
+          json={'symbol': 'MSFT', 'quantity': 1, 'avg_price': 300.0}),
+    Route('GET /trade', '/trade'),
+    Route('POST /execute_trade', '/execute_trade', method='POST',
+          json={'symbol': 'AAPL', 'action': 'buy', 'quantity': 1, 'price': 150.0, 'order_type': 'market'}),
+    Route('GET /open_orders', '/open_orders'),
+    Route('POST /cancel_order', '/cancel_order', method='POST', prepare=_cancel_args),
+    Route('POST /amend_order', '/amend_order', method='POST', prepare=_amend_args),
+    Route('GET /stock_graph', '/stock_graph', query_string={'symbol': 'AAPL', 'period': '1mo'}),
+    Route('GET /predict_next_week', '/predict_next_week'),
+    Route('GET /prediction_chart/<symbol>', '/prediction_chart/AAPL'),
+    Route('GET /trading_history', '/trading_history'),
+    Route('GET /sentiment_analysis', '/sentiment_analysis'),
+    Route('GET /get_trading_signal', '/get_trading_signal', query_string={'symbol': 'AAPL'}),
+    Route('GET /get_chart_data', '/get_chart_data', query_string={'symbol': 'AAPL', 'period': '1y'}),
+    Route('GET /get_chart_data?format=columns', '/get_chart_data',
+          query_string={'symbol': 'AAPL', 'period': '1y', 'format': 'columns'}),
+    Route('GET /get_multiple_stock_data', '/get_multiple_stock_data',
+          query_string={'symbols': 'AAPL,MSFT,GOOGL,AMZN,TSLA'}),
+    Route('GET /get_1d_prediction', '/get_1d_prediction', query_string={'symbol': 'AAPL'}),
+    Route('GET /get_stock_data', '/get_stock_data', query_string={'symbol': 'AAPL'}),
+    Route('GET /get_technical_indicators', '/get_technical_indicators', query_string={'symbol': 'AAPL', 'period': '1y'}),
+    Route('GET /market_data_stats', '/market_data_stats'),
+    Route('GET /metrics', '/metrics'),
+    Route('GET /get_news', '/get_news')
+]
+
+
+def _client(route):
+    client = app.test_client()
+    if route.login:
+        with client.session_transaction() as session:
+            session['username'] = USERNAME
+    return client
+
+
+def _send(client, route, kwargs):
+    response = client.open(route.path, method=route.method, **kwargs)
+    response.get_data()
+    return response.status_code
+
+
+def _prepare(client, route, i, cold):
+    """
+    Set up the i-th request outside the measured time.
+    """
+    if route.name == 'GET /logout':
+        # Log back in after the previous request
+        with client.session_transaction() as session:
+            session['username'] = USERNAME
+    if cold:
+        history_cache.clear()
+        response_cache.clear()
+    return route.request_args(i)
+
+
+def time_route(route, requests, warmup, cold):
+    client = _client(route)
+    for i in range(warmup):
+        _send(client, route, _prepare(client, route, i, False))
+    latencies = np.empty(requests, dtype=np.float64)
+    statuses = {}
+    started = time.perf_counter()
+    for i in range(requests):
+        kwargs = _prepare(client, route, i, cold)
+        start = time.perf_counter_ns()
+        status = _send(client, route, kwargs)
+        latencies[i] = time.perf_counter_ns() - start
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+    latencies_ms = latencies / 1e6
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        'requests': requests,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'max_ms': round(float(latencies_ms.max()), 3),
+        # Includes the set-up between requests (session resets, cache clears)
+        'throughput_rps': round(requests / elapsed, 1),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())}
+    }
+
+
+def trace_route(route, requests, cold):
+    """
+    Memory allocated per request: the peak above the starting point while
+    it runs, and what is still allocated once it has returned.
+    """
+    client = _client(route)
+    _send(client, route, _prepare(client, route, 0, False))
+    peaks = np.empty(requests, dtype=np.float64)
+    retained = np.empty(requests, dtype=np.float64)
+    tracemalloc.start()
+    try:
+        for i in range(requests):
+            kwargs = _prepare(client, route, i, cold)
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            _send(client, route, kwargs)
+            after, peak = tracemalloc.get_traced_memory()
+            peaks[i] = peak - before
+            retained[i] = after - before
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_peak_kib': round(float(np.median(peaks)) / 1024, 1),
+        'alloc_peak_max_kib': round(float(peaks.max()) / 1024, 1),
+        'retained_kib': round(float(retained.mean()) / 1024, 2)
+    }
+
+
+def run(requests, warmup, alloc_requests, cold, selected, seed, quiet):
+    random.seed(seed)
+    np.random.seed(seed)
+    routes = [route for route in ROUTES if not selected or any(name in route.name for name in selected)]
+    results = {}
+    for route in routes:
+        # The routes print progress for every trade and login
+        output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+        with output:
+            result = time_route(route, requests, warmup, cold)
+            if alloc_requests:
+                result.update(trace_route(route, alloc_requests, cold))
+        results[route.name] = result
+        line = (f"{route.name:<36} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                f"p99 {result['p99_ms']:8.2f}ms  {result['throughput_rps']:8.1f} req/s")
+        if alloc_requests:
+            line += f"  {result['alloc_peak_kib']:8.1f} KiB"
+        statuses = ','.join(result['statuses'])
+        print(line + ('' if statuses == '200' else f"  [{statuses}]"))
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'requests': requests,
+            'warmup': warmup,
+            'alloc_requests': alloc_requests,
+            'cold': cold,
+            'seed': seed,
+            'provider': os.environ['MARKET_DATA_PROVIDER']
+        },
+        'routes': results
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the routes whose p95 grew by more than tolerance (a fraction)
+    over the baseline; returns how many did.
+    """
+    regressions = 0
+    for name, result in results['routes'].items():
+        previous = baseline['routes'].get(name)
+        if previous is None or not previous['p95_ms']:
+            continue
+        ratio = result['p95_ms'] / previous['p95_ms']
+        if ratio > 1 + tolerance:
+            regressions += 1
+            print(f"REGRESSION {name}: p95 {previous['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms ({ratio:.2f}x)")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end route benchmark')
+    parser.add_argument('--requests', type=int, default=100, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--alloc-requests', type=int, default=20,
+                        help='requests per route traced for allocations (0 to skip)')
+    parser.add_argument('--cold', action='store_true', help='clear the data caches before every request')
+    parser.add_argument('--route', action='append', default=[], help='only routes whose name contains this')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='earlier results to compare p95 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 growth over the baseline')
+    parser.add_argument('--verbose', action='store_true', help="show the routes' own output")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.warmup, args.alloc_requests, args.cold, args.route, args.seed, not args.verbose)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,171 @@
+"""
+MySQL access for the routes.
+
+Connections come from one size-bounded pool instead of a fresh connect per
+request. A circuit breaker sits in front of it: after a few consecutive
+connection failures the database is treated as down and db_connection()
+fails immediately (routes then fall back to the mock data) until a retry
+window has passed and a single trial request gets through.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors, pooling
+
+from metrics import stage
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', '1234'),
+    'database': os.environ.get('DB_NAME', 'stock_trading')
+}
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '3'))
+# How long a request waits for a free pooled connection
+POOL_WAIT_TIMEOUT = float(os.environ.get('DB_POOL_WAIT_TIMEOUT', '2'))
+
+
+class DatabaseUnavailable(mysql.connector.Error):
+    """
+    Raised without touching the network while the circuit breaker is open.
+    Subclasses mysql.connector.Error so existing fallbacks keep working.
+    """
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # After the retry window let exactly one trial request through
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def cancel_trial(self):
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get('DB_BREAKER_THRESHOLD', '3')),
+    reset_timeout=float(os.environ.get('DB_BREAKER_RESET', '30'))
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name='stock_trading',
+                pool_size=POOL_SIZE,
+                pool_reset_session=True,
+                connection_timeout=CONNECT_TIMEOUT,
+                **DB_CONFIG
+            )
+        return _pool
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a pooled connection, returned to the pool on exit. Raises a
+    mysql.connector.Error when the database is down, the breaker is open
+    or no connection frees up in time.
+    """
+    if not breaker.allow():
+        raise DatabaseUnavailable(msg='Database marked unavailable, skipping')
+    # Includes waiting for a free connection
+    with stage('db'):
+        if not _pool_slots.acquire(timeout=POOL_WAIT_TIMEOUT):
+            # A busy pool says nothing about the database, hand the trial back
+            breaker.cancel_trial()
+            raise errors.PoolError(msg='No free database connection')
+        # Whether this call has told the breaker how the database is doing
+        settled = False
+        try:
+            try:
+                conn = _get_pool().get_connection()
+                # Health check: replace connections the server has dropped
+                if not conn.is_connected():
+                    conn.reconnect(attempts=1, delay=0)
+            except mysql.connector.Error:
+                breaker.record_failure()
+                settled = True
+                raise
+            try:
+                yield conn
+            except (errors.InterfaceError, errors.OperationalError):
+                # Connection-level trouble mid-query counts against the database
+                breaker.record_failure()
+                settled = True
+                raise
+            except mysql.connector.Error:
+                # IntegrityError, ProgrammingError...: the server answered, so
+                # the connection is healthy whatever was wrong with the query
+                breaker.record_success()
+                settled = True
+                raise
+            else:
+                breaker.record_success()
+                settled = True
+            finally:
+                conn.close()
+        finally:
+            if not settled:
+                # Failed for reasons unrelated to the database (a bug in the
+                # caller, a pool misconfiguration): a half-open trial must not
+                # stay in flight forever, or every later call is rejected
+                breaker.cancel_trial()
+            _pool_slots.release()
+
+
+def db_stats():
+    return {
+        'breaker_state': breaker.state,
+        'consecutive_failures': breaker.failures,
+        'rejected_requests': breaker.rejected,
+        'pool_size': POOL_SIZE
+    }
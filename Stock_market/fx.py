@@ -0,0 +1,158 @@
+"""
+Currency conversion for displayed prices.
+
+Prices are shown in DISPLAY_CURRENCY (Indian Rupees by default). Each
+instrument's rate is looked up once per FX_TTL from the provider's
+currency pair quote (USDINR=X etc.); an expired rate keeps being served
+while a background refresh runs, and FALLBACK_RATES cover the time
+before the first quote arrives or when the provider is unreachable.
+Instruments already quoted in the display currency, such as NSE (.NS)
+and BSE (.BO) listings, are not converted at all.
+
+convert() scales a whole array (or a scalar) in one NumPy operation, so
+chart routes convert OHLC columns without per-element Python loops.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from market_data import get_history
+from symbol_metadata import symbol_metadata
+
+DISPLAY_CURRENCY = os.environ.get('DISPLAY_CURRENCY', 'INR').upper()
+FX_TTL = float(os.environ.get('FX_TTL', '300'))
+
+# Used until a live quote has been fetched
+FALLBACK_RATES = {
+    ('USD', 'INR'): 83.0
+}
+
+# Symbol suffixes of exchanges whose listings are quoted in INR
+INR_SUFFIXES = ('.NS', '.BO')
+INR_INDICES = ('^NSEI', '^NSEBANK', '^BSESN', '^CNX')
+
+
+def currency_of(symbol):
+    """
+    Trading currency of symbol: known from the exchange suffix, else from
+    cached symbol metadata, else assumed USD.
+    """
+    symbol = symbol.strip().upper()
+    return _currency(symbol, symbol_metadata.get(symbol))
+
+
+def _currency(symbol, entry):
+    if symbol.endswith(INR_SUFFIXES) or symbol.startswith(INR_INDICES):
+        return 'INR'
+    currency = entry.get('currency') if entry else None
+    return currency.upper() if currency else 'USD'
+
+
+class FXService:
+    def __init__(self, display_currency=DISPLAY_CURRENCY, ttl=FX_TTL, fallback_rates=FALLBACK_RATES):
+        self.display_currency = display_currency
+        self.ttl = ttl
+        self.fallback_rates = dict(fallback_rates)
+        self._rates = {}      # (base, quote) -> (expires_at, rate)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.failures = 0
+        # Bumped whenever a rate changes, lets cached conversions be invalidated
+        self.version = 0
+
+    def _fetch(self, pair):
+        try:
+            hist = get_history(f"{pair[0]}{pair[1]}=X", period='5d', interval='1h')
+            if hist.empty:
+                raise ValueError('no quotes')
+            rate = float(hist['Close'].iloc[-1])
+            if not rate > 0:
+                raise ValueError(f'bad rate {rate}')
+            self.fetches += 1
+            with self._lock:
+                previous = self._rates.get(pair)
+                if previous is None or previous[1] != rate:
+                    self.version += 1
+                self._rates[pair] = (time.monotonic() + self.ttl, rate)
+            return rate
+        except Exception as e:
+            self.failures += 1
+            print(f"FX quote for {pair[0]}/{pair[1]} failed: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._refreshing.discard(pair)
+
+    def _on_metadata(self, symbol, previous, entry):
+        # Prices converted while the currency was unknown (or different)
+        # used the wrong rate, invalidate them
+        if _currency(symbol, previous) != _currency(symbol, entry):
+            with self._lock:
+                self.version += 1
+
+    def _fallback(self, pair):
+        rate = self.fallback_rates.get(pair)
+        if rate is None:
+            inverse = self.fallback_rates.get((pair[1], pair[0]))
+            rate = 1.0 / inverse if inverse else 1.0
+        return rate
+
+    def rate(self, base, quote=None):
+        """
+        Units of quote per unit of base. Never raises; a failed lookup
+        serves the last known or fallback rate.
+        """
+        base = base.upper()
+        quote = (quote or self.display_currency).upper()
+        if base == quote:
+            return 1.0
+        pair = (base, quote)
+        with self._lock:
+            cached = self._rates.get(pair)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            stale = pair in self._refreshing
+            if not stale:
+                self._refreshing.add(pair)
+        if cached is None:
+            # First use of the pair waits for the quote
+            rate = None if stale else self._fetch(pair)
+            return rate if rate is not None else self._fallback(pair)
+        if not stale:
+            # Serve the expired rate while it is refreshed
+            threading.Thread(target=self._fetch, args=(pair,), name='fx-refresh', daemon=True).start()
+        return cached[1]
+
+    def symbol_rate(self, symbol):
+        """
+        Multiplier from symbol's trading currency to the display currency.
+        """
+        return self.rate(currency_of(symbol))
+
+    def convert(self, values, symbol):
+        """
+        Prices of symbol in the display currency. Arrays, Series and
+        DataFrames come back as a float ndarray of the same shape.
+        """
+        rate = self.symbol_rate(symbol)
+        if np.isscalar(values):
+            return float(values) * rate
+        values = np.asarray(values, dtype=np.float64)
+        return values if rate == 1.0 else values * rate
+
+    def stats(self):
+        with self._lock:
+            return {
+                'display_currency': self.display_currency,
+                'version': self.version,
+                'rates': {f"{base}/{quote}": rate for (base, quote), (_, rate) in self._rates.items()},
+                'fetches': self.fetches,
+                'failures': self.failures
+            }
+
+
+fx = FXService()
+symbol_metadata.add_listener(fx._on_metadata)
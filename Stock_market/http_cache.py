@@ -0,0 +1,163 @@
+"""
+Conditional responses and a server-side response cache for read-only
+data routes.
+
+A view decorated with @cached_response is run at most once per query
+while its data is fresh. The view reports the bars it answered from with
+note_bars(); their interval sets how long the response is reused (the
+history cache TTL of that interval) and the last bar, plus the current
+salt (e.g. the FX rate version), gives the ETag and Last-Modified. A
+repeat poll within that window is answered from the cache, as a 304
+when the client already holds the same ETag, without touching the
+market data provider or the indicator code. Placeholder answers (a view
+falling back to default numbers after an error) call skip_cache() so they
+are sent once but never reused.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+
+from market_data import INTERVAL_TTL, DEFAULT_TTL
+
+MAX_ENTRIES = 4096
+
+
+class CachedResponse:
+    __slots__ = ('expires_at', 'salt', 'etag', 'last_modified', 'body', 'headers')
+
+    def __init__(self, expires_at, salt, etag, last_modified, body, headers):
+        self.expires_at = expires_at
+        self.salt = salt
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.headers = headers
+
+
+class ResponseCache:
+    def __init__(self, max_entries=MAX_ENTRIES, salt=lambda: None):
+        self.max_entries = max_entries
+        self.salt = salt
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key, salt):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic() or entry.salt != salt:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified
+            }
+
+
+def note_bars(hist, interval):
+    """
+    Record that the current response is derived from hist, bars of the
+    given interval. No-op outside a cached view.
+    """
+    bars = g.get('http_cache_bars') if has_request_context() else None
+    if bars is None or hist is None or hist.empty:
+        return
+    last = hist.iloc[-1]
+    bars.append((interval, hist.index[-1], f"{len(hist)}:{float(last['Close'])!r}:{float(last['Volume'])!r}"))
+
+
+def skip_cache():
+    """
+    Keep the current response out of the cache, e.g. a fallback sent
+    while market data is unavailable. No-op outside a cached view.
+    """
+    if has_request_context():
+        g.http_cache_skip = True
+
+
+def _request_key():
+    # The full query plus the headers that pick the representation
+    return (request.path, tuple(sorted(request.args.items(multi=True))),
+            request.headers.get('Accept', ''), request.accept_encodings['gzip'] > 0)
+
+
+def _entry_for(response, key, salt):
+    bars = g.pop('http_cache_bars', [])
+    body = response.get_data()
+    if bars:
+        ttl = min(INTERVAL_TTL.get(interval, DEFAULT_TTL) for interval, _, _ in bars)
+        validator = '|'.join(f"{interval}:{timestamp.isoformat()}:{signature}" for interval, timestamp, signature in bars)
+        last_modified = max(timestamp for _, timestamp, _ in bars).to_pydatetime()
+    else:
+        ttl = DEFAULT_TTL
+        validator = hashlib.sha1(body).hexdigest()
+        last_modified = None
+    etag = hashlib.sha1(repr((key, validator, salt)).encode('utf-8')).hexdigest()[:20]
+    headers = [(name, value) for name, value in response.headers.items()
+               if name.lower() not in ('content-length', 'etag', 'last-modified', 'cache-control')]
+    return CachedResponse(time.monotonic() + ttl, salt, etag, last_modified, body, headers)
+
+
+def cached_response(cache):
+    """
+    Decorator for GET views whose 200 responses depend only on the
+    query and the bars passed to note_bars().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = _request_key()
+            salt = cache.salt()
+            entry = cache.get(key, salt)
+            if entry is None:
+                g.http_cache_bars = []
+                response = current_app.make_response(view(*args, **kwargs))
+                skip = g.pop('http_cache_skip', False)
+                if response.status_code != 200 or response.is_streamed or skip:
+                    g.pop('http_cache_bars', None)
+                    return response
+                # The view may have picked up a new rate on its way
+                entry = _entry_for(response, key, cache.salt())
+                cache.put(key, entry)
+
+            response = current_app.response_class(entry.body, status=200, headers=entry.headers)
+            response.set_etag(entry.etag)
+            if entry.last_modified is not None:
+                response.last_modified = entry.last_modified
+            # Let browsers keep the body but revalidate on every poll
+            response.headers['Cache-Control'] = 'no-cache'
+            response.make_conditional(request)
+            if response.status_code == 304:
+                cache.record_not_modified()
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,282 @@
+"""
+Technical indicator engine shared by all routes.
+
+Indicators run over contiguous float64 NumPy arrays. compute_indicators()
+converts the OHLCV columns once and derives every requested indicator
+from shared intermediates (one diff for RSI, the EMA12/EMA26 pair for
+MACD, SMA20 for the Bollinger middle band), so a route pays for each
+piece of work only once.
+"""
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from metrics import timed
+
+# Keep decay**block well inside float64 range in _recurrence
+_MAX_BLOCK = 256
+_MAX_DECAY_EXPONENT = 300.0
+
+
+def as_float_array(values):
+    return np.ascontiguousarray(np.asarray(values, dtype=np.float64))
+
+
+def _nan_array(n):
+    return np.full(n, np.nan)
+
+
+def sma(values, window):
+    """
+    Simple moving average, NaN until `window` values are available and
+    for any window containing a NaN (same as pandas rolling().mean()).
+    """
+    x = as_float_array(values)
+    n = len(x)
+    out = _nan_array(n)
+    if window <= 0 or n < window:
+        return out
+    missing = np.isnan(x)
+    # Subtract the first value to keep the running sum small
+    base = x[~missing][0] if not missing.all() else 0.0
+    csum = np.cumsum(np.where(missing, 0.0, x - base))
+    cmissing = np.cumsum(missing)
+    window_sum = csum[window - 1:].copy()
+    window_sum[1:] -= csum[:-window]
+    window_missing = cmissing[window - 1:].copy()
+    window_missing[1:] -= cmissing[:-window]
+    out[window - 1:] = np.where(window_missing == 0, window_sum / window + base, np.nan)
+    return out
+
+
+def rolling_std(values, window, ddof=1):
+    x = as_float_array(values)
+    out = _nan_array(len(x))
+    if window <= ddof or len(x) < window:
+        return out
+    out[window - 1:] = sliding_window_view(x, window).std(axis=1, ddof=ddof)
+    return out
+
+
+def rolling_min(values, window):
+    x = as_float_array(values)
+    out = _nan_array(len(x))
+    if window <= 0 or len(x) < window:
+        return out
+    out[window - 1:] = sliding_window_view(x, window).min(axis=1)
+    return out
+
+
+def rolling_max(values, window):
+    x = as_float_array(values)
+    out = _nan_array(len(x))
+    if window <= 0 or len(x) < window:
+        return out
+    out[window - 1:] = sliding_window_view(x, window).max(axis=1)
+    return out
+
+
+def _recurrence(x, decay, initial=0.0):
+    """
+    Solve y[t] = decay * y[t-1] + x[t] with y[-1] = initial.
+
+    Each block is solved in closed form with NumPy (powers of decay times a
+    cumulative sum), so the Python loop runs once per block, not per value.
+    """
+    n = len(x)
+    y = np.empty(n)
+    if n == 0:
+        return y
+    if decay <= 0.0:
+        y[:] = x
+        return y
+    block = _MAX_BLOCK
+    if decay < 1.0:
+        block = max(1, min(_MAX_BLOCK, int(_MAX_DECAY_EXPONENT / -math.log(decay))))
+    steps = np.arange(block, dtype=np.float64)
+    growth = decay ** -steps      # decay^-j
+    shrink = decay ** steps       # decay^k
+    carry = initial
+    for start in range(0, n, block):
+        chunk = x[start:start + block]
+        m = len(chunk)
+        # y[k] = decay^(k+1) * carry + decay^k * sum_{j<=k} decay^-j * x[j]
+        y[start:start + m] = shrink[:m] * (decay * carry + np.cumsum(growth[:m] * chunk))
+        carry = y[start + m - 1]
+    return y
+
+
+def ema(values, span, adjust=True):
+    """
+    Exponential moving average with alpha = 2 / (span + 1), matching
+    pandas ewm(span=span, adjust=adjust).mean(). Leading NaNs are kept.
+    """
+    x = as_float_array(values)
+    out = _nan_array(len(x))
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) == 0:
+        return out
+    first = valid[0]
+    x = x[first:]
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+    if adjust:
+        weighted = _recurrence(x, decay)
+        weights = _recurrence(np.ones(len(x)), decay)
+        out[first:] = weighted / weights
+    else:
+        out[first:] = _recurrence(alpha * x, decay, initial=x[0])
+    return out
+
+
+def wilder_averages(close, period=14):
+    """
+    Wilder-smoothed average gain and loss for each change from bar `period`
+    on: seeded with a simple mean over the first `period` changes, then
+    smoothed with alpha = 1 / period. Returns two empty arrays when there
+    are not enough bars.
+    """
+    x = as_float_array(close)
+    if len(x) <= period:
+        return np.empty(0), np.empty(0)
+    delta = np.diff(x)
+    gains = np.clip(delta, 0.0, None)
+    losses = np.clip(-delta, 0.0, None)
+    decay = (period - 1.0) / period
+    seed_gain = gains[:period].mean()
+    seed_loss = losses[:period].mean()
+    avg_gain = _recurrence(gains[period:] / period, decay, initial=seed_gain)
+    avg_loss = _recurrence(losses[period:] / period, decay, initial=seed_loss)
+    return np.concatenate(([seed_gain], avg_gain)), np.concatenate(([seed_loss], avg_loss))
+
+
+def rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    # No losses in the window means RSI 100, a flat window means 50
+    return np.where(avg_loss == 0.0, np.where(avg_gain == 0.0, 50.0, 100.0), values)
+
+
+def rsi(close, period=14):
+    """
+    Wilder's RSI, NaN for the first `period` bars.
+    """
+    x = as_float_array(close)
+    out = _nan_array(len(x))
+    avg_gain, avg_loss = wilder_averages(x, period)
+    if len(avg_gain):
+        out[period:] = rsi_from_averages(avg_gain, avg_loss)
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9, fast_ema=None, slow_ema=None):
+    """
+    Return (macd_line, signal_line, histogram). Precomputed fast/slow EMAs
+    can be passed in to avoid recomputing them.
+    """
+    if fast_ema is None:
+        fast_ema = ema(close, fast)
+    if slow_ema is None:
+        slow_ema = ema(close, slow)
+    macd_line = fast_ema - slow_ema
+    signal_line = ema(macd_line, signal)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def stochastic(high, low, close, k_window=14, d_window=3):
+    """
+    Return (%K, %D) of the stochastic oscillator.
+    """
+    close = as_float_array(close)
+    lowest = rolling_min(low, k_window)
+    highest = rolling_max(high, k_window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = 100.0 * (close - lowest) / (highest - lowest)
+    return k, sma(k, d_window)
+
+
+def bollinger(close, window=20, num_std=2.0, middle=None):
+    """
+    Return (upper, middle, lower) Bollinger bands.
+    """
+    if middle is None:
+        middle = sma(close, window)
+    width = num_std * rolling_std(close, window)
+    return middle + width, middle, middle - width
+
+
+ALL_INDICATORS = ('sma', 'ema', 'rsi', 'macd', 'stochastic', 'bollinger', 'volume_ma')
+
+
+@timed('indicators')
+def compute_indicators(hist, include=ALL_INDICATORS, sma_windows=(20, 50), ema_spans=(12, 26),
+                       rsi_period=14, bb_window=20, bb_std=2.0, stoch_window=14, volume_window=20):
+    """
+    Compute the requested indicators for an OHLCV DataFrame in one call.
+
+    Returns a dict of float64 arrays aligned with hist: 'ma<w>' for each SMA
+    window, 'ema<span>' for each EMA span, 'rsi', 'macd'/'macd_signal'/
+    'macd_hist', 'stoch_k'/'stoch_d', 'bb_upper'/'bb_middle'/'bb_lower' and
+    'volume_ma'.
+    """
+    include = set(include)
+    close = as_float_array(hist['Close'])
+    result = {}
+
+    if 'sma' in include or 'bollinger' in include:
+        windows = set(sma_windows) if 'sma' in include else set()
+        if 'bollinger' in include:
+            windows.add(bb_window)
+        for window in windows:
+            result[f'ma{window}'] = sma(close, window)
+
+    if 'ema' in include or 'macd' in include:
+        spans = set(ema_spans) if 'ema' in include else set()
+        if 'macd' in include:
+            spans.update((12, 26))
+        for span in spans:
+            result[f'ema{span}'] = ema(close, span)
+
+    if 'rsi' in include:
+        result['rsi'] = rsi(close, rsi_period)
+
+    if 'macd' in include:
+        line, signal, histogram = macd(close, fast_ema=result['ema12'], slow_ema=result['ema26'])
+        result['macd'] = line
+        result['macd_signal'] = signal
+        result['macd_hist'] = histogram
+
+    if 'stochastic' in include:
+        result['stoch_k'], result['stoch_d'] = stochastic(hist['High'], hist['Low'], close, stoch_window)
+
+    if 'bollinger' in include:
+        upper, middle, lower = bollinger(close, bb_window, bb_std, middle=result[f'ma{bb_window}'])
+        result['bb_upper'] = upper
+        result['bb_middle'] = middle
+        result['bb_lower'] = lower
+
+    if 'volume_ma' in include:
+        result['volume_ma'] = sma(hist['Volume'], volume_window)
+
+    return result
+
+
+def last_value(values, default=None):
+    """
+    Last element as a Python float, or default when it is missing/NaN.
+    """
+    if len(values) == 0:
+        return default
+    value = float(values[-1])
+    if math.isnan(value):
+        return default
+    return value
+
+
+def to_json_list(values, scale=1.0):
+    """
+    Scale an indicator array and turn it into a list with NaN as None.
+    """
+    values = as_float_array(values) * scale
+    return np.where(np.isnan(values), None, values).tolist()
@@ -0,0 +1,412 @@
+"""
+Load generator for the trading and quote endpoints.
+
+Simulates trading-page users against a running server, each one an
+asyncio task with its own keep-alive connection and session cookie and,
+by default, its own account, created through /signup as the user joins
+the ramp (named <--account-prefix>-<n>, so positions and order books do
+not collide between users; --shared-accounts logs everyone into the
+three built-in demo accounts instead). Each user logs in, opens /trade,
+then polls /get_stock_data and /get_trading_signal
+for one symbol every --poll-interval seconds the way trade.html does
+(revalidating with If-None-Match like a browser), with an occasional
+burst of market orders through /execute_trade and a look at /portfolio.
+Users are started by a ramp profile and all run until the end of the
+test; the report gives the error rate and latency percentiles of every
+request type and a latency histogram:
+
+    python loadgen.py --users 500 --ramp linear --ramp-time 60 --duration 300
+    python loadgen.py --url http://staging:5000 --users 200 --ramp step --steps 4 --output load.json
+
+An error is a request that failed to connect or complete within
+--timeout, or answered with a status the page would not expect.
+Only the standard library and NumPy are needed.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+# Built-in demo accounts, shared out round-robin with --shared-accounts
+USERS = [('admin', 'admin123'), ('user1', 'password123'), ('praveen', '12')]
+SYMBOLS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META', 'NFLX', 'RELIANCE.NS', 'TCS.NS']
+# Upper bounds of the histogram buckets in milliseconds
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+RAMP_PROFILES = ('instant', 'linear', 'step')
+
+
+class Connection:
+    """
+    A minimal HTTP/1.1 client over asyncio streams: one keep-alive
+    connection, a cookie jar and a browser-style cache of ETag'd bodies.
+    """
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.cookies = {}
+        self._cache = {}  # path -> (etag, body)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+    def _head(self, method, path, body, content_type):
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                 'Accept: */*', 'Accept-Encoding: gzip', 'User-Agent: loadgen']
+        if self.cookies:
+            lines.append('Cookie: ' + '; '.join(f"{name}={value}" for name, value in self.cookies.items()))
+        cached = self._cache.get(path)
+        if method == 'GET' and cached is not None:
+            lines.append(f"If-None-Match: {cached[0]}")
+        if body or method == 'POST':
+            lines.append(f"Content-Type: {content_type}")
+            lines.append(f"Content-Length: {len(body)}")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    def _set_cookie(self, value):
+        pair, _, attributes = value.partition(';')
+        name, _, cookie = pair.strip().partition('=')
+        attributes = attributes.lower()
+        if not cookie or 'max-age=0' in attributes or 'expires=thu, 01 jan 1970' in attributes:
+            self.cookies.pop(name, None)
+        else:
+            self.cookies[name] = cookie
+
+    async def _read_response(self, method):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionResetError('server closed the connection')
+        version, status = line.split(None, 2)[:2]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'set-cookie':
+                self._set_cookie(value.strip())
+            else:
+                headers[name] = value.strip()
+
+        keep_alive = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            body = b''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            keep_alive = False
+        if headers.get('content-encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return status, headers, body, keep_alive
+
+    async def request(self, method, path, params=None, form=None, json_body=None):
+        """
+        Send one request and return (status, body). A 304 returns the
+        cached body. Raises on connection failures and timeouts.
+        """
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        if json_body is not None:
+            body, content_type = json.dumps(json_body).encode('utf-8'), 'application/json'
+        else:
+            body, content_type = urlencode(form or {}).encode('utf-8'), 'application/x-www-form-urlencoded'
+
+        while True:
+            reused = self.writer is not None
+            try:
+                if not reused:
+                    self.reader, self.writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.timeout)
+                self.writer.write(self._head(method, path, body, content_type) + body)
+                status, headers, data, keep_alive = await asyncio.wait_for(self._read_response(method), self.timeout)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                await self.close()
+                if not reused:
+                    raise ConnectionError(f"{type(e).__name__}: {e}") from e
+                # The server dropped an idle keep-alive connection, reconnect once
+            except BaseException:
+                await self.close()
+                raise
+        if not keep_alive:
+            await self.close()
+
+        if status == 304 and path in self._cache:
+            return status, self._cache[path][1]
+        if method == 'GET' and status == 200 and 'etag' in headers:
+            self._cache[path] = (headers['etag'], data)
+        return status, data
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)    # request name -> [ms]
+        self.statuses = defaultdict(Counter)  # request name -> status -> count
+        self.errors = defaultdict(Counter)    # request name -> error -> count
+        self.requests = 0
+        self.failed = 0
+
+    def record(self, name, latency_ms, status, error=None):
+        self.requests += 1
+        self.latencies[name].append(latency_ms)
+        if status is not None:
+            self.statuses[name][status] += 1
+        if error is not None:
+            self.failed += 1
+            self.errors[name][error] += 1
+
+    def histogram(self):
+        latencies = np.concatenate([np.asarray(values) for values in self.latencies.values()]) \
+            if self.latencies else np.empty(0)
+        edges = [0] + HISTOGRAM_BUCKETS_MS + [np.inf]
+        counts, _ = np.histogram(latencies, bins=edges)
+        return [(f"<= {bound} ms" if bound != np.inf else f"> {HISTOGRAM_BUCKETS_MS[-1]} ms", int(count))
+                for bound, count in zip(edges[1:], counts)]
+
+    def summary(self, elapsed):
+        routes = {}
+        for name, values in sorted(self.latencies.items()):
+            values = np.asarray(values)
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            errors = sum(self.errors[name].values())
+            routes[name] = {
+                'requests': len(values),
+                'errors': errors,
+                'error_rate': round(errors / len(values), 4),
+                'p50_ms': round(float(p50), 2),
+                'p95_ms': round(float(p95), 2),
+                'p99_ms': round(float(p99), 2),
+                'max_ms': round(float(values.max()), 2),
+                'statuses': {str(status): count for status, count in sorted(self.statuses[name].items())},
+                'error_kinds': dict(self.errors[name])
+            }
+        return {
+            'requests': self.requests,
+            'errors': self.failed,
+            'error_rate': round(self.failed / self.requests, 4) if self.requests else 0.0,
+            'throughput_rps': round(self.requests / elapsed, 1) if elapsed else 0.0,
+            'routes': routes,
+            'histogram': dict(self.histogram())
+        }
+
+
+async def call(conn, stats, name, method, path, expected=(200,), check=None, **kwargs):
+    """
+    Time one request and record it; returns (status, body) or (None, None)
+    when the request failed outright. check(body), when given, must be
+    true for an expected status to count as a success.
+    """
+    start = time.perf_counter()
+    try:
+        status, body = await conn.request(method, path, **kwargs)
+    except asyncio.TimeoutError:
+        stats.record(name, (time.perf_counter() - start) * 1000, None, 'timeout')
+        return None, None
+    except (ConnectionError, OSError, ValueError) as e:
+        stats.record(name, (time.perf_counter() - start) * 1000, None, type(e).__name__)
+        return None, None
+    if status not in expected:
+        error = f"HTTP {status}"
+    elif check is not None and not check(body):
+        error = 'rejected'
+    else:
+        error = None
+    stats.record(name, (time.perf_counter() - start) * 1000, status, error)
+    return status, body
+
+
+def _json(body):
+    try:
+        return json.loads(body)
+    except (TypeError, ValueError):
+        return {}
+
+
+async def trade_burst(conn, stats, rng, args, symbol, price, held):
+    """
+    A few market orders in quick succession, as when a user works a
+    position; returns the shares held afterwards.
+    """
+    for _ in range(rng.randint(1, args.burst_size)):
+        sell = held > 0 and rng.random() < 0.4
+        quantity = rng.randint(1, held) if sell else rng.randint(1, 10)
+        status, body = await call(conn, stats, 'POST /execute_trade', 'POST', '/execute_trade', json_body={
+            'symbol': symbol,
+            'action': 'sell' if sell else 'buy',
+            'quantity': quantity,
+            'price': price,
+            'order_type': 'market'
+        })
+        trade = _json(body).get('trade') if status == 200 else None
+        if trade:
+            held += -trade['quantity'] if sell else trade['quantity']
+        await asyncio.sleep(rng.uniform(0.2, 1.0) * args.pace)
+    return held
+
+
+async def user_session(user_id, args, stats, stop_at, active):
+    rng = random.Random(args.seed * 100003 + user_id)
+    host, port = args.target
+    conn = Connection(host, port, args.timeout)
+    symbol = rng.choice(SYMBOLS)
+    active[0] += 1
+    try:
+        if args.shared_accounts:
+            username, password = USERS[user_id % len(USERS)]
+        else:
+            username, password = f"{args.account_prefix}-{user_id}", 'loadgen'
+            # Answered with the login page (200) either way, the text tells
+            status, body = await call(conn, stats, 'POST /signup', 'POST', '/signup',
+                                      check=lambda body: b'Account created' in body,
+                                      form={'username': username, 'email': f"{username}@loadgen.invalid",
+                                            'password': password})
+            if status != 200 or b'Account created' not in body:
+                return
+        await call(conn, stats, 'GET /login', 'GET', '/login')
+        status, _ = await call(conn, stats, 'POST /login', 'POST', '/login', expected=(302,),
+                               form={'username': username, 'password': password})
+        if status != 302:
+            return
+        await call(conn, stats, 'GET /trade', 'GET', '/trade')
+
+        price = None
+        held = 0
+        while time.monotonic() < stop_at:
+            status, body = await call(conn, stats, 'GET /get_stock_data', 'GET', '/get_stock_data',
+                                      expected=(200, 304), params={'symbol': symbol})
+            price = _json(body).get('price') or price
+            await call(conn, stats, 'GET /get_trading_signal', 'GET', '/get_trading_signal',
+                       expected=(200, 304), params={'symbol': symbol})
+            if price and rng.random() < args.trade_probability:
+                held = await trade_burst(conn, stats, rng, args, symbol, price, held)
+            if rng.random() < args.portfolio_probability:
+                await call(conn, stats, 'GET /portfolio', 'GET', '/portfolio')
+            # Polls drift apart the way independent browsers do
+            delay = args.poll_interval * rng.uniform(0.9, 1.1) * args.pace
+            await asyncio.sleep(max(0.0, min(delay, stop_at - time.monotonic())))
+    finally:
+        active[0] -= 1
+        await conn.close()
+
+
+def start_offsets(users, ramp, ramp_time, steps):
+    """
+    Seconds after the start at which each user begins.
+    """
+    if ramp == 'instant' or ramp_time <= 0:
+        return [0.0] * users
+    if ramp == 'linear':
+        return [ramp_time * i / users for i in range(users)]
+    # step: equal batches, the first at once and the last at ramp_time
+    steps = max(1, min(steps, users))
+    gap = ramp_time / (steps - 1) if steps > 1 else 0.0
+    return [(i * steps // users) * gap for i in range(users)]
+
+
+async def _delayed(offset, coro_fn, *args):
+    await asyncio.sleep(offset)
+    await coro_fn(*args)
+
+
+async def report_progress(stats, active, started, interval):
+    last_requests, last_failed = 0, 0
+    while True:
+        await asyncio.sleep(interval)
+        requests, failed = stats.requests - last_requests, stats.failed - last_failed
+        last_requests, last_failed = stats.requests, stats.failed
+        print(f"[{time.monotonic() - started:6.0f}s] {active[0]:5d} users  {requests / interval:8.1f} req/s  "
+              f"{(failed / requests * 100) if requests else 0.0:5.1f}% errors")
+
+
+async def run(args):
+    stats = Stats()
+    active = [0]
+    started = time.monotonic()
+    offsets = start_offsets(args.users, args.ramp, args.ramp_time, args.steps)
+    stop_at = started + max(offsets, default=0.0) + args.duration
+    reporter = asyncio.ensure_future(report_progress(stats, active, started, args.report_interval))
+    try:
+        await asyncio.gather(*(_delayed(offset, user_session, i, args, stats, stop_at, active)
+                               for i, offset in enumerate(offsets)))
+    finally:
+        reporter.cancel()
+    return stats, time.monotonic() - started
+
+
+def print_report(summary):
+    print(f"\n{summary['requests']} requests, {summary['errors']} errors "
+          f"({summary['error_rate'] * 100:.2f}%), {summary['throughput_rps']:.1f} req/s")
+    for name, route in summary['routes'].items():
+        errors = ', '.join(f"{kind} x{count}" for kind, count in route['error_kinds'].items())
+        print(f"{name:<26} {route['requests']:7d}  {route['error_rate'] * 100:6.2f}% err  "
+              f"p50 {route['p50_ms']:8.1f}ms  p95 {route['p95_ms']:8.1f}ms  p99 {route['p99_ms']:8.1f}ms"
+              + (f"  [{errors}]" if errors else ''))
+    print('\nLatency histogram (all requests)')
+    largest = max(summary['histogram'].values(), default=0) or 1
+    for bucket, count in summary['histogram'].items():
+        print(f"{bucket:>12} {count:8d} {'#' * round(50 * count / largest)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent load generator for the trading pages')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--ramp', choices=RAMP_PROFILES, default='linear')
+    parser.add_argument('--ramp-time', type=float, default=30.0, help='seconds until every user has started')
+    parser.add_argument('--steps', type=int, default=5, help='number of batches for --ramp step')
+    parser.add_argument('--duration', type=float, default=120.0, help='seconds to hold full load after the ramp')
+    parser.add_argument('--poll-interval', type=float, default=30.0, help='seconds between price polls, as trade.html')
+    parser.add_argument('--pace', type=float, default=1.0, help='scale every think time (0.1 = ten times faster users)')
+    parser.add_argument('--trade-probability', type=float, default=0.1, help='chance of a trade burst after a poll')
+    parser.add_argument('--burst-size', type=int, default=3, help='most orders in one burst')
+    parser.add_argument('--portfolio-probability', type=float, default=0.05, help='chance of a portfolio view after a poll')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds before a request counts as failed')
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--shared-accounts', action='store_true',
+                        help='log users into the three demo accounts instead of signing each one up')
+    parser.add_argument('--account-prefix', default=f"load{int(time.time())}",
+                        help='username prefix of the signed-up accounts (default: unique per run)')
+    parser.add_argument('--output', help='write the summary to this JSON file')
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    args.target = (url.hostname, url.port or 80)
+    stats, elapsed = asyncio.run(run(args))
+    summary = stats.summary(elapsed)
+    print_report(summary)
+    if args.output:
+        summary['meta'] = {key: value for key, value in vars(args).items() if key != 'target'}
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,395 @@
+"""
+Shared market data access layer.
+
+Every route reads price history through get_history() so that repeated
+lookups for the same (symbol, period, interval) within a short window are
+served from one process-wide cache instead of going back to the market
+data provider (Yahoo Finance unless configured otherwise, see providers).
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+from ohlcv_store import (STORED_INTERVALS, COLUMNS, bars_to_frame, frame_to_bars, merge_bars,
+                         ohlcv_store, period_days)
+from providers import get_provider
+from metrics import timed, upstream_call
+
+logger = logging.getLogger(__name__)
+
+# How long cached bars stay fresh, by bar interval (seconds).
+# Intraday bars move constantly, daily and weekly bars barely change.
+INTERVAL_TTL = {
+    '1m': 5,
+    '2m': 10,
+    '5m': 30,
+    '15m': 60,
+    '30m': 120,
+    '60m': 300,
+    '90m': 300,
+    '1h': 300,
+    '1d': 4 * 60 * 60,
+    '5d': 4 * 60 * 60,
+    '1wk': 12 * 60 * 60,
+    '1mo': 24 * 60 * 60,
+    '3mo': 24 * 60 * 60
+}
+DEFAULT_TTL = 60
+
+# An empty result is usually a hiccup (or a bad symbol), ask again soon
+EMPTY_TTL = 5
+
+# Upper bound on the memory held by cached DataFrames
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Company info barely changes
+INFO_TTL = 60 * 60
+
+# Serve stored bars without asking upstream for the missing tail
+STORE_OFFLINE = os.environ.get('OHLCV_STORE_OFFLINE', '') == '1'
+
+
+class HistoryCache:
+    """
+    Thread-safe LRU cache of history DataFrames with a TTL per entry,
+    bounded by the total memory of the cached frames.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, nbytes, frame)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, record=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if record:
+                    self.misses += 1
+                return None
+            expires_at, nbytes, frame = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= nbytes
+                self.expirations += 1
+                if record:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if record:
+                self.hits += 1
+            return frame
+
+    def put(self, key, frame, ttl):
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic() + ttl, nbytes, frame)
+            self._bytes += nbytes
+            # Evict least recently used entries until we fit again
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the
+    fetch, everyone arriving while it is in flight waits for its result.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def claim(self, key):
+        """
+        Return (future, is_leader). The leader must resolve the future and
+        then call release(key); followers just wait on future.result().
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.followers += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def release(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def do(self, key, fn):
+        future, is_leader = self.claim(key)
+        if not is_leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self.release(key)
+
+
+history_cache = HistoryCache()
+_info_cache = {}  # symbol -> (expires_at, info)
+_info_lock = threading.Lock()
+inflight = SingleFlight()
+
+
+def _cache_key(symbol, period, interval):
+    return (symbol.strip().upper(), period, interval)
+
+
+def _from_store(period, interval):
+    return interval in STORED_INTERVALS and period_days(period) is not None
+
+
+def _ttl(interval, hist):
+    if hist.empty:
+        return EMPTY_TTL
+    return INTERVAL_TTL.get(interval, DEFAULT_TTL)
+
+
+@timed('market_data')
+def get_history(symbol, period='1mo', interval='1d'):
+    """
+    Return OHLCV history for symbol, using the shared cache when fresh.
+    The caller gets its own copy and is free to add columns to it.
+    """
+    key = _cache_key(symbol, period, interval)
+    hist = history_cache.get(key)
+    if hist is None:
+        # Concurrent misses for the same key share one upstream fetch
+        hist = inflight.do(key, lambda: _fetch_history(key))
+    return hist.copy()
+
+
+def _fetch_history(key):
+    symbol, period, interval = key
+    # Another request may have filled the cache while we queued for the key
+    hist = history_cache.get(key, record=False)
+    if hist is None:
+        if _from_store(period, interval):
+            hist = _history_from_store(symbol, period, interval)
+        else:
+            hist = upstream_call('history', get_provider().history, symbol, period=period, interval=interval)
+        history_cache.put(key, hist, _ttl(interval, hist))
+    return hist
+
+
+def _history_from_store(symbol, period, interval):
+    """
+    Read history from the local OHLCV store, fetching upstream only the
+    bars since the last stored one (or the full period the first time, or
+    when the store does not reach back far enough).
+    """
+    with ohlcv_store.lock(symbol, interval):
+        meta = ohlcv_store.read_meta(symbol, interval)
+        bars = ohlcv_store.read(symbol, interval) if meta is not None else None
+        if bars is None:
+            # A sidecar whose .npy is missing or corrupt: nothing is stored
+            meta = None
+        covered = meta is not None and period_days(meta['period']) >= period_days(period)
+        if not covered:
+            if STORE_OFFLINE and meta is not None:
+                return _slice_period(bars, meta, period)
+            fresh = upstream_call('history', get_provider().history, symbol, period=period, interval=interval)
+            if fresh.empty:
+                return fresh
+            fresh = fresh[COLUMNS]
+            ohlcv_store.write(symbol, interval, frame_to_bars(fresh), {
+                'period': period,
+                'tz': str(fresh.index.tz) if fresh.index.tz is not None else None
+            })
+            return fresh
+
+        if not STORE_OFFLINE and len(bars):
+            try:
+                last_bar = bars_to_frame(bars[-1:], meta['tz']).index[-1]
+                # Often empty: no bar has closed since the last one stored
+                tail = upstream_call('history', get_provider().history, symbol, interval=interval,
+                                     start=last_bar.strftime('%Y-%m-%d'), expect_data=False)
+                if not tail.empty:
+                    bars = merge_bars(bars, frame_to_bars(tail[COLUMNS]))
+                    ohlcv_store.write(symbol, interval, bars, meta)
+            except Exception as exc:
+                # Upstream is down, the stored bars are still good
+                logger.warning("Serving %s %s from local store, tail fetch failed: %s", symbol, interval, exc)
+        return _slice_period(bars, meta, period)
+
+
+def _slice_period(bars, meta, period):
+    frame = bars_to_frame(bars, meta['tz'])
+    days = period_days(period)
+    if days == float('inf') or frame.empty:
+        return frame
+    start = frame.index[-1] - pd.Timedelta(days=days)
+    return frame[frame.index > start]
+
+
+@timed('market_data')
+def get_history_batch(symbols, period='1mo', interval='1d'):
+    """
+    Return {symbol: history} for many symbols at once. Everything not
+    already cached (or being fetched by another request) is fetched in a
+    single multi-ticker download and split back into per-symbol frames.
+    Stored intervals are read through the OHLCV store instead, which only
+    asks upstream for each symbol's latest bars. Symbols whose fetch
+    failed are left out of the result.
+    """
+    keys = {}
+    for symbol in symbols:
+        if symbol.strip():
+            keys[symbol] = _cache_key(symbol, period, interval)
+
+    frames = {}
+    owned = []
+    waiting = {}
+    for key in set(keys.values()):
+        hist = history_cache.get(key)
+        if hist is not None:
+            frames[key] = hist
+            continue
+        future, is_leader = inflight.claim(key)
+        if is_leader:
+            owned.append((key, future))
+        else:
+            waiting[key] = future
+
+    if owned:
+        try:
+            if _from_store(period, interval):
+                single, batched = owned, []
+            else:
+                single, batched = [], owned
+            if batched:
+                try:
+                    downloaded = upstream_call('download', get_provider().download, [key[0] for key, _ in batched],
+                                               period, interval)
+                except Exception as exc:
+                    logger.warning("Batch download failed for %d symbols: %s", len(batched), exc)
+                    batched = []
+            for key, future in batched:
+                hist = downloaded.get(key[0])
+                if hist is None:
+                    # Left out of the download, ask for it on its own
+                    single.append((key, future))
+                    continue
+                history_cache.put(key, hist, _ttl(interval, hist))
+                frames[key] = hist
+                future.set_result(hist)
+            for key, future in single:
+                try:
+                    hist = _fetch_history(key)
+                except Exception as exc:
+                    logger.warning("History fetch failed for %s: %s", key[0], exc)
+                    continue
+                frames[key] = hist
+                future.set_result(hist)
+        finally:
+            # Followers block on these futures: none may stay unresolved,
+            # whatever went wrong on the way
+            for key, future in owned:
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Batch download failed for {key[0]}"))
+                inflight.release(key)
+
+    for key, future in waiting.items():
+        try:
+            frames[key] = future.result()
+        except Exception:
+            pass
+
+    return {symbol: frames[key].copy() for symbol, key in keys.items() if key in frames}
+
+
+# Finest-grained bars first, falling back to coarser ones when a symbol has
+# no intraday data (market closed, delisted intraday feed, ...)
+RECENT_HISTORY_FALLBACKS = [('1d', '1m'), ('5d', '1h'), ('1mo', '1d')]
+
+
+@timed('market_data')
+def get_recent_history_batch(symbols):
+    """
+    Return {symbol: most recent non-empty history} for many symbols, with
+    one batched download per fallback level instead of one per symbol.
+    """
+    histories = {}
+    pending = [symbol for symbol in symbols if symbol.strip()]
+    for period, interval in RECENT_HISTORY_FALLBACKS:
+        if not pending:
+            break
+        batch = get_history_batch(pending, period=period, interval=interval)
+        for symbol in pending:
+            hist = batch.get(symbol)
+            if hist is not None and not hist.empty:
+                histories[symbol] = hist
+        pending = [symbol for symbol in pending if symbol not in histories]
+    return histories
+
+
+@timed('market_data')
+def get_info(symbol):
+    """
+    Return the yfinance info dict for symbol. Results are kept for
+    INFO_TTL seconds and concurrent lookups for the same symbol share one
+    upstream call.
+    """
+    symbol = symbol.strip().upper()
+    with _info_lock:
+        cached = _info_cache.get(symbol)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    info = inflight.do(('info', symbol), lambda: upstream_call('info', get_provider().info, symbol))
+    with _info_lock:
+        _info_cache[symbol] = (time.monotonic() + INFO_TTL, info)
+    return info
+
+
+def cache_stats():
+    stats = history_cache.stats()
+    stats['coalesced_requests'] = inflight.followers
+    return stats
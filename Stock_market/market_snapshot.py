@@ -0,0 +1,272 @@
+"""
+Shared market dashboard snapshot.
+
+The home page and /get_news summarise the same indices, sector ETFs and
+top movers. A background thread rebuilds one snapshot of that summary
+(index and sector sentiment, movers, generated articles) every
+SNAPSHOT_INTERVAL seconds, and both routes serve the current snapshot
+as is. Each snapshot carries an ETag derived from its market data, so a
+rebuild that finds nothing new keeps the previous snapshot and clients
+revalidating with If-None-Match get a 304.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from market_data import get_history_batch
+from symbol_metadata import symbol_metadata
+
+SNAPSHOT_INTERVAL = float(os.environ.get('MARKET_SNAPSHOT_INTERVAL', '60'))
+
+
+def _daily_change(hist):
+    if hist is None or len(hist) < 2:
+        return None
+    current = float(hist['Close'].iloc[-1])
+    previous = float(hist['Close'].iloc[-2])
+    return current, ((current - previous) / previous) * 100
+
+
+def _home_articles(movers, sentiment_label, current_date):
+    articles = []
+    if len(movers) >= 1:
+        top = movers[0]
+        direction = "surges" if top['change'] > 0 else "drops"
+        articles.append({
+            "title": f"{top['name']} {direction} {abs(top['change']):.1f}% - {current_date}",
+            "summary": f"{top['name']} ({top['symbol']}) shows significant movement with {top['change']:.2f}% change. Current price: ₹{top['price']:.2f}. Market analysts monitoring closely."
+        })
+
+    if len(movers) >= 2:
+        second = movers[1]
+        direction = "rallies" if second['change'] > 0 else "declines"
+        articles.append({
+            "title": f"{second['name']} {direction} {abs(second['change']):.1f}% in Latest Trading",
+            "summary": f"{second['name']} experiences {abs(second['change']):.2f}% {'gain' if second['change'] > 0 else 'loss'} at ₹{second['price']:.2f}. Trading volume indicates strong investor interest."
+        })
+
+    # Add market overview
+    if sentiment_label == "Bullish":
+        articles.append({
+            "title": f"Markets Close Higher - {current_date}",
+            "summary": f"Major indices show positive momentum with markets trending {sentiment_label.lower()}. Technology and growth stocks lead the rally as investor sentiment remains strong."
+        })
+    elif sentiment_label == "Bearish":
+        articles.append({
+            "title": f"Market Pullback Continues - {current_date}",
+            "summary": f"Indices face pressure with {sentiment_label.lower()} sentiment prevailing. Investors rotating into defensive sectors amid market volatility."
+        })
+    else:
+        articles.append({
+            "title": f"Markets Trade Mixed - {current_date}",
+            "summary": f"Indices show mixed performance with {sentiment_label.lower()} sentiment. Investors await key economic data and corporate earnings reports."
+        })
+    return articles
+
+
+def _news_articles(movers, index_changes, current_date, timestamp):
+    articles = []
+    if len(movers) >= 1:
+        top = movers[0]
+        direction = "surges" if top['change'] > 0 else "drops"
+        articles.append({
+            "title": f"{top['name']} {direction} {abs(top['change']):.1f}% - {current_date}",
+            "summary": f"{top['name']} ({top['symbol']}) shows significant movement with {top['change']:.2f}% change. Current price: ₹{top['price']:.2f}. Market analysts monitoring closely.",
+            "timestamp": timestamp
+        })
+
+    if len(movers) >= 2:
+        second = movers[1]
+        direction = "rallies" if second['change'] > 0 else "declines"
+        articles.append({
+            "title": f"{second['name']} {direction} {abs(second['change']):.1f}% in Latest Trading",
+            "summary": f"{second['name']} experiences {abs(second['change']):.2f}% {'gain' if second['change'] > 0 else 'loss'} at ₹{second['price']:.2f}. Trading volume indicates strong investor interest.",
+            "timestamp": timestamp
+        })
+
+    if len(movers) >= 3:
+        third = movers[2]
+        direction = "gains" if third['change'] > 0 else "loses"
+        articles.append({
+            "title": f"{third['name']} {direction} momentum as {third['symbol']} moves {abs(third['change']):.1f}%",
+            "summary": f"{third['name']} continues {direction} momentum with {abs(third['change']):.2f}% movement. Current valuation at ₹{third['price']:.2f} attracts investor attention.",
+            "timestamp": timestamp
+        })
+
+    if index_changes:
+        avg_change = sum(index_changes) / len(index_changes)
+        if avg_change > 0.5:
+            label = "Bullish"
+        elif avg_change < -0.5:
+            label = "Bearish"
+        else:
+            label = "Neutral"
+        articles.append({
+            "title": f"Market Update: {label} Sentiment Prevails - {current_date}",
+            "summary": f"Major indices show {label.lower()} sentiment with average movement of {avg_change:.2f}%. Investors remain {label.lower()} on economic outlook.",
+            "timestamp": timestamp
+        })
+    return articles
+
+
+def _fallback_article(current_date, **extra):
+    return dict({
+        "title": f"Market Update - {current_date}",
+        "summary": "Markets are currently active. Check individual stocks for latest price movements and trading opportunities."
+    }, **extra)
+
+
+class MarketSnapshot:
+    """
+    `sectors` maps sector names to their ETF symbols. `rate(symbol)`
+    converts mover prices into the display currency.
+    """
+
+    def __init__(self, indices, sectors, movers, interval=SNAPSHOT_INTERVAL, rate=lambda symbol: 1.0):
+        self.indices = list(indices)
+        self.sectors = dict(sectors)
+        self.movers = list(movers)
+        self.interval = interval
+        self.rate = rate
+        self.version = 0
+        self.builds = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='market-snapshot', daemon=True)
+            self._thread.start()
+
+    def get(self):
+        """
+        The current snapshot; the first call builds it and starts the
+        background refresh.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self.refresh()
+                self._start()
+                snapshot = self._snapshot
+        return snapshot
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Market snapshot refresh failed: {e}")
+
+    def _market_data(self):
+        symbols = self.indices + list(self.sectors.values()) + self.movers
+        try:
+            histories = get_history_batch(symbols, period='5d')
+        except Exception as e:
+            print(f"Error fetching market snapshot data: {e}")
+            histories = {}
+
+        index_changes = []
+        for symbol in self.indices:
+            try:
+                change = _daily_change(histories.get(symbol))
+                if change is not None:
+                    index_changes.append(change[1])
+            except Exception:
+                pass
+
+        sector_changes = {}
+        for sector, etf in self.sectors.items():
+            try:
+                change = _daily_change(histories.get(etf))
+                sector_changes[sector] = None if change is None else change[1]
+            except Exception:
+                sector_changes[sector] = None
+
+        movers = []
+        for symbol in self.movers:
+            try:
+                change = _daily_change(histories.get(symbol))
+                if change is not None:
+                    movers.append({
+                        'symbol': symbol,
+                        'name': symbol_metadata.name(symbol, short=True),
+                        'change': change[1],
+                        'price': change[0] * self.rate(symbol)
+                    })
+            except Exception:
+                pass
+        # Sort by absolute change
+        movers.sort(key=lambda x: abs(x['change']), reverse=True)
+        return index_changes, sector_changes, movers
+
+    def refresh(self):
+        """
+        Rebuild the snapshot, keeping the current one when the market
+        data has not changed since it was built.
+        """
+        index_changes, sector_changes, movers = self._market_data()
+        now = datetime.now()
+        current_date = now.strftime('%B %d, %Y')
+        self.builds += 1
+        fingerprint = json.dumps([index_changes, sector_changes, movers, current_date], sort_keys=True)
+        etag = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:16]
+        if self._snapshot is not None and self._snapshot['etag'] == etag:
+            return self._snapshot
+
+        # Market sentiment from the index moves
+        if index_changes:
+            avg_change = sum(index_changes) / len(index_changes)
+            sentiment_score = min(max((avg_change + 2) / 4, 0), 1)  # Normalize to 0-1
+            if avg_change > 1:
+                sentiment_label = "Bullish"
+            elif avg_change < -1:
+                sentiment_label = "Bearish"
+            else:
+                sentiment_label = "Neutral"
+        else:
+            sentiment_score = 0.5
+            sentiment_label = "Neutral"
+
+        sector_sentiment = {}
+        for sector, change_pct in sector_changes.items():
+            if change_pct is None:
+                sector_sentiment[sector] = {"score": 0.5, "label": "Neutral"}
+                continue
+            score = min(max((change_pct + 2) / 4, 0), 1)
+            if change_pct > 0.5:
+                label = "Bullish"
+            elif change_pct < -0.5:
+                label = "Bearish"
+            else:
+                label = "Neutral"
+            sector_sentiment[sector] = {"score": round(score, 2), "label": label}
+
+        timestamp = now.strftime('%H:%M')
+        news_articles = (_news_articles(movers, index_changes, current_date, timestamp)
+                         or [_fallback_article(current_date, timestamp=timestamp)])
+        self.version += 1
+        self._snapshot = {
+            'version': self.version,
+            'etag': etag,
+            'market_sentiment_score': sentiment_score,
+            'market_sentiment_label': sentiment_label,
+            'sector_sentiment': sector_sentiment,
+            'movers': movers,
+            'articles': _home_articles(movers, sentiment_label, current_date) or [_fallback_article(current_date)],
+            'news': {
+                'articles': news_articles,
+                'last_updated': now.strftime('%Y-%m-%d %H:%M:%S'),
+                'version': self.version
+            }
+        }
+        return self._snapshot
+
+    def stats(self):
+        return {'version': self.version, 'builds': self.builds, 'interval': self.interval}
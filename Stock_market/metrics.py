@@ -0,0 +1,320 @@
+"""
+Request and hot-path metrics in the Prometheus text format.
+
+Every request's latency goes into http_request_duration_seconds by route
+(the URL rule, not the raw path), method and status. Inside a request,
+time spent in each stage is added to route_stage_duration_seconds:
+
+    market_data    history and info lookups, cached or not
+    upstream       calls to the market data provider (within market_data)
+    indicators     indicator computation
+    db             holding a database connection
+    serialization  JSON and binary encoding of responses
+    render         Jinja template rendering
+
+Functions are attributed with @timed('stage') or `with stage('stage')`;
+a stage entered again further down the same call (get_history_batch
+calling get_history) is only counted once. Work outside a request is
+recorded under the route 'background'.
+
+Counters that already live in the caches and services (hits, misses,
+failures) are not duplicated here: register_collector() adds a function
+that reads them at scrape time. render() produces the /metrics body.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from flask.signals import before_render_template, template_rendered
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; request latencies of the quote routes sit in the low ms
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name + _labels(self.labelnames, key), value) for key, value in values]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        # First bucket whose upper bound holds value
+        low, high = 0, len(self.buckets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if value <= self.buckets[middle]:
+                high = middle
+            else:
+                low = middle + 1
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            entry[low] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(entry)) for key, entry in self._values.items()]
+        samples = []
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                samples.append((self.name + '_bucket' + _labels(self.labelnames, key, [('le', _number(float(bound)))]),
+                                cumulative))
+            samples.append((self.name + '_sum' + _labels(self.labelnames, key), entry[-2]))
+            samples.append((self.name + '_count' + _labels(self.labelnames, key), entry[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collect):
+        """
+        collect() yields (name, type, documentation, {label: value}, value)
+        tuples, read at every scrape. Samples with a value of None are
+        left out.
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{sample} {_number(value)}" for sample, value in metric.samples())
+        for collect in collectors:
+            try:
+                collected = list(collect())
+            except Exception as e:
+                print(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            described = set()
+            for name, metric_type, documentation, labels, value in collected:
+                if value is None:
+                    continue
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route, method and status',
+    ('route', 'method', 'status'))
+REQUESTS_IN_PROGRESS = registry.gauge('http_requests_in_progress', 'Requests being handled')
+STAGE_LATENCY = registry.histogram(
+    'route_stage_duration_seconds', 'Time spent in each stage of a request, by route and stage', ('route', 'stage'))
+UPSTREAM_LATENCY = registry.histogram(
+    'market_data_upstream_duration_seconds', 'Calls to the market data provider, by call', ('call',))
+UPSTREAM_ERRORS = registry.counter(
+    'market_data_upstream_errors_total', 'Failed or empty market data provider calls, by call and kind', ('call', 'kind'))
+
+_active = threading.local()
+
+
+def _route():
+    if has_request_context():
+        rule = request.url_rule
+        return rule.rule if rule is not None else 'unmatched'
+    return 'background'
+
+
+@contextmanager
+def stage(name):
+    """
+    Add the time spent in the block to the current route's stage name.
+    """
+    stages = getattr(_active, 'stages', None)
+    if stages is None:
+        stages = _active.stages = set()
+    if name in stages:
+        # Already timed further up this call
+        yield
+        return
+    stages.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages.discard(name)
+        STAGE_LATENCY.observe(time.perf_counter() - start, route=_route(), stage=name)
+
+
+def timed(name):
+    """
+    Decorator form of stage().
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def upstream_call(call, fn, *args, expect_data=True, **kwargs):
+    """
+    Run a market data provider call, recording its latency and counting
+    exceptions and, when expect_data, empty results (how yfinance
+    reports most failures).
+    """
+    start = time.perf_counter()
+    try:
+        with stage('upstream'):
+            result = fn(*args, **kwargs)
+    except Exception:
+        UPSTREAM_ERRORS.inc(call=call, kind='exception')
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, call=call)
+    if expect_data and (result is None or getattr(result, 'empty', False) or (isinstance(result, dict) and not result)):
+        UPSTREAM_ERRORS.inc(call=call, kind='empty')
+    return result
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    Flask's JSON provider with jsonify() timed as serialization (session
+    cookies, which also go through the provider, are left out).
+    """
+
+    def response(self, *args, **kwargs):
+        with stage('serialization'):
+            return super().response(*args, **kwargs)
+
+
+def _before_render(sender, template, context, **extra):
+    renders = getattr(_active, 'renders', None)
+    if renders is None:
+        renders = _active.renders = []
+    renders.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    renders = getattr(_active, 'renders', None)
+    if renders:
+        STAGE_LATENCY.observe(time.perf_counter() - renders.pop(), route=_route(), stage='render')
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    REQUESTS_IN_PROGRESS.inc()
+
+
+def _observe(status):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        REQUESTS_IN_PROGRESS.inc(-1)
+        REQUEST_LATENCY.observe(time.perf_counter() - started, route=_route(), method=request.method,
+                                status=str(status))
+
+
+def _finish_request(response):
+    _observe(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # Only still pending when the view raised and no response was made
+    if exc is not None:
+        _observe(500)
+
+
+def init_app(app):
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app, weak=False)
+    template_rendered.connect(_rendered, app, weak=False)
@@ -0,0 +1,145 @@
+"""
+Local on-disk OHLCV store.
+
+Bars for each (symbol, interval) live in one .npy file holding a
+structured array sorted by timestamp, plus a small JSON sidecar with the
+timezone and how far back the history goes. Files are opened
+memory-mapped and read() copies out only the slice asked for; writes go
+to a temporary file that is swapped in atomically.
+"""
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from providers import local_data_dir
+
+STORE_DIR = os.environ.get('OHLCV_STORE_DIR', os.path.join(local_data_dir(), 'ohlcv'))
+
+# Only bar sizes that are stable once closed are worth keeping on disk
+STORED_INTERVALS = {'1d', '5d', '1wk', '1mo', '3mo'}
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),  # nanoseconds since epoch (UTC for tz-aware history)
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8')
+])
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Rough length of each yfinance period, used to tell whether the stored
+# history reaches back far enough and to slice shorter periods out of it
+PERIOD_DAYS = {
+    '1d': 1,
+    '5d': 5,
+    '1mo': 31,
+    '3mo': 92,
+    '6mo': 183,
+    '1y': 366,
+    '2y': 731,
+    '5y': 1827,
+    '10y': 3653,
+    'max': float('inf')
+}
+
+
+def period_days(period):
+    if period == 'ytd':
+        today = pd.Timestamp.now()
+        return (today - pd.Timestamp(year=today.year, month=1, day=1)).days + 1
+    return PERIOD_DAYS.get(period)
+
+
+class OHLCVStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _base(self, symbol, interval):
+        safe_symbol = re.sub(r'[^A-Za-z0-9._-]', '_', symbol.upper())
+        return os.path.join(self.root, interval, safe_symbol)
+
+    def lock(self, symbol, interval):
+        """
+        Lock serializing read-merge-write cycles on one file.
+        """
+        key = (symbol.upper(), interval)
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def read_meta(self, symbol, interval):
+        try:
+            with open(self._base(symbol, interval) + '.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read(self, symbol, interval, start=None):
+        """
+        Return bars at or after start (a Timestamp, None for everything) as
+        an in-memory structured array, or None if nothing is stored.
+        """
+        try:
+            bars = np.load(self._base(symbol, interval) + '.npy', mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        first = 0
+        if start is not None and len(bars):
+            first = int(np.searchsorted(bars['ts'], start.value, side='left'))
+        # Copy just the slice we need and let the mapping go
+        return np.array(bars[first:])
+
+    def write(self, symbol, interval, bars, meta):
+        base = self._base(symbol, interval)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        tmp = base + '.tmp.npy'
+        np.save(tmp, bars)
+        os.replace(tmp, base + '.npy')
+        with open(base + '.json.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(base + '.json.tmp', base + '.json')
+
+
+def frame_to_bars(frame):
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    # .values is UTC for tz-aware indexes; normalise the unit to nanoseconds
+    bars['ts'] = frame.index.values.astype('datetime64[ns]').view('i8')
+    for name, column in zip(('open', 'high', 'low', 'close', 'volume'), COLUMNS):
+        bars[name] = frame[column].to_numpy(dtype=np.float64)
+    return bars
+
+
+def bars_to_frame(bars, tz=None):
+    index = pd.DatetimeIndex(bars['ts'].astype('datetime64[ns]'))
+    if tz:
+        index = index.tz_localize('UTC').tz_convert(tz)
+    return pd.DataFrame({
+        'Open': bars['open'],
+        'High': bars['high'],
+        'Low': bars['low'],
+        'Close': bars['close'],
+        'Volume': bars['volume']
+    }, index=index)
+
+
+def merge_bars(stored, tail):
+    """
+    Append tail to stored, with tail replacing any bars it overlaps
+    (the last stored bar is usually still forming).
+    """
+    if len(tail) == 0:
+        return stored
+    keep = int(np.searchsorted(stored['ts'], tail['ts'][0], side='left'))
+    return np.concatenate((stored[:keep], tail))
+
+
+ohlcv_store = OHLCVStore()
@@ -0,0 +1,398 @@
+"""
+In-memory order books and matching engine.
+
+Each symbol has a price-time-priority book: bids and asks are heaps keyed
+on (price, arrival sequence), and stop orders wait in two trigger heaps
+until the market trades through their trigger price. Supported order
+types are the ones the trading UI offers:
+
+- market: fills against resting orders, then against the market at the
+  last traded price
+- limit: fills while the book or the market is at or better than the
+  limit, the remainder rests in the book
+- sl: stop-limit, becomes a limit order once the trigger is hit
+- sl-m: stop-market, becomes a market order once the trigger is hit
+
+Resting orders fill as prices arrive through on_price(), optionally only
+up to the volume traded at that tick, so large orders can fill partially
+over several ticks. Prices must come from the server's own market data,
+never from a client. An order never trades against another order of the
+same owner (self-trade prevention): the pair is skipped and both stay
+for the market to fill. Cancels and amends are O(1): superseded heap entries
+are dropped lazily when they reach the top.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+ORDER_TYPES = ('market', 'limit', 'sl', 'sl-m')
+SIDES = ('buy', 'sell')
+
+# Status values
+OPEN = 'open'
+PENDING_TRIGGER = 'pending_trigger'
+PARTIALLY_FILLED = 'partially_filled'
+FILLED = 'filled'
+CANCELLED = 'cancelled'
+
+Fill = namedtuple('Fill', 'order_id owner symbol side quantity price timestamp')
+
+
+class OrderError(ValueError):
+    pass
+
+
+class Order:
+    __slots__ = ('order_id', 'owner', 'symbol', 'side', 'order_type', 'quantity', 'remaining',
+                 'limit_price', 'trigger_price', 'seq', 'status', 'filled_value', 'created')
+
+    def __init__(self, order_id, owner, symbol, side, order_type, quantity, limit_price, trigger_price):
+        self.order_id = order_id
+        self.owner = owner
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.remaining = quantity
+        self.limit_price = limit_price
+        self.trigger_price = trigger_price
+        self.seq = 0
+        self.status = OPEN
+        self.filled_value = 0.0
+        self.created = time.time()
+
+    @property
+    def filled(self):
+        return self.quantity - self.remaining
+
+    @property
+    def active(self):
+        return self.status in (OPEN, PARTIALLY_FILLED, PENDING_TRIGGER)
+
+    def to_dict(self):
+        filled = self.filled
+        return {
+            'order_id': self.order_id,
+            'symbol': self.symbol,
+            'side': self.side,
+            'order_type': self.order_type,
+            'quantity': self.quantity,
+            'filled': filled,
+            'remaining': self.remaining,
+            'limit_price': self.limit_price,
+            'trigger_price': self.trigger_price,
+            'avg_fill_price': round(self.filled_value / filled, 4) if filled else None,
+            'status': self.status
+        }
+
+
+class OrderBook:
+    """
+    Book for one symbol. Not thread safe on its own; MatchingEngine holds
+    the book's lock around every call.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = []         # (-limit_price, seq, order)
+        self.asks = []         # (limit_price, seq, order)
+        self.buy_stops = []    # (trigger_price, seq, order), trigger when price >= trigger
+        self.sell_stops = []   # (-trigger_price, seq, order), trigger when price <= trigger
+        self.last_price = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _top(heap):
+        # Drop entries left behind by cancels, amends and fills
+        while heap:
+            order = heap[0][2]
+            if order.active and order.seq == heap[0][1] and order.status != PENDING_TRIGGER:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    @staticmethod
+    def _top_stop(heap):
+        while heap:
+            order = heap[0][2]
+            if order.status == PENDING_TRIGGER and order.seq == heap[0][1]:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def best_bid(self):
+        order = self._top(self.bids)
+        return order.limit_price if order else None
+
+    def best_ask(self):
+        order = self._top(self.asks)
+        return order.limit_price if order else None
+
+    def rest(self, order):
+        if order.side == 'buy':
+            heapq.heappush(self.bids, (-order.limit_price, order.seq, order))
+        else:
+            heapq.heappush(self.asks, (order.limit_price, order.seq, order))
+
+    def park_stop(self, order):
+        order.status = PENDING_TRIGGER
+        if order.side == 'buy':
+            heapq.heappush(self.buy_stops, (order.trigger_price, order.seq, order))
+        else:
+            heapq.heappush(self.sell_stops, (-order.trigger_price, order.seq, order))
+
+    def triggered_stops(self, price):
+        triggered = []
+        while True:
+            order = self._top_stop(self.buy_stops)
+            if order is None or order.trigger_price > price:
+                break
+            heapq.heappop(self.buy_stops)
+            triggered.append(order)
+        while True:
+            order = self._top_stop(self.sell_stops)
+            if order is None or order.trigger_price < price:
+                break
+            heapq.heappop(self.sell_stops)
+            triggered.append(order)
+        return triggered
+
+    def depth(self, levels=5):
+        """
+        Aggregated (price, quantity) levels on each side, best first.
+        """
+        def aggregate(heap, sign):
+            totals = {}
+            for key, seq, order in heap:
+                if order.active and order.seq == seq and order.status != PENDING_TRIGGER:
+                    totals[sign * key] = totals.get(sign * key, 0) + order.remaining
+            return sorted(totals.items(), key=lambda item: sign * item[0])[:levels]
+        return {'bids': aggregate(self.bids, -1), 'asks': aggregate(self.asks, 1)}
+
+
+class MatchingEngine:
+    def __init__(self):
+        self.books = {}
+        self.orders = {}
+        self._books_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._seq = itertools.count(1)
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """
+        callback(fill) is called for every fill, outside the book lock.
+        """
+        self._listeners.append(callback)
+
+    def book(self, symbol):
+        symbol = symbol.upper()
+        book = self.books.get(symbol)
+        if book is None:
+            with self._books_lock:
+                book = self.books.setdefault(symbol, OrderBook(symbol))
+        return book
+
+    def _dispatch(self, fills):
+        for fill in fills:
+            for callback in self._listeners:
+                callback(fill)
+
+    def _fill(self, order, quantity, price, fills):
+        order.remaining -= quantity
+        order.filled_value += quantity * price
+        order.status = FILLED if order.remaining == 0 else PARTIALLY_FILLED
+        if order.status == FILLED:
+            self.orders.pop(order.order_id, None)
+        fills.append(Fill(order.order_id, order.owner, order.symbol, order.side, quantity, price, time.time()))
+
+    def _match(self, book, order, fills):
+        """
+        Fill order against the opposite side of the book at the resting
+        orders' prices, best price first. Resting orders priced worse than
+        the market's last price are skipped, the market fills those, and
+        so are resting orders of the same owner.
+        """
+        opposite = book.asks if order.side == 'buy' else book.bids
+        bound = order.limit_price
+        if book.last_price is not None:
+            if order.side == 'buy':
+                bound = book.last_price if bound is None else min(bound, book.last_price)
+            else:
+                bound = book.last_price if bound is None else max(bound, book.last_price)
+        own = []
+        while order.remaining:
+            resting = book._top(opposite)
+            if resting is None:
+                break
+            if bound is not None:
+                if order.side == 'buy' and resting.limit_price > bound:
+                    break
+                if order.side == 'sell' and resting.limit_price < bound:
+                    break
+            if resting.owner == order.owner:
+                # Self-trade: set the entry aside, it goes back below
+                own.append(heapq.heappop(opposite))
+                continue
+            quantity = min(order.remaining, resting.remaining)
+            self._fill(resting, quantity, resting.limit_price, fills)
+            self._fill(order, quantity, resting.limit_price, fills)
+        for entry in own:
+            heapq.heappush(opposite, entry)
+
+    def _marketable(self, order, price):
+        if order.limit_price is None:
+            return True
+        return price <= order.limit_price if order.side == 'buy' else price >= order.limit_price
+
+    def _execute(self, book, order, fills):
+        """
+        Work a live market or limit order: book first, then the market at
+        the last price, and rest whatever a limit order has left.
+        """
+        if order.status == PENDING_TRIGGER:
+            order.status = OPEN
+        self._match(book, order, fills)
+        if order.remaining and book.last_price is not None and self._marketable(order, book.last_price):
+            self._fill(order, order.remaining, book.last_price, fills)
+        if order.remaining:
+            if order.limit_price is None:
+                # Market order with nothing left to fill against: the
+                # unfilled part is cancelled
+                order.status = CANCELLED
+                self.orders.pop(order.order_id, None)
+            else:
+                book.rest(order)
+
+    def submit(self, owner, symbol, side, quantity, order_type='market', limit_price=None,
+               trigger_price=None, reference_price=None):
+        """
+        Place an order and run it against the book. reference_price, when
+        given, is applied as the latest market price first; it must be the
+        server's own quote for symbol, it fills other resting orders too. Returns the
+        order and the fills it caused (for every owner involved).
+        """
+        side = side.lower()
+        order_type = order_type.lower()
+        if side not in SIDES:
+            raise OrderError(f'Unknown side {side}')
+        if order_type not in ORDER_TYPES:
+            raise OrderError(f'Unknown order type {order_type}')
+        if quantity <= 0:
+            raise OrderError('Quantity must be positive')
+        if order_type in ('limit', 'sl') and (limit_price is None or limit_price <= 0):
+            raise OrderError(f'{order_type} orders need a positive limit price')
+        if order_type in ('sl', 'sl-m') and (trigger_price is None or trigger_price <= 0):
+            raise OrderError(f'{order_type} orders need a positive trigger price')
+
+        order = Order(next(self._ids), owner, symbol.upper(), side, order_type, quantity,
+                      limit_price if order_type in ('limit', 'sl') else None,
+                      trigger_price if order_type in ('sl', 'sl-m') else None)
+        book = self.book(symbol)
+        fills = []
+        with book.lock:
+            if reference_price is not None:
+                self._on_price(book, reference_price, None, fills)
+            order.seq = next(self._seq)
+            self.orders[order.order_id] = order
+            if order_type in ('sl', 'sl-m'):
+                last = book.last_price
+                already = last is not None and (last >= trigger_price if side == 'buy' else last <= trigger_price)
+                if already:
+                    self._execute(book, order, fills)
+                else:
+                    book.park_stop(order)
+            else:
+                self._execute(book, order, fills)
+        self._dispatch(fills)
+        return order, fills
+
+    def _on_price(self, book, price, volume, fills):
+        book.last_price = price
+        for order in book.triggered_stops(price):
+            order.seq = next(self._seq)
+            self._execute(book, order, fills)
+        available = volume
+        for heap, crosses in ((book.bids, lambda p: p >= price), (book.asks, lambda p: p <= price)):
+            side_volume = available
+            while side_volume is None or side_volume > 0:
+                resting = book._top(heap)
+                if resting is None or not crosses(resting.limit_price):
+                    break
+                quantity = resting.remaining if side_volume is None else min(resting.remaining, side_volume)
+                self._fill(resting, quantity, price, fills)
+                if side_volume is not None:
+                    side_volume -= quantity
+
+    def on_price(self, symbol, price, volume=None):
+        """
+        Apply a market trade at price: trigger stops and fill resting
+        orders the price has reached, at most `volume` shares per side.
+        """
+        book = self.book(symbol)
+        fills = []
+        with book.lock:
+            self._on_price(book, price, volume, fills)
+        self._dispatch(fills)
+        return fills
+
+    def cancel(self, order_id, owner=None):
+        order = self.orders.get(order_id)
+        if order is None or (owner is not None and order.owner != owner):
+            raise OrderError(f'No open order {order_id}')
+        with self.book(order.symbol).lock:
+            if not order.active:
+                raise OrderError(f'Order {order_id} is already {order.status}')
+            order.status = CANCELLED
+            self.orders.pop(order_id, None)
+        return order
+
+    def amend(self, order_id, owner=None, quantity=None, limit_price=None, trigger_price=None):
+        """
+        Change an open order. Reducing quantity keeps its queue position;
+        a larger quantity or a new price sends it to the back of its level.
+        """
+        order = self.orders.get(order_id)
+        if order is None or (owner is not None and order.owner != owner):
+            raise OrderError(f'No open order {order_id}')
+        book = self.book(order.symbol)
+        fills = []
+        with book.lock:
+            if not order.active:
+                raise OrderError(f'Order {order_id} is already {order.status}')
+            if quantity is not None and quantity <= order.filled:
+                raise OrderError(f'Quantity must be above the {order.filled} already filled')
+            if limit_price is not None and order.order_type not in ('limit', 'sl'):
+                raise OrderError(f'{order.order_type} orders have no limit price')
+            if trigger_price is not None and order.status != PENDING_TRIGGER:
+                raise OrderError('Only untriggered stop orders have a trigger price')
+
+            requeue = ((quantity is not None and quantity > order.quantity)
+                       or (limit_price is not None and limit_price != order.limit_price)
+                       or (trigger_price is not None and trigger_price != order.trigger_price))
+            if quantity is not None:
+                order.remaining = quantity - order.filled
+                order.quantity = quantity
+            if limit_price is not None:
+                order.limit_price = limit_price
+            if trigger_price is not None:
+                order.trigger_price = trigger_price
+            if requeue:
+                # The old heap entry goes stale because its seq no longer matches
+                order.seq = next(self._seq)
+                if order.status == PENDING_TRIGGER:
+                    book.park_stop(order)
+                else:
+                    self._execute(book, order, fills)
+        self._dispatch(fills)
+        return order, fills
+
+    def open_orders(self, owner=None, symbol=None):
+        symbol = symbol.upper() if symbol else None
+        return [order for order in list(self.orders.values())
+                if (owner is None or order.owner == owner) and (symbol is None or order.symbol == symbol)]
+
+
+engine = MatchingEngine()
@@ -0,0 +1,272 @@
+"""
+Incremental portfolio valuation.
+
+PriceFeed polls the latest price of every subscribed symbol in one batched
+download and publishes each change to that symbol's subscribers.
+PortfolioValuation subscribes one account's holdings and, per tick or
+trade, updates only the affected row, the book's running totals and a
+best-performer heap. The /portfolio page reads a cached snapshot that is
+rebuilt at most once per change, so a page view makes no network calls.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+
+from market_data import get_recent_history_batch
+
+FEED_INTERVAL = float(os.environ.get('PRICE_FEED_INTERVAL', '15'))
+
+
+class PriceFeed:
+    def __init__(self, interval=FEED_INTERVAL, fetch=get_recent_history_batch):
+        self.interval = interval
+        self._fetch = fetch
+        self._subscribers = {}
+        self._prices = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.polls = 0
+        self.ticks = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='price-feed', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def subscribe(self, symbol, callback):
+        """
+        callback(symbol, price, timestamp) runs on every price change.
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            self._subscribers.setdefault(symbol, []).append(callback)
+        self.start()
+
+    def unsubscribe(self, symbol, callback):
+        symbol = symbol.upper()
+        with self._lock:
+            callbacks = self._subscribers.get(symbol, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(symbol, None)
+
+    def symbols(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def latest(self, symbol):
+        """
+        (price, timestamp) of the last tick for symbol, or None.
+        """
+        return self._prices.get(symbol.upper())
+
+    def publish(self, symbol, price, timestamp=None):
+        symbol = symbol.upper()
+        timestamp = timestamp or time.time()
+        previous = self._prices.get(symbol)
+        self._prices[symbol] = (price, timestamp)
+        if previous is not None and previous[0] == price:
+            return
+        self.ticks += 1
+        with self._lock:
+            callbacks = list(self._subscribers.get(symbol, ()))
+        for callback in callbacks:
+            try:
+                callback(symbol, price, timestamp)
+            except Exception as e:
+                print(f"Price feed subscriber failed for {symbol}: {e}")
+
+    def refresh(self, symbols=None):
+        """
+        Fetch and publish the latest prices now, for symbols or for
+        everything subscribed.
+        """
+        symbols = self.symbols() if symbols is None else [symbol.upper() for symbol in symbols]
+        if not symbols:
+            return
+        histories = self._fetch(symbols)
+        self.polls += 1
+        for symbol in symbols:
+            hist = histories.get(symbol)
+            if hist is not None and not hist.empty:
+                self.publish(symbol, float(hist['Close'].iloc[-1]), hist.index[-1].timestamp())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Price feed poll failed: {e}")
+
+    def stats(self):
+        return {'subscribed_symbols': len(self._subscribers), 'polls': self.polls, 'ticks': self.ticks}
+
+
+class PortfolioValuation:
+    """
+    Live valuation of one PositionBook. `rate(symbol)` converts the
+    instrument's price into the display currency.
+    """
+
+    def __init__(self, book, feed, rate=lambda symbol: 1.0):
+        self.book = book
+        self.feed = feed
+        self.rate = rate
+        self._rows = {}
+        self._row_totals = {}            # symbol -> (invested, current_value)
+        self.total_invested = 0.0
+        self.total_current_value = 0.0
+        self._best = []                  # (-return_rate, seq, symbol)
+        self._best_seq = {}
+        self._seq = itertools.count()
+        self._version = 0
+        self._snapshot = None
+        self._snapshot_version = -1
+        self.last_updated = datetime.now()
+        # Share the book's lock: trades notify us while holding it, and
+        # ticks mark the book, so one lock keeps both in a single order
+        self._lock = book._lock
+        with self._lock:
+            for position in book:
+                self._track(position.symbol, position)
+            book.add_listener(self._on_trade)
+
+    def _track(self, symbol, position):
+        latest = self.feed.latest(symbol)
+        if latest is not None:
+            self.book.mark(symbol, latest[0])
+        if symbol not in self._rows:
+            self.feed.subscribe(symbol, self._on_tick)
+        self._update_row(symbol, position)
+
+    def _update_row(self, symbol, position):
+        rate = self.rate(symbol)
+        invested = position.invested * rate
+        current_value = position.market_value * rate
+        last_price = position.avg_price if position.last_price is None else position.last_price
+        return_rate = ((current_value - invested) / invested * 100) if invested > 0 else 0
+        self._set_totals(symbol, (invested, current_value))
+        self._rows[symbol] = {
+            'symbol': symbol,
+            'quantity': position.quantity,
+            'avg_price': position.avg_price * rate,
+            'current_price': last_price * rate,
+            'return_rate': return_rate,
+            'current_value': current_value,
+            'profit_loss': current_value - invested
+        }
+        seq = next(self._seq)
+        self._best_seq[symbol] = seq
+        heapq.heappush(self._best, (-return_rate, seq, symbol))
+        if len(self._best) > 4 * len(self._rows) + 64:
+            # Rebuild without the stale entries
+            self._best = [entry for entry in self._best if self._best_seq.get(entry[2]) == entry[1]]
+            heapq.heapify(self._best)
+        self._version += 1
+        self.last_updated = datetime.now()
+
+    def _set_totals(self, symbol, totals):
+        old_invested, old_value = self._row_totals.pop(symbol, (0.0, 0.0))
+        self.total_invested -= old_invested
+        self.total_current_value -= old_value
+        if totals is not None:
+            self._row_totals[symbol] = totals
+            self.total_invested += totals[0]
+            self.total_current_value += totals[1]
+        elif not self._row_totals:
+            self.total_invested = 0.0
+            self.total_current_value = 0.0
+
+    def _on_tick(self, symbol, price, timestamp):
+        with self._lock:
+            position = self.book.mark(symbol, price)
+            if position is not None:
+                self._update_row(symbol, position)
+
+    def _on_trade(self, symbol, position):
+        with self._lock:
+            if position is not None:
+                self._track(symbol, position)
+            elif symbol in self._rows:
+                del self._rows[symbol]
+                self._set_totals(symbol, None)
+                self._best_seq.pop(symbol, None)
+                self.feed.unsubscribe(symbol, self._on_tick)
+                self._version += 1
+
+    def close(self):
+        with self._lock:
+            for symbol in list(self._rows):
+                self.feed.unsubscribe(symbol, self._on_tick)
+            self._rows.clear()
+
+    def _best_performer(self):
+        while self._best:
+            negative_rate, seq, symbol = self._best[0]
+            if self._best_seq.get(symbol) == seq:
+                return symbol, -negative_rate
+            heapq.heappop(self._best)
+        return None, 0
+
+    def snapshot(self):
+        """
+        Portfolio metrics in the shape portfolio.html renders.
+        """
+        with self._lock:
+            if self._snapshot_version == self._version:
+                return self._snapshot
+            total_invested = self.total_invested
+            total_current_value = self.total_current_value
+            best_performer, best_performance = self._best_performer()
+            self._snapshot = {
+                'total_current_value': total_current_value,
+                'total_profit_loss': total_current_value - total_invested,
+                'overall_return_rate': ((total_current_value - total_invested) / total_invested * 100) if total_invested > 0 else 0,
+                'total_invested': total_invested,
+                'best_performer': best_performer or 'N/A',
+                'best_performance': best_performance,
+                'last_updated': self.last_updated,
+                'portfolio_details': list(self._rows.values())
+            }
+            self._snapshot_version = self._version
+            return self._snapshot
+
+
+class ValuationRegistry:
+    def __init__(self, feed, rate=lambda symbol: 1.0):
+        self.feed = feed
+        self.rate = rate
+        self._valuations = {}
+        self._lock = threading.Lock()
+
+    def get(self, username, book):
+        with self._lock:
+            valuation = self._valuations.get(username)
+            if valuation is not None and valuation.book is book:
+                return valuation
+        missing = [symbol for symbol in book.symbols() if self.feed.latest(symbol) is None]
+        if missing:
+            # Price a newly opened portfolio once, later ticks come from the poller
+            try:
+                self.feed.refresh(missing)
+            except Exception as e:
+                print(f"Error fetching portfolio prices: {e}")
+        with self._lock:
+            valuation = self._valuations.get(username)
+            if valuation is None or valuation.book is not book:
+                if valuation is not None:
+                    valuation.close()
+                valuation = self._valuations[username] = PortfolioValuation(book, self.feed, self.rate)
+            return valuation
+
+
+price_feed = PriceFeed()
@@ -0,0 +1,145 @@
+"""
+Per-account positions.
+
+A PositionBook holds one account's positions in a dict keyed by symbol,
+so finding, updating and closing a position is O(1) no matter how many
+instruments the account holds. Total invested and market value are kept
+as running totals, adjusted by the delta of every trade and price mark
+instead of being re-summed over all positions.
+
+Prices are stored in the instrument's own currency, as traded.
+"""
+import threading
+
+
+class Position:
+    __slots__ = ('symbol', 'quantity', 'avg_price', 'last_price')
+
+    def __init__(self, symbol, quantity, avg_price, last_price=None):
+        self.symbol = symbol
+        self.quantity = quantity
+        self.avg_price = avg_price
+        self.last_price = last_price
+
+    @property
+    def invested(self):
+        return self.quantity * self.avg_price
+
+    @property
+    def market_value(self):
+        # Valued at cost until a market price has been seen
+        price = self.avg_price if self.last_price is None else self.last_price
+        return self.quantity * price
+
+    def to_dict(self):
+        return {'symbol': self.symbol, 'quantity': self.quantity, 'avg_price': self.avg_price}
+
+
+class PositionBook:
+    def __init__(self, positions=()):
+        self._positions = {}
+        self.total_invested = 0.0
+        self.market_value = 0.0
+        self._lock = threading.RLock()
+        self._listeners = []
+        for item in positions:
+            self.buy(item['symbol'], item['quantity'], item['avg_price'])
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, symbol):
+        return symbol.upper() in self._positions
+
+    def __iter__(self):
+        # Iterate over a copy so trades can land while a page is rendering
+        with self._lock:
+            return iter(list(self._positions.values()))
+
+    def add_listener(self, callback):
+        """
+        callback(symbol, position) runs after every buy or sell, with
+        position None once it has been closed.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, symbol, position):
+        for callback in self._listeners:
+            callback(symbol, position)
+
+    def get(self, symbol):
+        return self._positions.get(symbol.upper())
+
+    def quantity(self, symbol):
+        position = self._positions.get(symbol.upper())
+        return position.quantity if position else 0
+
+    def symbols(self):
+        with self._lock:
+            return list(self._positions)
+
+    def buy(self, symbol, quantity, price):
+        """
+        Add quantity at price, averaging into an existing position.
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            position = self._positions.get(symbol)
+            if position is None:
+                position = self._positions[symbol] = Position(symbol, 0, 0.0)
+            old_invested = position.invested
+            old_value = position.market_value
+            total_cost = old_invested + quantity * price
+            position.quantity += quantity
+            position.avg_price = total_cost / position.quantity
+            self.total_invested += position.invested - old_invested
+            self.market_value += position.market_value - old_value
+            self._notify(symbol, position)
+            return position
+
+    def sell(self, symbol, quantity):
+        """
+        Remove quantity from a position, closing it when nothing is left.
+        Raises ValueError when the position is smaller than quantity.
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            position = self._positions.get(symbol)
+            if quantity <= 0:
+                return position
+            held = position.quantity if position else 0
+            if held < quantity:
+                raise ValueError(f'Insufficient shares. You have {held} shares of {symbol}')
+            old_invested = position.invested
+            old_value = position.market_value
+            position.quantity -= quantity
+            if position.quantity == 0:
+                del self._positions[symbol]
+                self.total_invested -= old_invested
+                self.market_value -= old_value
+                if not self._positions:
+                    # Clear accumulated rounding once the book is empty
+                    self.total_invested = 0.0
+                    self.market_value = 0.0
+            else:
+                self.total_invested += position.invested - old_invested
+                self.market_value += position.market_value - old_value
+            self._notify(symbol, position if position.quantity else None)
+            return position
+
+    def mark(self, symbol, price):
+        """
+        Record the latest market price for a held symbol.
+        """
+        with self._lock:
+            position = self._positions.get(symbol.upper())
+            if position is None:
+                return None
+            old_value = position.market_value
+            position.last_price = price
+            self.market_value += position.market_value - old_value
+            return position
+
+    def to_list(self):
+        with self._lock:
+            return [position.to_dict() for position in self._positions.values()]
@@ -0,0 +1,344 @@
+"""
+Opt-in sampling profiler for requests.
+
+With PROFILING=1, a fraction PROFILE_SAMPLE_RATE of requests, and every
+request sent with an `X-Profile: <PROFILE_TOKEN>` header, is profiled
+(the header is ignored while PROFILE_TOKEN is unset, and at most
+PROFILE_MAX_PER_MINUTE profiles are started a minute whatever asks for
+them, so clients cannot make the server spend its time profiling): a sampler
+thread reads the stack of the thread handling the request every
+PROFILE_INTERVAL_MS through sys._current_frames(), so the view runs at
+full speed apart from the sampling itself. When the request finishes its
+stacks are written under PROFILE_DIR/<release>/<endpoint>/ as
+
+    *.collapsed         folded stacks, one 'frame;frame;... count' line
+                        per stack, for flamegraph.pl / inferno
+    *.speedscope.json   sampled profile for https://www.speedscope.app
+
+and the response carries the file name in X-Profile-Id. Frames are named
+`function (package/module.py:line)`, so time in yfinance, pandas rolling
+windows or Jinja shows up under their own packages. Work a view hands to
+a thread pool (the /predict_next_week fan-out) runs on other threads;
+PROFILE_THREADS=all samples every thread instead, one root per thread
+name. That means every thread of the process: requests served at the
+same time (and the background refreshers) are folded into the profile
+too, so use it on a quiet server.
+
+Profiles of the same endpoint merge into one flamegraph with
+
+    python profiling.py merge data/profiles/v1.4/predict_next_week > v1.4.collapsed
+"""
+import argparse
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+PROFILING = os.environ.get('PROFILING', '') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '2'))
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'profiles')
+)
+PROFILE_RELEASE = os.environ.get('PROFILE_RELEASE', 'dev')
+PROFILE_FORMATS = tuple(os.environ.get('PROFILE_FORMATS', 'collapsed,speedscope').split(','))
+PROFILE_THREADS = os.environ.get('PROFILE_THREADS', 'request')
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_MAX_PER_MINUTE = int(os.environ.get('PROFILE_MAX_PER_MINUTE', '30'))
+
+# Longest sys.path entries first, to name files by package
+_PATH_PREFIXES = sorted((os.path.abspath(path) + os.sep for path in sys.path if path), key=len, reverse=True)
+
+
+def _short_path(filename):
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return os.path.basename(filename)
+
+
+class Profile:
+    """
+    Stacks sampled from one request: a count and the wall time they
+    stood for (the gap since the previous sample, which is longer than
+    the interval whenever the sampler waited for the GIL).
+    """
+
+    def __init__(self, profile_id, endpoint, thread_id):
+        self.profile_id = profile_id
+        self.endpoint = endpoint
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.duration = None
+        self.frames = {}   # (name, file, line) -> index
+        self.stacks = {}   # tuple of frame indexes, root first -> [count, seconds]
+        self.samples = 0
+
+    def _frame_index(self, key):
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def add(self, frame, weight, thread_name=None):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(self._frame_index((code.co_name, _short_path(code.co_filename), code.co_firstlineno)))
+            frame = frame.f_back
+        if thread_name is not None:
+            stack.append(self._frame_index((f"thread {thread_name}", '', 0)))
+        stack = tuple(reversed(stack))
+        entry = self.stacks.get(stack)
+        if entry is None:
+            self.stacks[stack] = [1, weight]
+        else:
+            entry[0] += 1
+            entry[1] += weight
+        self.samples += 1
+
+    def _labels(self):
+        labels = [None] * len(self.frames)
+        for (name, filename, line), index in self.frames.items():
+            labels[index] = f"{name} ({filename}:{line})" if filename else name
+        return labels
+
+    def collapsed(self):
+        labels = self._labels()
+        lines = [f"{';'.join(labels[i].replace(';', ':') for i in stack)} {samples}"
+                 for stack, (samples, _) in sorted(self.stacks.items())]
+        return '\n'.join(lines) + '\n'
+
+    def speedscope(self, release):
+        frames = [None] * len(self.frames)
+        for (name, filename, line), index in self.frames.items():
+            frames[index] = {'name': name, 'file': filename, 'line': line} if filename else {'name': name}
+        samples = list(self.stacks.items())
+        total = sum(seconds for _, (_, seconds) in samples) * 1000
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f"{self.endpoint} {self.profile_id}",
+            'exporter': f"profiling.py ({release})",
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': f"{self.endpoint} ({self.duration * 1000:.1f} ms, {self.samples} samples)",
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': total,
+                'samples': [list(stack) for stack, _ in samples],
+                'weights': [round(seconds * 1000, 3) for _, (_, seconds) in samples]
+            }]
+        }
+
+
+class Profiler:
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000.0, directory=PROFILE_DIR, release=PROFILE_RELEASE,
+                 formats=PROFILE_FORMATS, all_threads=PROFILE_THREADS == 'all',
+                 max_per_minute=PROFILE_MAX_PER_MINUTE):
+        self.interval = interval
+        self.directory = directory
+        self.release = release
+        self.formats = formats
+        self.all_threads = all_threads
+        self.max_per_minute = max_per_minute
+        self._recent = deque()  # start times of the profiles of the last minute
+        self._active = {}  # profile id -> Profile
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._ids = count(1)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-writer')
+        self.profiles = 0
+        self.throttled = 0
+        self.written = 0
+        self.write_failures = 0
+
+    def _start_sampler(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._wakeup.wait()
+                    last = time.perf_counter()
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()} if self.all_threads else None
+            # Under the lock so stop() never hands a profile to the writer mid-sample
+            with self._lock:
+                for profile in self._active.values():
+                    if names is not None:
+                        for thread_id, frame in frames.items():
+                            if thread_id != own_id:
+                                profile.add(frame, weight, thread_name=names.get(thread_id, thread_id))
+                    else:
+                        frame = frames.get(profile.thread_id)
+                        if frame is not None:
+                            profile.add(frame, weight)
+            del frames
+
+    def start(self, endpoint):
+        """
+        Start profiling the calling thread, or return None when
+        max_per_minute profiles were already started in the last minute.
+        """
+        now = time.monotonic()
+        profile = Profile(f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._ids)}",
+                          endpoint, threading.get_ident())
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.max_per_minute:
+                self.throttled += 1
+                return None
+            self._recent.append(now)
+            self._start_sampler()
+            self._active[profile.profile_id] = profile
+            self._wakeup.notify()
+        self.profiles += 1
+        return profile
+
+    def stop(self, profile):
+        """
+        Stop sampling profile and write it out in the background.
+        """
+        with self._lock:
+            self._active.pop(profile.profile_id, None)
+        profile.duration = time.perf_counter() - profile.started
+        self._writer.submit(self._write, profile)
+
+    def _write(self, profile):
+        directory = os.path.join(self.directory, self.release, profile.endpoint)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            base = os.path.join(directory, f"{profile.profile_id}-{profile.duration * 1000:.0f}ms")
+            if 'collapsed' in self.formats:
+                with open(f"{base}.collapsed", 'w') as f:
+                    f.write(profile.collapsed())
+            if 'speedscope' in self.formats:
+                with open(f"{base}.speedscope.json", 'w') as f:
+                    json.dump(profile.speedscope(self.release), f)
+            self.written += 1
+        except OSError as e:
+            self.write_failures += 1
+            logger.warning("Could not write profile %s to %s: %s", profile.profile_id, directory, e)
+
+    def stats(self):
+        with self._lock:
+            active = len(self._active)
+        return {
+            'enabled': PROFILING,
+            'sample_rate': PROFILE_SAMPLE_RATE,
+            'active': active,
+            'profiles': self.profiles,
+            'throttled': self.throttled,
+            'written': self.written,
+            'write_failures': self.write_failures
+        }
+
+
+profiler = Profiler()
+
+
+def _wants_profile():
+    header = request.headers.get(PROFILE_HEADER)
+    if PROFILE_TOKEN and header and hmac.compare_digest(header.encode(), PROFILE_TOKEN.encode()):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _start_request():
+    if _wants_profile():
+        profile = profiler.start(request.endpoint or 'unmatched')
+        if profile is not None:
+            g.profile = profile
+
+
+def _finish_request(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.stop(profile)
+        response.headers['X-Profile-Id'] = profile.profile_id
+    return response
+
+
+def _teardown_request(exc):
+    # Still running when the view raised before a response was made
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.stop(profile)
+
+
+def init_app(app):
+    """
+    Hook the profiler into app's requests when PROFILING=1.
+    """
+    if not PROFILING:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+
+
+def merge_collapsed(paths):
+    """
+    Sum the folded stacks of many .collapsed files.
+    """
+    totals = {}
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, _, samples = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    totals[stack] = totals.get(stack, 0) + int(samples)
+    return totals
+
+
+def _collapsed_files(targets):
+    for target in targets:
+        if os.path.isdir(target):
+            for root, _, files in os.walk(target):
+                for name in sorted(files):
+                    if name.endswith('.collapsed'):
+                        yield os.path.join(root, name)
+        else:
+            yield target
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Request profile tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    merge = commands.add_parser('merge', help='merge .collapsed profiles into one folded-stack file')
+    merge.add_argument('paths', nargs='+', help='.collapsed files or directories holding them')
+    merge.add_argument('-o', '--output', help='write here instead of stdout')
+    args = parser.parse_args()
+
+    totals = merge_collapsed(list(_collapsed_files(args.paths)))
+    lines = ''.join(f"{stack} {samples}\n" for stack, samples in sorted(totals.items()))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(lines)
+    else:
+        sys.stdout.write(lines)
@@ -0,0 +1,278 @@
+"""
+Market data providers.
+
+market_data talks to a MarketDataProvider instead of yfinance directly.
+YFinanceProvider is the live implementation; ReplayProvider serves
+recorded or synthetic OHLCV from local files with a configurable delay,
+so every route can be exercised and benchmarked without network access.
+
+The active provider is picked from MARKET_DATA_PROVIDER ('yfinance' or
+'replay') and can be swapped at runtime with set_provider(). What the app
+derives from provider data on disk (the OHLCV store, symbol metadata)
+defaults to a separate directory per provider, see local_data_dir().
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+PROVIDER_NAME = os.environ.get('MARKET_DATA_PROVIDER', 'yfinance').lower()
+REPLAY_SEED = int(os.environ.get('REPLAY_SEED', '0'))
+
+
+class MarketDataProvider:
+    name = 'base'
+
+    def history(self, symbol, period=None, interval='1d', start=None):
+        """
+        OHLCV DataFrame indexed by bar time, either for a yfinance-style
+        period ('5d', '1y', 'max', ...) or for every bar since start.
+        """
+        raise NotImplementedError
+
+    def download(self, symbols, period, interval):
+        """
+        {symbol: history} for many symbols in one round trip. Symbols
+        without data may be missing from the result.
+        """
+        raise NotImplementedError
+
+    def info(self, symbol):
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = 'yfinance'
+
+    def history(self, symbol, period=None, interval='1d', start=None):
+        import yfinance as yf
+        if start is not None:
+            return yf.Ticker(symbol).history(start=start, interval=interval)
+        return yf.Ticker(symbol).history(period=period, interval=interval)
+
+    def download(self, symbols, period, interval):
+        import yfinance as yf
+        data = yf.download(symbols, period=period, interval=interval, group_by='ticker',
+                           auto_adjust=True, ignore_tz=False, threads=True, progress=False)
+        frames = {}
+        if isinstance(data.columns, pd.MultiIndex):
+            tickers = set(data.columns.get_level_values(0))
+            for symbol in symbols:
+                if symbol in tickers:
+                    # Rows come from the union of all calendars, drop the
+                    # ones where this symbol did not trade
+                    frames[symbol] = data[symbol].dropna(how='all')
+        elif len(symbols) == 1:
+            frames[symbols[0]] = data.dropna(how='all')
+        return frames
+
+    def info(self, symbol):
+        import yfinance as yf
+        return yf.Ticker(symbol).info
+
+
+# Approximate bars per trading day and trading days per period, used to
+# size synthetic series
+BARS_PER_DAY = {
+    '1m': 390, '2m': 195, '5m': 78, '15m': 26, '30m': 13, '60m': 7, '90m': 5, '1h': 7,
+    '1d': 1, '5d': 1 / 5, '1wk': 1 / 5, '1mo': 1 / 21, '3mo': 1 / 63
+}
+TRADING_DAYS = {
+    '1d': 1, '5d': 5, '1mo': 21, '3mo': 63, '6mo': 126, '1y': 252, '2y': 504,
+    '5y': 1260, '10y': 2520, 'ytd': 200, 'max': 5040
+}
+PANDAS_FREQ = {
+    '1m': 'min', '2m': '2min', '5m': '5min', '15m': '15min', '30m': '30min', '60m': 'h',
+    '90m': '90min', '1h': 'h', '1d': 'B', '5d': '5B', '1wk': 'W-MON', '1mo': 'MS', '3mo': 'QS'
+}
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves <data_dir>/<interval>/<SYMBOL>.csv (as written by
+    record_history) and <data_dir>/info/<SYMBOL>.json when present, and a
+    deterministic synthetic random walk otherwise. The same symbol and
+    interval always produce the same bars, and a longer period only adds
+    bars at the start. Every call sleeps `latency` seconds to stand in for
+    the network round trip.
+    """
+    name = 'replay'
+
+    def __init__(self, data_dir=None, latency=0.0, seed=0, end=None, tz='America/New_York'):
+        self.data_dir = data_dir
+        self.latency = latency
+        self.seed = seed
+        self.tz = tz
+        self.end = pd.Timestamp(end or '2025-11-14 16:00').tz_localize(tz)
+        self._recorded = {}
+        self._lock = threading.Lock()
+
+    def _sleep(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _path(self, kind, symbol, extension):
+        safe_symbol = re.sub(r'[^A-Za-z0-9._-]', '_', symbol.upper())
+        return os.path.join(self.data_dir, kind, safe_symbol + extension)
+
+    def _load_recorded(self, symbol, interval):
+        if not self.data_dir:
+            return None
+        key = (symbol.upper(), interval)
+        with self._lock:
+            if key in self._recorded:
+                return self._recorded[key]
+        path = self._path(interval, symbol, '.csv')
+        frame = None
+        if os.path.exists(path):
+            frame = pd.read_csv(path, index_col=0)
+            frame.index = pd.to_datetime(frame.index, utc=True).tz_convert(self.tz)
+            frame = frame[[column for column in OHLCV_COLUMNS if column in frame.columns]]
+        with self._lock:
+            self._recorded[key] = frame
+        return frame
+
+    def _synthetic(self, symbol, interval, bars):
+        rng_seed = zlib.crc32(f'{symbol.upper()}|{interval}'.encode()) ^ self.seed
+        rng = np.random.default_rng(rng_seed)
+        last_price = 20.0 + (rng_seed % 48000) / 100.0
+        bar_fraction = 1.0 / BARS_PER_DAY.get(interval, 1)
+        sigma = 0.015 * np.sqrt(bar_fraction)
+        # Row k of the draws belongs to the k-th bar counted back from the
+        # end, so every length shares the same tail
+        draws = rng.normal(0.0, 1.0, (bars, 3))[::-1]
+        volume = np.random.default_rng(rng_seed + 1).integers(100000, 5000000, bars)[::-1]
+        steps = 0.0003 * bar_fraction + sigma * draws[:, 0]
+        log_close = np.log(last_price) - np.concatenate((np.cumsum(steps[:0:-1])[::-1], [0.0]))
+        close = np.exp(log_close)
+        open_ = close * np.exp(sigma / 2 * draws[:, 1])
+        spread = np.abs(sigma * draws[:, 2]) * close
+        index = pd.date_range(end=self.end, periods=bars, freq=PANDAS_FREQ.get(interval, 'B'))
+        return pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) + spread,
+            'Low': np.minimum(open_, close) - spread,
+            'Close': close,
+            'Volume': volume.astype(np.int64)
+        }, index=index)
+
+    def _bars_for(self, period, interval):
+        bars = TRADING_DAYS.get(period, 252) * BARS_PER_DAY.get(interval, 1)
+        return min(max(1, int(round(bars))), 50000)
+
+    def _history(self, symbol, period, interval, start):
+        recorded = self._load_recorded(symbol, interval)
+        if recorded is not None:
+            frame = recorded
+            if start is None and period != 'max' and not frame.empty:
+                days = {'1d': 1, '5d': 7, '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366,
+                        '2y': 731, '5y': 1827, '10y': 3653}.get(period)
+                if days:
+                    frame = frame[frame.index > frame.index[-1] - pd.Timedelta(days=days)]
+        else:
+            bars = self._bars_for('max' if start is not None else period, interval)
+            frame = self._synthetic(symbol, interval, bars)
+        if start is not None:
+            start = pd.Timestamp(start)
+            if start.tzinfo is None:
+                start = start.tz_localize(frame.index.tz)
+            frame = frame[frame.index >= start]
+        return frame.copy()
+
+    def history(self, symbol, period=None, interval='1d', start=None):
+        self._sleep()
+        return self._history(symbol, period or '1mo', interval, start)
+
+    def download(self, symbols, period, interval):
+        # One round trip for the whole batch
+        self._sleep()
+        return {symbol: self._history(symbol, period, interval, None) for symbol in symbols}
+
+    def info(self, symbol):
+        self._sleep()
+        if self.data_dir:
+            path = self._path('info', symbol, '.json')
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+        symbol = symbol.upper()
+        indian = symbol.endswith('.NS') or symbol.endswith('.BO')
+        return {
+            'symbol': symbol,
+            'shortName': symbol,
+            'longName': f'{symbol} (replay)',
+            'currency': 'INR' if indian else 'USD',
+            'exchange': ('NSI' if symbol.endswith('.NS') else 'BSE') if indian else 'NMS',
+            'sector': 'Unknown'
+        }
+
+
+def record_history(symbols, period, interval, data_dir, provider=None):
+    """
+    Save live history (and info) for symbols under data_dir in the layout
+    ReplayProvider reads.
+    """
+    provider = provider or YFinanceProvider()
+    os.makedirs(os.path.join(data_dir, interval), exist_ok=True)
+    os.makedirs(os.path.join(data_dir, 'info'), exist_ok=True)
+    replay = ReplayProvider(data_dir)
+    for symbol in symbols:
+        frame = provider.history(symbol, period=period, interval=interval)
+        frame[[column for column in OHLCV_COLUMNS if column in frame.columns]].to_csv(
+            replay._path(interval, symbol, '.csv'))
+        try:
+            with open(replay._path('info', symbol, '.json'), 'w') as f:
+                json.dump(provider.info(symbol), f, default=str)
+        except Exception as e:
+            print(f"Could not record info for {symbol}: {e}")
+        print(f"Recorded {len(frame)} {interval} bars for {symbol}")
+
+
+def local_data_dir():
+    """
+    Default home of the files the app builds from provider data. Replay
+    runs get their own directory per seed, so synthetic bars and names
+    never end up next to (or get served as) live ones.
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    if PROVIDER_NAME == 'replay':
+        return os.path.join(data_dir, 'replay-cache', f"seed-{REPLAY_SEED}")
+    return data_dir
+
+
+def _provider_from_env():
+    if PROVIDER_NAME == 'replay':
+        return ReplayProvider(
+            data_dir=os.environ.get('REPLAY_DATA_DIR') or None,
+            latency=float(os.environ.get('REPLAY_LATENCY_MS', '0')) / 1000.0,
+            seed=REPLAY_SEED
+        )
+    return YFinanceProvider()
+
+
+_provider = _provider_from_env()
+
+
+def get_provider():
+    return _provider
+
+
+def set_provider(provider):
+    global _provider
+    _provider = provider
+
+
+if __name__ == '__main__':
+    # python providers.py AAPL,MSFT 1y 1d data/replay
+    if len(sys.argv) != 5:
+        print("Usage: python providers.py SYMBOLS PERIOD INTERVAL DATA_DIR")
+        sys.exit(1)
+    record_history(sys.argv[1].split(','), sys.argv[2], sys.argv[3], sys.argv[4])
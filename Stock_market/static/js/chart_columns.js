@@ -0,0 +1,74 @@
+// Chart data in the compact columnar format (see serialization.pack_columns):
+// delta-encoded timestamps and float32 columns, decoded into the same
+// shape as the JSON response. Error responses still arrive as JSON.
+function padTwo(n) {
+    return (n < 10 ? '0' : '') + n;
+}
+
+// 'YYYY-MM-DD' for a count of days since 1970-01-01, without Date objects
+function civilDate(days) {
+    const z = days + 719468;
+    const era = Math.floor(z / 146097);
+    const doe = z - era * 146097;
+    const yoe = Math.floor((doe - Math.floor(doe / 1460) + Math.floor(doe / 36524) - Math.floor(doe / 146096)) / 365);
+    const doy = doe - (365 * yoe + Math.floor(yoe / 4) - Math.floor(yoe / 100));
+    const mp = Math.floor((5 * doy + 2) / 153);
+    const day = doy - Math.floor((153 * mp + 2) / 5) + 1;
+    const month = mp < 10 ? mp + 3 : mp - 9;
+    return (yoe + era * 400 + (month <= 2 ? 1 : 0)) + '-' + padTwo(month) + '-' + padTwo(day);
+}
+
+function decodeChartColumns(buffer) {
+    const view = new DataView(buffer);
+    if (String.fromCharCode(...new Uint8Array(buffer, 0, 4)) !== 'CHRT') {
+        throw new Error('Unexpected chart data format');
+    }
+    const rows = view.getUint32(8, true);
+    const metaLength = view.getUint32(12, true);
+    const meta = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 16, metaLength)));
+    let offset = 16 + metaLength;
+
+    // Typed-array views read the body in place (little-endian, as every browser is)
+    const deltas = new Int32Array(buffer, offset, rows);
+    offset += rows * 4;
+    const x = new Array(rows);
+    let t = meta.t0, day = NaN, datePart = '', second = NaN, timePart = '';
+    for (let i = 0; i < rows; i++) {
+        t += deltas[i];
+        const d = Math.floor(t / 86400);
+        const s = t - d * 86400;
+        if (d !== day) {
+            day = d;
+            datePart = civilDate(d) + ' ';
+        }
+        if (s !== second) {
+            second = s;
+            timePart = padTwo(Math.floor(s / 3600)) + ':' + padTwo(Math.floor(s / 60) % 60) + ':' + padTwo(s % 60);
+        }
+        x[i] = datePart + timePart;
+    }
+
+    const columns = {};
+    meta.columns.forEach(name => {
+        const values = new Float32Array(buffer, offset, rows);
+        offset += rows * 4;
+        columns[name] = Array.from(values, value => Number.isNaN(value) ? null : value);
+    });
+    return {
+        symbol: meta.symbol,
+        data: { x: x, y: columns.y, ma20: columns.ma20, ma50: columns.ma50, rsi: columns.rsi },
+        high: columns.high,
+        low: columns.low,
+        ai_features: meta.ai_features
+    };
+}
+
+function loadChartColumns(symbol, period) {
+    return fetch(`/get_chart_data?symbol=${symbol}&period=${period}&format=columns`)
+        .then(response => {
+            const type = response.headers.get('Content-Type') || '';
+            return type.startsWith('application/json')
+                ? response.json()
+                : response.arrayBuffer().then(decodeChartColumns);
+        });
+}
@@ -0,0 +1,178 @@
+"""
+Server-Sent Events fan-out.
+
+Browsers subscribe to topics such as ('quote', 'AAPL') or ('news', None)
+through one /stream connection instead of each polling the JSON routes.
+Every topic is polled once on the server, however many clients follow
+it: a single scheduler thread collects the topics of each kind that are
+due and hands them to that kind's producer in one call (so quotes for
+many symbols share one batched download), then pushes changed payloads
+to every subscribed client's queue.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+HEARTBEAT_INTERVAL = 15.0
+CLIENT_QUEUE_SIZE = 100
+
+
+class StreamClient:
+    __slots__ = ('topics', 'queue', 'notify')
+
+    def __init__(self, topics, notify=None):
+        self.topics = topics
+        self.queue = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        # Called after every push, lets an event loop wait without a thread
+        self.notify = notify
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Slow client: drop its oldest event rather than block the poller
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                pass
+        if self.notify is not None:
+            self.notify()
+
+
+def format_event(kind, payload):
+    return f"event: {kind}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+class StreamHub:
+    def __init__(self):
+        self._producers = {}    # kind -> (producer, interval)
+        self._clients = {}      # topic -> set of StreamClient
+        self._latest = {}       # topic -> last payload
+        self._next_due = {}     # topic -> monotonic time of the next poll
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.polls = 0
+        self.events_sent = 0
+
+    def register(self, kind, producer, interval):
+        """
+        producer(keys) returns {key: payload} for the keys of `kind` that
+        are due; keys missing from the result are left unchanged.
+        """
+        self._producers[kind] = (producer, interval)
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='stream-hub', daemon=True)
+            self._thread.start()
+
+    def subscribe(self, topics, notify=None):
+        client = StreamClient([topic for topic in topics if topic[0] in self._producers], notify)
+        with self._lock:
+            for topic in client.topics:
+                if topic not in self._clients:
+                    self._clients[topic] = set()
+                    self._next_due[topic] = 0.0
+                self._clients[topic].add(client)
+                latest = self._latest.get(topic)
+                if latest is not None:
+                    # Start the client from the last known state
+                    client.push(format_event(topic[0], latest))
+            self._start()
+        self._wake.set()
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            for topic in client.topics:
+                clients = self._clients.get(topic)
+                if clients is None:
+                    continue
+                clients.discard(client)
+                if not clients:
+                    # Nobody is listening, stop polling the topic
+                    del self._clients[topic]
+                    self._next_due.pop(topic, None)
+                    self._latest.pop(topic, None)
+
+    def publish(self, topic, payload):
+        with self._lock:
+            if self._latest.get(topic) == payload:
+                return
+            self._latest[topic] = payload
+            clients = list(self._clients.get(topic, ()))
+        event = format_event(topic[0], payload)
+        for client in clients:
+            client.push(event)
+        self.events_sent += len(clients)
+
+    def _poll_due(self):
+        now = time.monotonic()
+        with self._lock:
+            due = {}
+            for topic, next_due in self._next_due.items():
+                if next_due <= now:
+                    due.setdefault(topic[0], []).append(topic[1])
+            for kind, keys in due.items():
+                interval = self._producers[kind][1]
+                for key in keys:
+                    self._next_due[(kind, key)] = now + interval
+        for kind, keys in due.items():
+            producer = self._producers[kind][0]
+            try:
+                payloads = producer(keys)
+                self.polls += 1
+            except Exception as e:
+                print(f"Stream producer for {kind} failed: {e}")
+                continue
+            for key, payload in payloads.items():
+                self.publish((kind, key), payload)
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            self._poll_due()
+            with self._lock:
+                wait = min(self._next_due.values(), default=time.monotonic() + 1.0) - time.monotonic()
+            self._wake.wait(max(0.05, min(wait, 1.0)))
+
+    def events(self, client, heartbeat=HEARTBEAT_INTERVAL):
+        """
+        SSE body for one client. Comments keep idle connections open and
+        let the server notice clients that went away.
+        """
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    yield client.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(client)
+
+    def stats(self):
+        with self._lock:
+            clients = set()
+            for topic_clients in self._clients.values():
+                clients.update(topic_clients)
+            return {
+                'clients': len(clients),
+                'topics': len(self._clients),
+                'polls': self.polls,
+                'events_sent': self.events_sent
+            }
+
+
+QUOTE_INTERVAL = float(os.environ.get('STREAM_QUOTE_INTERVAL', '5'))
+SIGNAL_INTERVAL = float(os.environ.get('STREAM_SIGNAL_INTERVAL', '60'))
+NEWS_INTERVAL = float(os.environ.get('STREAM_NEWS_INTERVAL', '300'))
+
+stream_hub = StreamHub()
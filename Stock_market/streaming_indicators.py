@@ -0,0 +1,414 @@
+"""
+Incremental technical indicators.
+
+Each indicator is seeded once from history (vectorized, via the
+indicators module) and then advanced one bar at a time in constant work.
+update() commits a closed bar; peek() evaluates a bar that may still
+change (the live last bar) without committing it, so polling the same
+bar repeatedly never drifts the state.
+
+indicator_states keeps one IndicatorSet per (symbol, period, interval) so
+polling routes only pay for bars that arrived since their last call.
+"""
+import math
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+import indicators
+from metrics import timed
+
+NAN = float('nan')
+
+
+class StreamingSMA:
+    """
+    Running-sum SMA. Like pandas, a window containing a NaN yields NaN.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.missing = 0
+
+    def seed(self, values):
+        self.values = deque((float(v) for v in values[-self.window:]), maxlen=self.window)
+        finite = [v for v in self.values if not math.isnan(v)]
+        self.total = math.fsum(finite)
+        self.missing = len(self.values) - len(finite)
+        return self.value()
+
+    def value(self):
+        if len(self.values) < self.window or self.missing:
+            return NAN
+        return self.total / self.window
+
+    def peek(self, x):
+        if len(self.values) + 1 < self.window:
+            return NAN
+        total, missing = self.total, self.missing
+        if len(self.values) == self.window:
+            dropped = self.values[0]
+            if math.isnan(dropped):
+                missing -= 1
+            else:
+                total -= dropped
+        if math.isnan(x):
+            return NAN
+        return NAN if missing else (total + x) / self.window
+
+    def update(self, x):
+        if len(self.values) == self.window:
+            dropped = self.values[0]
+            if math.isnan(dropped):
+                self.missing -= 1
+            else:
+                self.total -= dropped
+        self.values.append(x)
+        if math.isnan(x):
+            self.missing += 1
+        else:
+            self.total += x
+        return self.value()
+
+
+class StreamingEMA:
+    """
+    Same weighting as pandas ewm(span=span, adjust=True).mean(): a running
+    weighted sum and a running sum of weights.
+    """
+
+    def __init__(self, span):
+        self.span = span
+        self.decay = 1.0 - 2.0 / (span + 1.0)
+        self.weighted = 0.0
+        self.weights = 0.0
+
+    def seed(self, values):
+        x = indicators.as_float_array(values)
+        x = x[~np.isnan(x)]
+        if len(x) == 0:
+            self.weighted = self.weights = 0.0
+        else:
+            self.weighted = float(indicators._recurrence(x, self.decay)[-1])
+            self.weights = float(indicators._recurrence(np.ones(len(x)), self.decay)[-1])
+        return self.value()
+
+    def value(self):
+        return self.weighted / self.weights if self.weights else NAN
+
+    def peek(self, x):
+        if math.isnan(x):
+            return self.value()
+        return (self.decay * self.weighted + x) / (self.decay * self.weights + 1.0)
+
+    def update(self, x):
+        if not math.isnan(x):
+            self.weighted = self.decay * self.weighted + x
+            self.weights = self.decay * self.weights + 1.0
+        return self.value()
+
+
+class StreamingRSI:
+    """
+    Wilder's RSI: plain average of the first `period` changes, then
+    exponential smoothing with alpha = 1 / period.
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0  # changes seen so far
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.avg_gain = None
+        self.avg_loss = None
+
+    def seed(self, closes):
+        x = indicators.as_float_array(closes)
+        self.__init__(self.period)
+        if len(x) == 0:
+            return NAN
+        self.prev_close = float(x[-1])
+        self.count = len(x) - 1
+        if self.count < self.period:
+            delta = np.diff(x)
+            self.gain_sum = float(np.clip(delta, 0.0, None).sum())
+            self.loss_sum = float(np.clip(-delta, 0.0, None).sum())
+            return NAN
+        avg_gain, avg_loss = indicators.wilder_averages(x, self.period)
+        self.avg_gain = float(avg_gain[-1])
+        self.avg_loss = float(avg_loss[-1])
+        return self.value()
+
+    @staticmethod
+    def _rsi(avg_gain, avg_loss):
+        if avg_loss == 0.0:
+            return 50.0 if avg_gain == 0.0 else 100.0
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    def value(self):
+        if self.avg_gain is None:
+            return NAN
+        return self._rsi(self.avg_gain, self.avg_loss)
+
+    def _advance(self, x):
+        if self.prev_close is None:
+            return None
+        delta = x - self.prev_close
+        gain = max(delta, 0.0)
+        loss = max(-delta, 0.0)
+        if self.avg_gain is None:
+            if self.count + 1 < self.period:
+                return None
+            return ((self.gain_sum + gain) / self.period, (self.loss_sum + loss) / self.period)
+        smoothing = self.period - 1.0
+        return ((self.avg_gain * smoothing + gain) / self.period,
+                (self.avg_loss * smoothing + loss) / self.period)
+
+    def peek(self, x):
+        averages = self._advance(x)
+        return NAN if averages is None else self._rsi(*averages)
+
+    def update(self, x):
+        averages = self._advance(x)
+        if self.prev_close is not None:
+            delta = x - self.prev_close
+            self.count += 1
+            if averages is None:
+                self.gain_sum += max(delta, 0.0)
+                self.loss_sum += max(-delta, 0.0)
+            else:
+                self.avg_gain, self.avg_loss = averages
+        self.prev_close = x
+        return self.value()
+
+
+class StreamingMACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+
+    def seed(self, closes):
+        line, _, _ = indicators.macd(closes, self.fast.span, self.slow.span, self.signal.span)
+        self.fast.seed(closes)
+        self.slow.seed(closes)
+        self.signal.seed(line)
+        return self.value()
+
+    def _result(self, line, signal):
+        return line, signal, line - signal
+
+    def value(self):
+        line = self.fast.value() - self.slow.value()
+        return self._result(line, self.signal.value())
+
+    def peek(self, x):
+        line = self.fast.peek(x) - self.slow.peek(x)
+        return self._result(line, self.signal.peek(line))
+
+    def update(self, x):
+        line = self.fast.update(x) - self.slow.update(x)
+        return self._result(line, self.signal.update(line))
+
+
+class StreamingBollinger:
+    def __init__(self, window=20, num_std=2.0):
+        self.window = window
+        self.num_std = num_std
+        self.values = deque(maxlen=window)
+
+    def seed(self, closes):
+        self.values = deque((float(v) for v in closes[-self.window:]), maxlen=self.window)
+        return self.value()
+
+    def _bands(self, values):
+        if len(values) < self.window:
+            return NAN, NAN, NAN
+        middle = math.fsum(values) / self.window
+        variance = math.fsum((v - middle) ** 2 for v in values) / (self.window - 1)
+        width = self.num_std * math.sqrt(variance)
+        return middle + width, middle, middle - width
+
+    def value(self):
+        return self._bands(self.values)
+
+    def peek(self, x):
+        values = list(self.values)[1 if len(self.values) == self.window else 0:]
+        values.append(x)
+        return self._bands(values)
+
+    def update(self, x):
+        self.values.append(x)
+        return self.value()
+
+
+class StreamingStochastic:
+    def __init__(self, k_window=14, d_window=3):
+        self.k_window = k_window
+        self.highs = deque(maxlen=k_window)
+        self.lows = deque(maxlen=k_window)
+        self.k_values = StreamingSMA(d_window)
+        self.k = NAN
+
+    def seed(self, highs, lows, closes):
+        k_line, _ = indicators.stochastic(highs, lows, closes, self.k_window, self.k_values.window)
+        self.highs = deque((float(v) for v in highs[-self.k_window:]), maxlen=self.k_window)
+        self.lows = deque((float(v) for v in lows[-self.k_window:]), maxlen=self.k_window)
+        self.k_values.seed(k_line)
+        self.k = float(k_line[-1]) if len(k_line) else NAN
+        return self.value()
+
+    def _k(self, highs, lows, close):
+        if len(highs) < self.k_window:
+            return NAN
+        lowest = min(lows)
+        highest = max(highs)
+        if highest == lowest:
+            return NAN
+        return 100.0 * (close - lowest) / (highest - lowest)
+
+    def value(self):
+        return self.k, self.k_values.value()
+
+    def peek(self, high, low, close):
+        keep = 1 if len(self.highs) == self.k_window else 0
+        k = self._k(list(self.highs)[keep:] + [high], list(self.lows)[keep:] + [low], close)
+        return k, self.k_values.peek(k)
+
+    def update(self, high, low, close):
+        self.highs.append(high)
+        self.lows.append(low)
+        self.k = self._k(self.highs, self.lows, close)
+        return self.k, self.k_values.update(self.k)
+
+
+class IndicatorSet:
+    """
+    All indicators used by the routes, advanced together one bar at a time.
+    Values are returned with the same keys as indicators.compute_indicators().
+    """
+
+    def __init__(self, sma_windows=(20, 50, 200)):
+        self.smas = {window: StreamingSMA(window) for window in sma_windows}
+        self.ema12 = StreamingEMA(12)
+        self.ema26 = StreamingEMA(26)
+        self.rsi = StreamingRSI(14)
+        self.macd = StreamingMACD(12, 26, 9)
+        self.bollinger = StreamingBollinger(20, 2.0)
+        self.stochastic = StreamingStochastic(14, 3)
+        self.volume_ma = StreamingSMA(20)
+
+    def seed(self, hist):
+        closes = indicators.as_float_array(hist['Close'])
+        highs = indicators.as_float_array(hist['High'])
+        lows = indicators.as_float_array(hist['Low'])
+        volumes = indicators.as_float_array(hist['Volume'])
+        for sma in self.smas.values():
+            sma.seed(closes)
+        self.ema12.seed(closes)
+        self.ema26.seed(closes)
+        self.rsi.seed(closes)
+        self.macd.seed(closes)
+        self.bollinger.seed(closes)
+        self.stochastic.seed(highs, lows, closes)
+        self.volume_ma.seed(volumes)
+
+    @staticmethod
+    def _bar(row):
+        close, high, low, volume = row
+        return float(close), float(high), float(low), float(volume)
+
+    def update(self, row):
+        close, high, low, volume = self._bar(row)
+        for sma in self.smas.values():
+            sma.update(close)
+        self.ema12.update(close)
+        self.ema26.update(close)
+        self.rsi.update(close)
+        self.macd.update(close)
+        self.bollinger.update(close)
+        self.stochastic.update(high, low, close)
+        self.volume_ma.update(volume)
+
+    def peek(self, row):
+        close, high, low, volume = self._bar(row)
+        values = {f'ma{window}': sma.peek(close) for window, sma in self.smas.items()}
+        values['ema12'] = self.ema12.peek(close)
+        values['ema26'] = self.ema26.peek(close)
+        values['rsi'] = self.rsi.peek(close)
+        values['macd'], values['macd_signal'], values['macd_hist'] = self.macd.peek(close)
+        values['bb_upper'], values['bb_middle'], values['bb_lower'] = self.bollinger.peek(close)
+        values['stoch_k'], values['stoch_d'] = self.stochastic.peek(high, low, close)
+        values['volume_ma'] = self.volume_ma.peek(volume)
+        return values
+
+
+class IndicatorStateRegistry:
+    """
+    IndicatorSets per (symbol, period, interval), LRU-bounded. Each set has
+    committed every bar except the newest one it has seen, which is only
+    peeked because the live bar keeps changing until it closes.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (IndicatorSet, last committed timestamp)
+        self._lock = threading.Lock()
+        self.reseeds = 0
+        self.incremental_updates = 0
+
+    @timed('indicators')
+    def latest(self, key, hist):
+        """
+        Return the latest indicator values for hist, reusing and advancing
+        the state kept for key. Falls back to a full seed when hist does not
+        line up with what was committed before (first call, gaps, restated
+        history).
+        """
+        if hist.empty:
+            return {}
+        index = hist.index
+        bars = hist[['Close', 'High', 'Low', 'Volume']]
+        last = tuple(bars.iloc[-1])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                state, committed_at = entry
+                position = index.searchsorted(committed_at)
+                if position < len(index) - 1 and index[position] == committed_at:
+                    # Commit only the bars that closed since the last call
+                    rows = bars.iloc[position + 1:-1]
+                    for row in rows.itertuples(index=False, name=None):
+                        state.update(row)
+                    self.incremental_updates += len(rows)
+                    self._entries[key] = (state, index[-2])
+                    self._entries.move_to_end(key)
+                    return state.peek(last)
+
+        # Seed outside the lock, it is the only O(history) step
+        state = IndicatorSet()
+        state.seed(bars.iloc[:-1])
+        values = state.peek(last)
+        with self._lock:
+            self.reseeds += 1
+            if len(index) > 1:
+                self._entries[key] = (state, index[-2])
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return values
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'reseeds': self.reseeds,
+                'incremental_updates': self.incremental_updates
+            }
+
+
+indicator_states = IndicatorStateRegistry()
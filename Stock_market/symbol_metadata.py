@@ -0,0 +1,171 @@
+"""
+Persistent symbol metadata.
+
+Company name, exchange, currency and sector for each symbol, kept in a
+JSON file so they survive restarts. Lookups never wait on the network:
+a symbol that is unknown or older than METADATA_TTL is answered from
+what is on hand (the stale entry, or the symbol itself) and fetched in
+the background for the next request.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from market_data import get_info
+from providers import local_data_dir
+
+METADATA_PATH = os.environ.get('SYMBOL_METADATA_PATH', os.path.join(local_data_dir(), 'symbol_metadata.json'))
+METADATA_TTL = float(os.environ.get('SYMBOL_METADATA_TTL', str(7 * 24 * 60 * 60)))
+# Wait before asking again about a symbol whose lookup failed
+RETRY_DELAY = 5 * 60
+# Batch the file writes of a burst of lookups
+SAVE_DELAY = 2.0
+
+FIELDS = {
+    'name': 'longName',
+    'short_name': 'shortName',
+    'exchange': 'exchange',
+    'currency': 'currency',
+    'sector': 'sector'
+}
+
+
+class SymbolMetadata:
+    def __init__(self, path=METADATA_PATH, ttl=METADATA_TTL, workers=4):
+        self.path = path
+        self.ttl = ttl
+        self._entries = {}   # symbol -> {'name', 'short_name', ..., 'fetched_at'}
+        self._pending = set()
+        self._failed = {}    # symbol -> monotonic time of the last failure
+        self._lock = threading.Lock()
+        self._save_timer = None
+        self._dirty = False
+        self._listeners = []
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='symbol-metadata')
+        self.fetches = 0
+        self.failures = 0
+        self._load()
+        atexit.register(self._save_quietly)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Could not read symbol metadata from {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = json.dumps(self._entries, sort_keys=True)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def _schedule_save(self):
+        with self._lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY, self._save_quietly)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Could not write symbol metadata to {self.path}: {e}")
+
+    def _fetch(self, symbol):
+        try:
+            info = get_info(symbol)
+            self.fetches += 1
+            entry = {field: info.get(key) for field, key in FIELDS.items()}
+            entry['fetched_at'] = time.time()
+            with self._lock:
+                previous = self._entries.get(symbol)
+                self._entries[symbol] = entry
+                self._failed.pop(symbol, None)
+                self._dirty = True
+            self._schedule_save()
+            for callback in self._listeners:
+                callback(symbol, previous, entry)
+        except Exception as e:
+            self.failures += 1
+            print(f"Symbol metadata lookup failed for {symbol}: {e}")
+            with self._lock:
+                self._failed[symbol] = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending.discard(symbol)
+
+    def add_listener(self, callback):
+        """
+        callback(symbol, previous, entry) is called after every lookup,
+        previous being None for a symbol seen for the first time.
+        """
+        self._listeners.append(callback)
+
+    def _refresh(self, symbol, entry):
+        """
+        Queue a background lookup when entry is missing or stale.
+        Expects self._lock to be held.
+        """
+        if entry is not None and time.time() - entry['fetched_at'] < self.ttl:
+            return
+        if symbol in self._pending:
+            return
+        failed_at = self._failed.get(symbol)
+        if failed_at is not None and time.monotonic() - failed_at < RETRY_DELAY:
+            return
+        self._pending.add(symbol)
+        self._executor.submit(self._fetch, symbol)
+
+    def get(self, symbol):
+        """
+        Metadata dict for symbol, or None while it is still unknown.
+        """
+        symbol = symbol.strip().upper()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            self._refresh(symbol, entry)
+            return entry
+
+    def name(self, symbol, short=False):
+        """
+        Company name, falling back to the symbol itself.
+        """
+        entry = self.get(symbol)
+        if entry is None:
+            return symbol.strip()
+        return (entry['short_name'] if short else entry['name']) or symbol.strip()
+
+    def preload(self, symbols):
+        """
+        Look up every unknown or stale symbol in the background.
+        """
+        with self._lock:
+            for symbol in symbols:
+                symbol = symbol.strip().upper()
+                self._refresh(symbol, self._entries.get(symbol))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'symbols': len(self._entries),
+                'pending': len(self._pending),
+                'fetches': self.fetches,
+                'failures': self.failures
+            }
+
+
+symbol_metadata = SymbolMetadata()
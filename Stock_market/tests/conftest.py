@@ -0,0 +1,23 @@
+"""
+The modules under test read their configuration at import time: point
+them at the replay provider and throwaway files before anything imports
+them, the same way bench_routes.py does.
+"""
+import os
+import sys
+import tempfile
+
+_WORK_DIR = tempfile.mkdtemp(prefix='stock-market-tests-')
+for _name, _value in {
+    'MARKET_DATA_PROVIDER': 'replay',
+    'REPLAY_LATENCY_MS': '0',
+    'REPLAY_SEED': '0',
+    'OHLCV_STORE_DIR': os.path.join(_WORK_DIR, 'ohlcv'),
+    'SYMBOL_METADATA_PATH': os.path.join(_WORK_DIR, 'symbol_metadata.json'),
+    'TRADE_JOURNAL_SPILL': os.path.join(_WORK_DIR, 'trade_journal.jsonl'),
+    'DB_CONNECT_TIMEOUT': '1'
+}.items():
+    os.environ.setdefault(_name, _value)
+
+# The app's modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
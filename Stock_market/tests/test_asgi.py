@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import asgi
+from stream import stream_hub
+
+
+def _scope(path, query=b'', method='GET'):
+    return {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': [],
+            'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 5000)}
+
+
+async def _call(scope, until=None, timeout=10):
+    """
+    Run asgi.app for scope; the client disconnects once until(body) holds
+    (or at once when the response completes). Returns (status, body).
+    """
+    messages = []
+    done = asyncio.Event()
+    requested = []
+
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+        body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+        if (message['type'] == 'http.response.body' and not message.get('more_body')) or (until and until(body)):
+            done.set()
+
+    await asyncio.wait_for(asgi.app(scope, receive, send), timeout)
+    status = next(m['status'] for m in messages if m['type'] == 'http.response.start')
+    return status, b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+
+
+def test_views_are_served_on_the_thread_pool():
+    status, body = asyncio.run(_call(_scope('/get_stock_data', b'symbol=AAPL')))
+    assert status == 200
+    assert json.loads(body)['symbol'] == 'AAPL'
+
+
+def test_stream_sends_events_for_the_requested_topics():
+    status, body = asyncio.run(_call(_scope('/stream', b'symbols=AAPL&events=quote'),
+                                     until=lambda body: b'event: quote' in body))
+    assert status == 200
+    assert body.startswith(b'retry: 5000\n\n')
+    event = body.split(b'event: quote\ndata: ', 1)[1].split(b'\n\n', 1)[0]
+    assert 'AAPL' in json.dumps(json.loads(event))
+    assert b'event: signal' not in body
+    # Disconnecting unsubscribes the client
+    assert stream_hub.stats()['clients'] == 0
@@ -0,0 +1,141 @@
+import pytest
+from mysql.connector import errors
+
+import db
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool:
+    def __init__(self):
+        self.down = False
+        self.handed_out = []
+
+    def get_connection(self):
+        if self.down:
+            raise errors.InterfaceError(msg="Can't connect to MySQL server")
+        conn = FakeConnection()
+        self.handed_out.append(conn)
+        return conn
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(db, '_pool', pool)
+    return pool
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    # No retry window: the breaker goes half-open as soon as it opens
+    breaker = db.CircuitBreaker(failure_threshold=2, reset_timeout=0.0)
+    monkeypatch.setattr(db, 'breaker', breaker)
+    return breaker
+
+
+def _fail_to_connect(times):
+    for _ in range(times):
+        with pytest.raises(errors.InterfaceError):
+            with db.db_connection():
+                pass
+
+
+def test_opens_after_consecutive_connection_failures(pool, breaker, monkeypatch):
+    monkeypatch.setattr(breaker, 'reset_timeout', 60.0)
+    pool.down = True
+    _fail_to_connect(2)
+    assert breaker.state == 'open'
+    with pytest.raises(db.DatabaseUnavailable):
+        with db.db_connection():
+            pass
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_one_trial_through(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() and breaker.allow()
+
+
+def test_successful_trial_closes_the_breaker(pool, breaker):
+    pool.down = True
+    _fail_to_connect(2)
+    pool.down = False
+    with db.db_connection() as conn:
+        assert isinstance(conn, FakeConnection)
+    assert breaker.state == 'closed'
+    assert pool.handed_out[-1].closed
+
+
+def test_failed_trial_reopens_the_breaker(pool, breaker):
+    pool.down = True
+    _fail_to_connect(3)
+    assert breaker.opened_at is not None
+    assert not breaker.trial_in_flight
+
+
+@pytest.mark.parametrize('error', [errors.IntegrityError(msg='Duplicate entry'),
+                                   errors.ProgrammingError(msg='Unknown column')])
+def test_query_errors_during_the_trial_count_as_healthy(pool, breaker, error):
+    pool.down = True
+    _fail_to_connect(2)
+    pool.down = False
+    with pytest.raises(type(error)):
+        with db.db_connection():
+            raise error
+    assert breaker.state == 'closed'
+    assert not breaker.trial_in_flight
+
+
+def test_connection_errors_mid_query_count_against_the_database(pool, breaker):
+    pool.down = True
+    _fail_to_connect(2)
+    pool.down = False
+    with pytest.raises(errors.OperationalError):
+        with db.db_connection():
+            raise errors.OperationalError(msg='Lost connection to MySQL server during query')
+    assert breaker.state != 'closed'
+    assert not breaker.trial_in_flight
+
+
+def test_unrelated_exceptions_hand_the_trial_back(pool, breaker):
+    pool.down = True
+    _fail_to_connect(2)
+    pool.down = False
+    with pytest.raises(KeyError):
+        with db.db_connection():
+            raise KeyError('bug in the caller')
+    assert not breaker.trial_in_flight
+    # The next call is allowed to try again
+    with db.db_connection():
+        pass
+    assert breaker.state == 'closed'
+
+
+def test_busy_pool_hands_the_trial_back(pool, breaker, monkeypatch):
+    class NoSlots:
+        def acquire(self, timeout=None):
+            return False
+
+    pool.down = True
+    _fail_to_connect(2)
+    monkeypatch.setattr(db, '_pool_slots', NoSlots())
+    with pytest.raises(errors.PoolError):
+        with db.db_connection():
+            pass
+    assert not breaker.trial_in_flight
@@ -0,0 +1,94 @@
+import pytest
+
+import app as trading_app
+from app import app, matching_engine
+
+
+@pytest.fixture
+def login():
+    clients = {}
+
+    def login(username):
+        if username not in clients:
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['username'] = username
+            clients[username] = client
+        return clients[username]
+
+    yield login
+    for username in clients:
+        for order in matching_engine.open_orders(username):
+            matching_engine.cancel(order.order_id)
+
+
+def _trade(client, action, quantity, **order):
+    return client.post('/execute_trade', json=dict({'symbol': 'AAPL', 'action': action, 'quantity': quantity}, **order))
+
+
+def test_market_orders_fill_at_the_server_price(login):
+    market = trading_app._market_price('AAPL')
+    assert market
+
+    response = _trade(login('trader-a'), 'buy', 5, price=0.01)
+    assert response.status_code == 200
+    assert response.json['trade']['price'] == pytest.approx(market, abs=0.01)
+
+    response = _trade(login('trader-a'), 'sell', 5, price=1e9)
+    assert response.json['trade']['price'] == pytest.approx(market, abs=0.01)
+
+
+def test_client_price_cannot_fill_resting_orders(login):
+    market = trading_app._market_price('AAPL')
+    bid = _trade(login('trader-b'), 'buy', 3, order_type='limit', limit_price=round(market * 0.9, 2)).json['order']
+    assert bid['status'] == 'open'
+
+    _trade(login('trader-c'), 'buy', 3)
+    # A sell "at" a penny must not drag the market down to the resting bid
+    response = _trade(login('trader-c'), 'sell', 3, price=0.01)
+    assert response.json['trade']['price'] == pytest.approx(market, abs=0.01)
+    assert matching_engine.orders[bid['order_id']].filled == 0
+
+
+def test_price_feed_fills_resting_orders(login):
+    market = trading_app._market_price('AAPL')
+    bid = _trade(login('trader-d'), 'buy', 2, order_type='limit', limit_price=round(market * 0.9, 2)).json['order']
+
+    # Feed ticks are in the provider's currency, like the bars
+    trading_app._on_market_tick('AAPL', market * 0.85 / trading_app.fx.symbol_rate('AAPL'), None)
+    assert bid['order_id'] not in matching_engine.orders
+    assert trading_app.MOCK_PORTFOLIO['trader-d'].quantity('AAPL') == 2
+
+
+def test_own_orders_do_not_trade_with_each_other(login):
+    client = login('trader-e')
+    market = trading_app._market_price('AAPL')
+    _trade(client, 'buy', 4)
+    ask = _trade(client, 'sell', 4, order_type='limit', limit_price=round(market * 1.1, 2)).json['order']
+    bid = _trade(client, 'buy', 4, order_type='limit', limit_price=round(market * 1.2, 2)).json
+    assert matching_engine.orders[ask['order_id']].filled == 0
+    # The buy filled at the market instead
+    assert bid['trade']['price'] == pytest.approx(market, abs=0.01)
+
+
+def test_unknown_symbol_has_no_price(login, monkeypatch):
+    monkeypatch.setattr(trading_app, '_market_price', lambda symbol: None)
+    response = _trade(login('trader-f'), 'buy', 1, price=100.0)
+    assert response.status_code == 503
+    assert not response.json['success']
+
+
+def test_fills_are_booked_in_the_symbols_own_currency(login):
+    market = trading_app._market_price('AAPL')
+    rate = trading_app.fx.symbol_rate('AAPL')
+    _trade(login('trader-e'), 'buy', 2)
+
+    book = trading_app.MOCK_PORTFOLIO['trader-e']
+    assert book.get('AAPL').avg_price == pytest.approx(market / rate, abs=0.01)
+
+    trading_app.price_feed.publish('AAPL', market / rate)
+    row = next(row for row in trading_app.portfolio_valuations.get('trader-e', book).snapshot()['portfolio_details']
+               if row['symbol'] == 'AAPL')
+    assert row['avg_price'] == pytest.approx(market, abs=0.01)
+    assert row['current_price'] == pytest.approx(market, abs=0.01)
+    assert row['return_rate'] == pytest.approx(0, abs=0.01)
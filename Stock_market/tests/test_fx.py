@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+import symbol_metadata as metadata_module
+from fx import currency_of, fx
+from symbol_metadata import symbol_metadata
+
+
+def _resolve(symbol):
+    symbol_metadata.get(symbol)
+    deadline = time.monotonic() + 5
+    while symbol_metadata.stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def currency(monkeypatch):
+    info = {}
+    monkeypatch.setattr(metadata_module, 'get_info', lambda symbol: info)
+    return info
+
+
+def test_a_resolved_currency_invalidates_converted_prices(currency):
+    currency['currency'] = 'EUR'
+    version = fx.version
+    assert currency_of('SAP') == 'USD'
+    _resolve('SAP')
+    assert currency_of('SAP') == 'EUR'
+    assert fx.version == version + 1
+
+
+def test_known_currencies_keep_converted_prices(currency):
+    version = fx.version
+    currency['currency'] = 'INR'
+    _resolve('TCS.NS')
+    currency['currency'] = 'USD'
+    _resolve('IBM')
+    assert fx.version == version
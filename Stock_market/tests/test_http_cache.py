@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+from flask import Flask, jsonify
+
+from http_cache import ResponseCache, cached_response, note_bars, skip_cache
+
+
+def _bars(close=100.0):
+    index = pd.date_range('2024-01-01', periods=3, freq='D', tz='America/New_York')
+    return pd.DataFrame({'Close': [98.0, 99.0, close], 'Volume': [1.0, 2.0, 3.0]}, index=index)
+
+
+@pytest.fixture
+def setup():
+    app = Flask(__name__)
+    cache = ResponseCache()
+    state = {'runs': 0, 'fail': False, 'status': 200, 'close': 100.0}
+
+    @app.route('/quote')
+    @cached_response(cache)
+    def quote():
+        state['runs'] += 1
+        if state['fail']:
+            skip_cache()
+            return jsonify({'price': 8300.0})
+        hist = _bars(state['close'])
+        note_bars(hist, '1d')
+        return jsonify({'price': float(hist['Close'].iloc[-1])}), state['status']
+
+    return app.test_client(), cache, state
+
+
+def test_repeat_requests_are_served_from_the_cache(setup):
+    client, cache, state = setup
+    first = client.get('/quote?symbol=AAPL')
+    second = client.get('/quote?symbol=AAPL')
+    assert first.json == second.json == {'price': 100.0}
+    assert state['runs'] == 1
+    assert cache.stats()['hits'] == 1
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert second.headers['Cache-Control'] == 'no-cache'
+
+
+def test_queries_are_cached_separately(setup):
+    client, _, state = setup
+    client.get('/quote?symbol=AAPL')
+    client.get('/quote?symbol=MSFT')
+    assert state['runs'] == 2
+
+
+def test_matching_etag_gets_304(setup):
+    client, cache, _ = setup
+    etag = client.get('/quote').headers['ETag']
+    response = client.get('/quote', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert cache.stats()['not_modified'] == 1
+
+
+def test_fallback_responses_are_not_cached(setup):
+    client, cache, state = setup
+    state['fail'] = True
+    assert client.get('/quote').json == {'price': 8300.0}
+    state['fail'] = False
+    assert client.get('/quote').json == {'price': 100.0}
+    assert state['runs'] == 2
+    assert cache.stats()['entries'] == 1
+
+
+def test_error_statuses_are_not_cached(setup):
+    client, cache, state = setup
+    state['status'] = 503
+    assert client.get('/quote').status_code == 503
+    state['status'] = 200
+    assert client.get('/quote').status_code == 200
+    assert state['runs'] == 2
+
+
+def test_new_salt_invalidates_entries(setup):
+    client, cache, state = setup
+    salt = {'version': 1}
+    cache.salt = lambda: salt['version']
+    first = client.get('/quote').headers['ETag']
+    salt['version'] = 2
+    second = client.get('/quote').headers['ETag']
+    assert state['runs'] == 2
+    assert first != second
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    for key in 'abc':
+        cache.put(key, object())
+    assert cache.stats()['entries'] == 2
+    assert cache._entries.keys() == {'b', 'c'}
+
+
+def test_skip_cache_outside_a_request_is_a_no_op():
+    skip_cache()
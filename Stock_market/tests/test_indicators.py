@@ -0,0 +1,119 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, 300))
+    high = close + rng.uniform(0, 2, 300)
+    low = close - rng.uniform(0, 2, 300)
+    volume = rng.integers(1_000, 100_000, 300).astype(float)
+    return pd.DataFrame({'Open': close, 'High': high, 'Low': low, 'Close': close, 'Volume': volume})
+
+
+def _wilder_rsi(close, period=14):
+    # Textbook loop: simple mean seed, then Wilder smoothing
+    delta = np.diff(close)
+    gains, losses = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+    out = np.full(len(close), np.nan)
+    avg_gain, avg_loss = gains[:period].mean(), losses[:period].mean()
+    for i in range(period, len(close)):
+        if i > period:
+            avg_gain = (avg_gain * (period - 1) + gains[i - 1]) / period
+            avg_loss = (avg_loss * (period - 1) + losses[i - 1]) / period
+        out[i] = 100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss)
+    return out
+
+
+@pytest.mark.parametrize('window', [1, 5, 20, 50])
+def test_sma_matches_pandas(prices, window):
+    expected = prices['Close'].rolling(window).mean().to_numpy()
+    np.testing.assert_allclose(indicators.sma(prices['Close'], window), expected, rtol=1e-10)
+
+
+def test_sma_is_nan_for_windows_with_gaps():
+    values = np.array([1.0, 2.0, np.nan, 4.0, 5.0, 6.0])
+    expected = pd.Series(values).rolling(2).mean().to_numpy()
+    np.testing.assert_allclose(indicators.sma(values, 2), expected)
+
+
+@pytest.mark.parametrize('adjust', [True, False])
+@pytest.mark.parametrize('span', [2, 12, 26, 200])
+def test_ema_matches_pandas(prices, span, adjust):
+    expected = prices['Close'].ewm(span=span, adjust=adjust).mean().to_numpy()
+    np.testing.assert_allclose(indicators.ema(prices['Close'], span, adjust=adjust), expected, rtol=1e-9)
+
+
+def test_ema_keeps_leading_nans():
+    values = np.array([np.nan, np.nan, 1.0, 2.0, 3.0])
+    expected = pd.Series(values).ewm(span=3).mean().to_numpy()
+    np.testing.assert_allclose(indicators.ema(values, 3), expected)
+
+
+def test_rsi_matches_wilder(prices):
+    close = prices['Close'].to_numpy()
+    np.testing.assert_allclose(indicators.rsi(close), _wilder_rsi(close), rtol=1e-9)
+
+
+def test_rsi_of_flat_and_rising_series():
+    assert np.all(indicators.rsi(np.full(30, 5.0))[14:] == 50.0)
+    assert np.all(indicators.rsi(np.arange(30.0))[14:] == 100.0)
+    assert np.isnan(indicators.rsi(np.arange(10.0))).all()
+
+
+def test_macd_and_bollinger(prices):
+    close = prices['Close']
+    line, signal, histogram = indicators.macd(close)
+    expected_line = (close.ewm(span=12).mean() - close.ewm(span=26).mean()).to_numpy()
+    np.testing.assert_allclose(line, expected_line, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(signal, pd.Series(expected_line).ewm(span=9).mean().to_numpy(), rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(histogram, line - signal)
+
+    upper, middle, lower = indicators.bollinger(close)
+    std = close.rolling(20).std().to_numpy()
+    np.testing.assert_allclose(middle, close.rolling(20).mean().to_numpy(), rtol=1e-10)
+    np.testing.assert_allclose(upper, middle + 2 * std, rtol=1e-10)
+    np.testing.assert_allclose(lower, middle - 2 * std, rtol=1e-10)
+
+
+def test_stochastic(prices):
+    k, d = indicators.stochastic(prices['High'], prices['Low'], prices['Close'])
+    lowest, highest = prices['Low'].rolling(14).min(), prices['High'].rolling(14).max()
+    expected_k = (100 * (prices['Close'] - lowest) / (highest - lowest)).to_numpy()
+    np.testing.assert_allclose(k, expected_k, rtol=1e-10)
+    np.testing.assert_allclose(d, pd.Series(expected_k).rolling(3).mean().to_numpy(), rtol=1e-10)
+
+
+def test_compute_indicators_shares_its_intermediates(prices):
+    result = indicators.compute_indicators(prices)
+    assert set(result) >= {'ma20', 'ma50', 'ema12', 'ema26', 'rsi', 'macd', 'macd_signal', 'macd_hist',
+                           'stoch_k', 'stoch_d', 'bb_upper', 'bb_middle', 'bb_lower', 'volume_ma'}
+    np.testing.assert_array_equal(result['bb_middle'], result['ma20'])
+    np.testing.assert_allclose(result['macd'], result['ema12'] - result['ema26'])
+    assert all(len(values) == len(prices) for values in result.values())
+
+
+def test_json_helpers():
+    assert indicators.to_json_list([1.0, np.nan], scale=2.0) == [2.0, None]
+    assert indicators.last_value([1.0, np.nan], default=0.0) == 0.0
+    assert indicators.last_value([], default=None) is None
+
+
+@pytest.mark.parametrize('period', ['1d', '1m'])
+def test_short_periods_report_missing_averages_as_neutral(period):
+    from app import app
+
+    def reject(constant):
+        raise ValueError(f'{constant} is not valid JSON')
+
+    response = app.test_client().get(f'/get_technical_indicators?symbol=AAPL&period={period}')
+    assert response.status_code == 200
+    data = json.loads(response.get_data(as_text=True), parse_constant=reject)
+    assert data['ma200_position'] == 'Neutral'
+    assert data['ma200'] == data['price']
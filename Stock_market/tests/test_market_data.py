@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import market_data
+import providers
+from ohlcv_store import OHLCVStore
+
+
+class CountingProvider(providers.ReplayProvider):
+    def __init__(self):
+        super().__init__(seed=0)
+        self.calls = []
+
+    def history(self, symbol, period=None, interval='1d', start=None):
+        self.calls.append(('history', symbol, period, interval, start))
+        return super().history(symbol, period=period, interval=interval, start=start)
+
+    def download(self, symbols, period, interval):
+        self.calls.append(('download', tuple(symbols), period, interval))
+        return super().download(symbols, period, interval)
+
+
+@pytest.fixture
+def provider(monkeypatch, tmp_path):
+    provider = CountingProvider()
+    monkeypatch.setattr(providers, '_provider', provider)
+    monkeypatch.setattr(market_data, 'ohlcv_store', OHLCVStore(str(tmp_path)))
+    market_data.history_cache.clear()
+    yield provider
+    market_data.history_cache.clear()
+
+
+def test_history_is_cached(provider):
+    first = market_data.get_history('AAPL', period='1mo', interval='1h')
+    second = market_data.get_history('aapl', period='1mo', interval='1h')
+    assert len(first) and first.equals(second)
+    assert len(provider.calls) == 1
+    # Callers get their own copy
+    first['extra'] = 1
+    assert 'extra' not in market_data.get_history('AAPL', period='1mo', interval='1h')
+
+
+def test_empty_history_is_fetched_again_soon(provider, monkeypatch):
+    monkeypatch.setattr(market_data, 'EMPTY_TTL', 0)
+    history = provider.history
+    monkeypatch.setattr(provider, 'history', lambda *args, **kwargs: pd.DataFrame())
+    assert market_data.get_history('AAPL', period='5d', interval='1h').empty
+
+    monkeypatch.setattr(provider, 'history', history)
+    assert not market_data.get_history('AAPL', period='5d', interval='1h').empty
+
+
+def test_daily_bars_are_read_back_from_the_store(provider):
+    full = market_data.get_history('AAPL', period='1y')
+    market_data.history_cache.clear()
+    month = market_data.get_history('AAPL', period='1mo')
+    assert 15 <= len(month) <= 23
+    assert month.index[-1] == full.index[-1]
+    # Only the tail since the last stored bar was asked for
+    assert provider.calls[-1][4] is not None
+
+
+@pytest.mark.parametrize('damage', ['delete', 'corrupt'])
+def test_unreadable_stored_bars_are_fetched_again(provider, damage):
+    market_data.get_history('AAPL', period='1y')
+    path = os.path.join(market_data.ohlcv_store.root, '1d', 'AAPL.npy')
+    if damage == 'delete':
+        os.remove(path)
+    else:
+        with open(path, 'wb') as f:
+            f.write(b'not an array')
+    market_data.history_cache.clear()
+
+    hist = market_data.get_history('AAPL', period='1mo')
+    assert not hist.empty
+    # A full fetch, not a tail, and the store is whole again
+    assert provider.calls[-1][2] == '1mo' and provider.calls[-1][4] is None
+    assert market_data.ohlcv_store.read('AAPL', '1d') is not None
+
+
+def test_batch_fetches_only_what_is_not_cached(provider):
+    market_data.get_history('AAPL', period='5d', interval='1h')
+    result = market_data.get_history_batch(['AAPL', 'MSFT', ' ', 'TSLA'], period='5d', interval='1h')
+    assert set(result) == {'AAPL', 'MSFT', 'TSLA'}
+    kind, symbols, period, interval = provider.calls[-1]
+    assert (kind, sorted(symbols), period, interval) == ('download', ['MSFT', 'TSLA'], '5d', '1h')
+
+
+def test_symbols_missing_from_the_download_are_fetched_on_their_own(provider, monkeypatch):
+    download = provider.download
+    monkeypatch.setattr(provider, 'download', lambda symbols, period, interval: {
+        symbol: hist for symbol, hist in download(symbols, period, interval).items() if symbol != 'MSFT'})
+    result = market_data.get_history_batch(['AAPL', 'MSFT'], period='5d', interval='1h')
+    assert set(result) == {'AAPL', 'MSFT'} and not result['MSFT'].empty
+    assert provider.calls[-1][:2] == ('history', 'MSFT')
+
+
+def test_batch_reads_stored_intervals_through_the_store(provider):
+    market_data.get_history('AAPL', period='1y')
+    market_data.history_cache.clear()
+    result = market_data.get_history_batch(['AAPL', 'MSFT'], period='1mo')
+    assert set(result) == {'AAPL', 'MSFT'}
+    assert not any(call[0] == 'download' for call in provider.calls)
+    # AAPL only needed its tail, MSFT is in the store now
+    assert ('history', 'AAPL') in [call[:2] for call in provider.calls if call[4] is not None]
+    assert market_data.ohlcv_store.read('MSFT', '1d') is not None
+
+
+def test_batch_failure_releases_every_waiting_request(provider, monkeypatch):
+    class BrokenDownload(dict):
+        def get(self, symbol):
+            raise ValueError('malformed download')
+
+    monkeypatch.setattr(provider, 'download', lambda symbols, period, interval: BrokenDownload())
+    with pytest.raises(ValueError):
+        market_data.get_history_batch(['AAPL', 'MSFT'], period='5d', interval='1h')
+
+    # Nothing is left in flight: a follower would otherwise block forever
+    assert market_data.inflight._calls == {}
+    monkeypatch.undo()
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(
+        market_data.get_history_batch(['AAPL', 'MSFT'], period='5d', interval='1h')))
+    worker.start()
+    worker.join(timeout=10)
+    assert not worker.is_alive()
+    assert set(result) == {'AAPL', 'MSFT'}
+
+
+def test_failed_download_fails_the_followers(provider, monkeypatch):
+    started, proceed = threading.Event(), threading.Event()
+
+    def failing_download(symbols, period, interval):
+        started.set()
+        proceed.wait(5)
+        raise ConnectionError('upstream down')
+
+    monkeypatch.setattr(provider, 'download', failing_download)
+    leader = {}
+    thread = threading.Thread(target=lambda: leader.update(
+        market_data.get_history_batch(['AAPL'], period='5d', interval='1h')))
+    thread.start()
+    assert started.wait(5)
+
+    errors = []
+
+    def follow():
+        try:
+            market_data.get_history('AAPL', period='5d', interval='1h')
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    followers = market_data.inflight.followers
+    follower = threading.Thread(target=follow)
+    follower.start()
+    # Let the download fail only once the follower waits on it
+    while market_data.inflight.followers == followers and follower.is_alive():
+        time.sleep(0.001)
+    proceed.set()
+    thread.join(5)
+    follower.join(5)
+    assert not follower.is_alive()
+    assert leader == {}
+    assert len(errors) == 1
+    assert market_data.inflight._calls == {}
@@ -0,0 +1,99 @@
+import pytest
+
+from order_book import MatchingEngine, OrderError, CANCELLED, FILLED, OPEN, PENDING_TRIGGER
+
+
+@pytest.fixture
+def engine():
+    return MatchingEngine()
+
+
+def test_market_order_fills_at_the_reference_price(engine):
+    order, fills = engine.submit('alice', 'aapl', 'buy', 10, reference_price=100.0)
+    assert order.status == FILLED
+    assert [(fill.owner, fill.quantity, fill.price) for fill in fills] == [('alice', 10, 100.0)]
+
+
+def test_market_order_without_a_price_is_cancelled(engine):
+    order, fills = engine.submit('alice', 'AAPL', 'buy', 10)
+    assert order.status == CANCELLED
+    assert fills == []
+
+
+def test_resting_limit_fills_only_when_the_server_price_reaches_it(engine):
+    bid, _ = engine.submit('alice', 'AAPL', 'buy', 5, 'limit', limit_price=90.0, reference_price=100.0)
+    assert bid.status == OPEN
+
+    assert engine.on_price('AAPL', 95.0) == []
+    fills = engine.on_price('AAPL', 89.5)
+    assert bid.status == FILLED
+    # At the market's price, which is better than the limit
+    assert [(fill.order_id, fill.price) for fill in fills] == [(bid.order_id, 89.5)]
+
+
+def test_incoming_order_fills_at_the_resting_price(engine):
+    ask, _ = engine.submit('alice', 'AAPL', 'sell', 5, 'limit', limit_price=101.0)
+    bid, fills = engine.submit('bob', 'AAPL', 'buy', 5, 'limit', limit_price=102.0)
+    assert ask.status == FILLED and bid.status == FILLED
+    assert {(fill.owner, fill.price) for fill in fills} == {('alice', 101.0), ('bob', 101.0)}
+
+
+def test_market_beats_resting_orders_priced_above_it(engine):
+    ask, _ = engine.submit('alice', 'AAPL', 'sell', 5, 'limit', limit_price=101.0, reference_price=100.0)
+    bid, fills = engine.submit('bob', 'AAPL', 'buy', 5, 'limit', limit_price=102.0)
+    assert bid.status == FILLED and ask.status == OPEN
+    assert [(fill.owner, fill.price) for fill in fills] == [('bob', 100.0)]
+
+
+def test_orders_of_the_same_owner_never_match(engine):
+    ask, _ = engine.submit('bob', 'AAPL', 'sell', 5, 'limit', limit_price=50.0)
+    bid, fills = engine.submit('bob', 'AAPL', 'buy', 5, 'limit', limit_price=60.0)
+    assert fills == []
+    assert ask.status == OPEN and bid.status == OPEN
+
+    # The skipped order keeps its place for everyone else
+    other, fills = engine.submit('carol', 'AAPL', 'buy', 5, 'limit', limit_price=60.0)
+    assert other.status == FILLED
+    assert {(fill.owner, fill.price) for fill in fills} == {('bob', 50.0), ('carol', 50.0)}
+
+
+def test_tick_volume_limits_fills(engine):
+    bid, _ = engine.submit('alice', 'AAPL', 'buy', 10, 'limit', limit_price=100.0)
+    engine.on_price('AAPL', 99.0, volume=4)
+    assert bid.filled == 4 and bid.remaining == 6
+    engine.on_price('AAPL', 99.0, volume=10)
+    assert bid.status == FILLED
+
+
+def test_stop_market_triggers_on_the_server_price(engine):
+    stop, _ = engine.submit('alice', 'AAPL', 'sell', 3, 'sl-m', trigger_price=95.0, reference_price=100.0)
+    assert stop.status == PENDING_TRIGGER
+    engine.on_price('AAPL', 97.0)
+    assert stop.status == PENDING_TRIGGER
+    fills = engine.on_price('AAPL', 94.0)
+    assert stop.status == FILLED
+    assert [(fill.quantity, fill.price) for fill in fills] == [(3, 94.0)]
+
+
+def test_cancel_and_amend(engine):
+    bid, _ = engine.submit('alice', 'AAPL', 'buy', 5, 'limit', limit_price=90.0, reference_price=100.0)
+    with pytest.raises(OrderError):
+        engine.cancel(bid.order_id, owner='bob')
+    engine.amend(bid.order_id, owner='alice', limit_price=100.0)
+    assert bid.status == FILLED
+
+    other, _ = engine.submit('alice', 'AAPL', 'buy', 5, 'limit', limit_price=80.0)
+    engine.cancel(other.order_id, owner='alice')
+    assert other.status == CANCELLED
+    assert engine.on_price('AAPL', 70.0) == []
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'side': 'hold', 'quantity': 1},
+    {'side': 'buy', 'quantity': 0},
+    {'side': 'buy', 'quantity': 1, 'order_type': 'limit'},
+    {'side': 'buy', 'quantity': 1, 'order_type': 'sl', 'limit_price': 10.0}
+])
+def test_invalid_orders_are_rejected(engine, kwargs):
+    with pytest.raises(OrderError):
+        engine.submit('alice', 'AAPL', **kwargs)
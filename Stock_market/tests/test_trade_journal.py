@@ -0,0 +1,135 @@
+import json
+import time
+
+import pytest
+from mysql.connector import errors
+
+from trade_journal import TradeJournal
+
+
+def _trade(username, quantity=1):
+    return (username, 'AAPL', 'buy', quantity, 100.0, '2024-01-02 10:00:00')
+
+
+class FakeDatabase:
+    """
+    Stands in for TradeJournal._write: refuses rows of the usernames in
+    `rejected` the way a constraint would, and everything while down.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.down = False
+        self.rejected = set()
+        self.calls = 0
+
+    def write(self, batch):
+        self.calls += 1
+        if self.down:
+            raise errors.OperationalError(msg='Lost connection to MySQL server')
+        if any(record[0] in self.rejected for record in batch):
+            raise errors.IntegrityError(msg='Duplicate entry')
+        self.rows.extend(batch)
+
+
+@pytest.fixture
+def database():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def journal(tmp_path, database):
+    journal = TradeJournal(spill_path=str(tmp_path / 'spill.jsonl'), dead_letter_path=str(tmp_path / 'dead.jsonl'),
+                           batch_size=10, flush_interval=0.01, max_retries=2, retry_delay=0.0, replay_interval=3600)
+    journal._write = database.write
+    yield journal
+    journal._stop.set()
+
+
+def _lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batch_is_written_in_one_call(journal, database):
+    assert journal._persist([_trade('a'), _trade('b')])
+    assert database.calls == 1
+    assert [row[0] for row in database.rows] == ['a', 'b']
+    assert journal.stats()['written'] == 2
+
+
+def test_unreachable_database_spills_after_retries(journal, database):
+    database.down = True
+    assert not journal._persist([_trade('a'), _trade('b')])
+    assert database.calls == 3
+    assert [line['username'] for line in _lines(journal.spill_path)] == ['a', 'b']
+    assert journal.stats()['spilled'] == 2
+
+
+def test_spill_is_replayed_once_the_database_is_back(journal, database):
+    database.down = True
+    journal._persist([_trade('a'), _trade('b')])
+    journal._replay_spill()
+    assert database.rows == []
+    # Still down: the trades went back into the spill file
+    assert [line['username'] for line in _lines(journal.spill_path)] == ['a', 'b']
+
+    database.down = False
+    journal._replay_spill()
+    assert [row[0] for row in database.rows] == ['a', 'b']
+    assert journal.stats()['replayed'] == 2
+    journal._replay_spill()
+    assert len(database.rows) == 2
+
+
+def test_rejected_rows_go_to_the_dead_letter_file(journal, database):
+    database.rejected = {'bad'}
+    assert journal._persist([_trade('a'), _trade('bad'), _trade('c')])
+    assert [row[0] for row in database.rows] == ['a', 'c']
+    dead = _lines(journal.dead_letter_path)
+    assert [entry['trade']['username'] for entry in dead] == ['bad']
+    assert 'Duplicate entry' in dead[0]['error']
+    # Rejections are not retried or spilled
+    assert journal.stats()['retries'] == 0
+    assert journal.stats()['spilled'] == 0
+    assert journal.stats()['dead_lettered'] == 1
+
+
+def test_rejected_spilled_rows_do_not_block_the_rest(journal, database):
+    database.down = True
+    journal._persist([_trade('a'), _trade('bad'), _trade('c')])
+    with open(journal.spill_path, 'a') as f:
+        f.write('not json\n')
+    journal._persist([_trade('d')])
+
+    database.down = False
+    database.rejected = {'bad'}
+    journal._replay_spill()
+    assert [row[0] for row in database.rows] == ['a', 'c', 'd']
+    dead = _lines(journal.dead_letter_path)
+    assert [entry['trade'] for entry in dead] == ['not json',
+                                                 dict(zip(('username', 'symbol', 'action', 'quantity', 'price',
+                                                           'trade_date'), _trade('bad')))]
+    assert journal.stats()['replayed'] == 3
+
+
+def test_worker_survives_unexpected_errors(journal, database, monkeypatch):
+    persist = journal._persist
+    failures = []
+
+    def flaky_persist(batch, retries=None):
+        if not failures:
+            failures.append(batch)
+            raise RuntimeError('unexpected')
+        return persist(batch, retries)
+
+    monkeypatch.setattr(journal, '_persist', flaky_persist)
+    journal.submit(*_trade('a'))
+    deadline = time.monotonic() + 5
+    while not failures and time.monotonic() < deadline:
+        time.sleep(0.01)
+    journal.submit(*_trade('b'))
+    while not database.rows and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert journal._thread.is_alive()
+    assert [row[0] for row in database.rows] == ['b']
@@ -0,0 +1,275 @@
+"""
+Write-behind journal for trading_history.
+
+execute_trade hands each trade to journal.submit() and returns without
+waiting on MySQL. A background worker drains the queue in batches, writing
+each batch with one multi-row INSERT and one commit. Batches that still
+fail after a few retries are appended to a local JSONL spill file, which
+is replayed into the database once it is reachable again. When the queue
+is full, submit() waits briefly and then spills the trade directly, so a
+slow database never holds trades only in memory without bound.
+
+Trades the database refuses outright (a duplicate key, a value out of
+range) fail the same way on every retry. A batch rejected like that is
+written again row by row, and the rows still rejected go to a dead-letter
+file next to the spill file (TRADE_JOURNAL_DEAD_LETTER) with the error,
+so they neither get lost nor block the trades spilled after them.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import errors
+
+from db import db_connection
+
+SPILL_PATH = os.environ.get(
+    'TRADE_JOURNAL_SPILL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'trade_journal.jsonl')
+)
+DEAD_LETTER_PATH = os.environ.get(
+    'TRADE_JOURNAL_DEAD_LETTER',
+    os.path.splitext(SPILL_PATH)[0] + '.rejected.jsonl'
+)
+
+INSERT_SQL = ("INSERT INTO trading_history (username, symbol, action, quantity, price, trade_date) "
+              "VALUES (%s, %s, %s, %s, %s, %s)")
+FIELDS = ('username', 'symbol', 'action', 'quantity', 'price', 'trade_date')
+
+
+def _rejected(err):
+    """
+    Whether err blames the rows rather than the database: retrying the
+    same rows would fail again.
+    """
+    if isinstance(err, (errors.IntegrityError, errors.DataError)):
+        return True
+    # Anything but a database error comes from the records themselves
+    return not isinstance(err, mysql.connector.Error)
+
+
+class TradeJournal:
+    def __init__(self, spill_path=SPILL_PATH, dead_letter_path=DEAD_LETTER_PATH, max_queue=10000, batch_size=500,
+                 flush_interval=0.25, max_retries=3, retry_delay=0.5, submit_timeout=0.05, replay_interval=30.0):
+        self.spill_path = spill_path
+        self.dead_letter_path = dead_letter_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.submit_timeout = submit_timeout
+        self.replay_interval = replay_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._last_replay = 0.0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trade-journal', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, username, symbol, action, quantity, price, trade_date):
+        """
+        Queue one trade for persistence. Returns False when the queue was
+        full and the trade went straight to the spill file instead.
+        """
+        self.start()
+        record = (username, symbol, action, quantity, price, trade_date)
+        try:
+            self._queue.put(record, timeout=self.submit_timeout)
+            return True
+        except queue.Full:
+            self._spill([record])
+            return False
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Nothing may end the worker: submit() would queue trades forever
+            try:
+                batch = self._next_batch()
+                if batch:
+                    self._persist(batch)
+                if time.monotonic() - self._last_replay >= self.replay_interval:
+                    self._last_replay = time.monotonic()
+                    self._replay_spill()
+            except Exception as e:
+                print(f"Trade journal worker error: {e}")
+                time.sleep(self.retry_delay)
+
+    def _write(self, batch):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            # executemany folds the rows into a single multi-row INSERT
+            cursor.executemany(INSERT_SQL, batch)
+            conn.commit()
+            cursor.close()
+
+    def _persist(self, batch, retries=None):
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                self._write(batch)
+                self.written += len(batch)
+                self.batches += 1
+                return True
+            except Exception as err:
+                if _rejected(err):
+                    unwritten = self._write_each(batch)
+                    if unwritten:
+                        self._spill(unwritten)
+                    return not unwritten
+                if attempt == retries:
+                    print(f"Trade journal could not write {len(batch)} trades, spilling: {err}")
+                    break
+                self.retries += 1
+                time.sleep(self.retry_delay * (2 ** attempt))
+        self._spill(batch)
+        return False
+
+    def _write_each(self, batch):
+        """
+        Write a rejected batch one row at a time, dead-lettering the rows
+        the database still refuses. Returns the rows left unwritten because
+        the database itself failed part way.
+        """
+        for index, record in enumerate(batch):
+            try:
+                self._write([record])
+            except Exception as err:
+                if not _rejected(err):
+                    return batch[index:]
+                self._dead_letter([(dict(zip(FIELDS, record)), err)])
+                continue
+            self.written += 1
+            self.batches += 1
+        return []
+
+    def _dead_letter(self, entries):
+        """
+        Append (trade, error) pairs to the dead-letter file; trade is a
+        dict, or the raw text of an unreadable spill line.
+        """
+        failed_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+            with open(self.dead_letter_path, 'a') as f:
+                for trade, err in entries:
+                    print(f"Trade journal rejected {trade}: {err}")
+                    f.write(json.dumps({'trade': trade, 'error': str(err), 'failed_at': failed_at}, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.dead_lettered += len(entries)
+
+    def _spill(self, batch):
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, 'a') as f:
+                for record in batch:
+                    f.write(json.dumps(dict(zip(FIELDS, record))) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.spilled += len(batch)
+
+    def _replay_spill(self):
+        replay_path = self.spill_path + '.replay'
+        with self._spill_lock:
+            # A leftover .replay file means a previous replay was cut short
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+        records, unreadable = [], []
+        with open(replay_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(tuple(json.loads(line)[field] for field in FIELDS))
+                except (ValueError, KeyError, TypeError) as err:
+                    unreadable.append((line.rstrip('\n'), err))
+        if unreadable:
+            self._dead_letter(unreadable)
+        written = self.written
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            try:
+                self._write(batch)
+            except Exception as err:
+                unwritten = self._write_each(batch) if _rejected(err) else batch
+                if unwritten:
+                    # Still down: put the rest back and try again next round
+                    rest = records[start + len(batch) - len(unwritten):]
+                    self._spill(rest)
+                    self.spilled -= len(rest)
+                    break
+                continue
+            self.written += len(batch)
+            self.batches += 1
+        self.replayed += self.written - written
+        os.remove(replay_path)
+
+    def flush(self):
+        """
+        Synchronously persist everything queued so far.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) == self.batch_size:
+                self._persist(batch, retries=0)
+                batch = []
+        if batch:
+            self._persist(batch, retries=0)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'retries': self.retries,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'dead_lettered': self.dead_lettered
+        }
+
+
+journal = TradeJournal(
+    max_queue=int(os.environ.get('TRADE_JOURNAL_MAX_QUEUE', '10000')),
+    batch_size=int(os.environ.get('TRADE_JOURNAL_BATCH', '500'))
+)